@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # Mahashe Env Manager (CLI + GUI)
-# GUI: customtkinter, стиль 1:1 Mahashe Install Hub (тёмно-синяя тема по умолчанию)
+# GUI: customtkinter, стиль 1:1 Mahashe Install Hub (тёмно-синяя тема по умолчанию);
+#      код GUI — в Path_editorv4_gui.py, грузится только для -gui
 # Функции:
 # - Вкладка PATH: поиск, добавление папки, редактирование, удаление, удаление дубликатов, удаление несуществующих, сохранение в PATH (User + Machine если есть админ)
 # - Вкладка Переменные среды: список переменных (User / Machine / Both), двойной клик -> большое окно редактирования, создание/удаление
@@ -8,35 +9,49 @@
 #   -h / -help                     справка
 #   -gui                           открыть GUI
 #   -list [--scope user|machine|both]           (также поддерживается --score как алиас)
-#   -get  <NAME> [--scope user|machine]        (также поддерживается --score как алиас)
-#   -set  <NAME> <VALUE...> [--scope user|machine]  VALUE может быть без кавычек, до флагов
-#   -del  <NAME> [--scope user|machine]        (также поддерживается --score как алиас)
+#   -get  <NAME> [--scope user|machine] [--expand]  (также поддерживается --score как алиас)
+#   -set  <NAME> <VALUE...> [--scope user|machine] [--dry-run]  VALUE может быть без кавычек, до флагов
+#   -del  <NAME> [--scope user|machine] [--dry-run]  (также поддерживается --score как алиас)
 #   -addpath <PATH...> [--scope user|machine|both]
 #   -rmpath  <PATH...> [--scope user|machine|both]
-#   -deduppath [--scope user|machine|both]
-#   -prunepath [--scope user|machine|both]
+#   -deduppath [--scope user|machine|both] [--normalize]
+#   -prunepath [--scope user|machine|both] [--timeout SEC] [--on-timeout skip|remove]
+#   -compactpath [--scope user|machine|both] [--target N] [--max-vars N] [--no-dedup] [--apply]
+#   -profilepath [--scope user|machine|both] [--runs N] [--timeout SEC] [--top N]
+#   -optimizepath [--profile FILE] [--scope user|machine|both] [--apply] [--runs N] [--timeout SEC]
+#   -which <NAME> [--all] [--timeout SEC] [--rescan]
+#   -shadowed [--cross-scope] [--timeout SEC]
+#   -batch <file|->                операции построчно: set/del/addpath/rmpath/dedup/prune [--scope ...]
+#   --no-broadcast                 (к любой команде) не рассылать WM_SETTINGCHANGE
+#   --dry-run                      (-set/-del и команды PATH) показать DIFF и ничего не записывать
 #
-# Windows only.
+# Windows; на других ОС — с хранилищем MAHASHE_ENV_BACKEND=json:<file> или memory (см. REGISTRY HELPERS).
 
 import os
+import re
+import json
 import sys
+import ntpath
+import time
+import queue
 import ctypes
+import threading
 import subprocess
-from collections import Counter
-from typing import Dict, List, Tuple, Optional
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple, Optional
+
+# точка отсчёта для замеров холодного старта GUI (first paint / interactive)
+STARTED_AT = time.perf_counter()
 
 try:
     import winreg
 except Exception:
     winreg = None
 
-# PyInstaller: обеспечить доступ к Tcl/Tk при onefile до импорта customtkinter
-if getattr(sys, "frozen", False):
-    _base = getattr(sys, "_MEIPASS", os.path.dirname(sys.executable))
-    os.environ.setdefault("TCL_LIBRARY", os.path.join(_base, "tcl", "tcl8.6"))
-    os.environ.setdefault("TK_LIBRARY", os.path.join(_base, "tcl", "tk8.6"))
-
-import customtkinter as ctk
+# GUI (customtkinter/Tk) живёт в Path_editorv4_gui.py и импортируется лениво в main():
+# CLI-команды не должны платить за запуск Tk.
 
 
 APP_TITLE = "Mahashe Path_Tool Helper"
@@ -102,13 +117,13 @@ def _theme():
 
 def is_admin() -> bool:
     try:
-        return bool(ctypes.windll.shell32.IsUserAnAdmin())
+        return backend().is_admin()
     except Exception:
         return False
 
 
 def elevate_if_needed():
-    if os.name != "nt":
+    if os.name != "nt" or backend().name != "winreg":
         return
     try:
         if ctypes.windll.shell32.IsUserAnAdmin():
@@ -144,6 +159,107 @@ def broadcast_env_change():
         pass
 
 
+BROADCAST_WAIT_S = 12.0
+
+
+class EnvBroadcaster:
+    """
+    Коалесинг WM_SETTINGCHANGE: записи в реестр только помечают окружение "грязным" (mark_dirty),
+    рассылка уходит из фонового потока — одна на логическую операцию (см. env_batch())
+    и одна на пачку пометок, пришедших, пока предыдущая рассылка висела на зависших окнах.
+    sender — функция рассылки (по умолчанию broadcast_env_change), подменяется заглушкой.
+    """
+
+    def __init__(self, sender=None):
+        self.sender = sender or broadcast_env_change
+        self.enabled = True
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._depth = 0
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread: Optional[threading.Thread] = None
+
+    def mark_dirty(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._dirty = True
+            if self._depth == 0:
+                self._schedule_locked()
+
+    def begin(self) -> None:
+        with self._lock:
+            self._depth += 1
+
+    def end(self) -> None:
+        with self._lock:
+            self._depth = max(0, self._depth - 1)
+            if self._depth == 0 and self._dirty:
+                self._schedule_locked()
+
+    def discard(self) -> None:
+        """Забыть накопленную пометку (CLI --no-broadcast)."""
+        with self._lock:
+            self._dirty = False
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться окончания запланированных рассылок; False — не дождались."""
+        return self._idle.wait(timeout)
+
+    def _schedule_locked(self) -> None:
+        self._idle.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="env-broadcast", daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                send, self._dirty = self._dirty, False
+            if send:
+                try:
+                    self.sender()
+                except Exception:
+                    pass
+                self.sent += 1
+            with self._lock:
+                if not self._dirty or self._depth > 0:
+                    self._idle.set()
+
+
+_BROADCASTER: Optional[EnvBroadcaster] = None
+
+
+def broadcaster() -> EnvBroadcaster:
+    global _BROADCASTER
+    if _BROADCASTER is None:
+        _BROADCASTER = EnvBroadcaster()
+    return _BROADCASTER
+
+
+def set_broadcaster(b: Optional[EnvBroadcaster]) -> None:
+    """Подменить рассылку (например, EnvBroadcaster(sender=stub) в тестах); None — вернуть стандартную."""
+    global _BROADCASTER
+    _BROADCASTER = b
+
+
+@contextmanager
+def env_batch():
+    """Логическая операция: все записи внутри дают одну рассылку WM_SETTINGCHANGE на выходе."""
+    b = broadcaster()
+    b.begin()
+    try:
+        yield b
+    finally:
+        b.end()
+
+
 # =========================
 # REGISTRY HELPERS
 # =========================
@@ -151,14 +267,57 @@ def broadcast_env_change():
 HKCU_ENV = (winreg.HKEY_CURRENT_USER, r"Environment") if winreg else None
 HKLM_ENV = (winreg.HKEY_LOCAL_MACHINE, r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment") if winreg else None
 
+REG_SZ = winreg.REG_SZ if winreg else 1
+REG_EXPAND_SZ = winreg.REG_EXPAND_SZ if winreg else 2
+REG_TYPE_NAMES = {REG_SZ: "REG_SZ", REG_EXPAND_SZ: "REG_EXPAND_SZ"}
 
-def _require_windows_registry():
-    if winreg is None or os.name != "nt":
-        raise RuntimeError("Требуется Windows (winreg недоступен).")
+# Бэкенд выбирается переменной окружения процесса:
+#   MAHASHE_ENV_BACKEND=winreg          (по умолчанию на Windows)
+#   MAHASHE_ENV_BACKEND=memory          пустое хранилище в памяти
+#   MAHASHE_ENV_BACKEND=json:<file>     хранилище в JSON-файле (создаётся при первой записи)
+BACKEND_ENV_VAR = "MAHASHE_ENV_BACKEND"
+
+
+class RegistryBackend(ABC):
+    """
+    Хранилище значений ключей Environment для scope user|machine.
+    Имена значений сравниваются без учёта регистра, как в реестре.
+    Бэкенд без какого-либо из абстрактных методов не создаётся (TypeError), а не падает посреди записи.
+    """
+
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def is_admin(self) -> bool:
+        ...
+
+    @abstractmethod
+    def list_values(self, scope: str) -> Dict[str, Tuple[str, int]]:
+        ...
+
+    @abstractmethod
+    def get_value(self, scope: str, name: str) -> Optional[Tuple[str, int]]:
+        ...
+
+    @abstractmethod
+    def set_value(self, scope: str, name: str, value: str, vtype: int) -> None:
+        ...
+
+    @abstractmethod
+    def delete_value(self, scope: str, name: str) -> bool:
+        ...
+
+    def last_write(self, scope: str):
+        """Метка последней записи в ключ области (сравнивается только на равенство); None — не умеет."""
+        return None
 
 
 def _open_env_key(scope: str, access: int):
-    _require_windows_registry()
+    if winreg is None:
+        raise RuntimeError("Требуется Windows (winreg недоступен).")
     if scope == "user":
         root, path = HKCU_ENV
         return winreg.CreateKeyEx(root, path, 0, access)
@@ -168,771 +327,2280 @@ def _open_env_key(scope: str, access: int):
     raise ValueError("scope must be user|machine")
 
 
+class WinRegBackend(RegistryBackend):
+    """Настоящий реестр Windows (HKCU/HKLM Environment)."""
+
+    name = "winreg"
+
+    def available(self) -> bool:
+        return winreg is not None and os.name == "nt"
+
+    def is_admin(self) -> bool:
+        try:
+            return bool(ctypes.windll.shell32.IsUserAnAdmin())
+        except Exception:
+            return False
+
+    def list_values(self, scope: str) -> Dict[str, Tuple[str, int]]:
+        out: Dict[str, Tuple[str, int]] = {}
+        with _open_env_key(scope, winreg.KEY_READ) as k:
+            i = 0
+            while True:
+                try:
+                    name, val, vtype = winreg.EnumValue(k, i)
+                except OSError:
+                    break
+                out[str(name)] = (str(val), int(vtype))
+                i += 1
+        return out
+
+    def get_value(self, scope: str, name: str) -> Optional[Tuple[str, int]]:
+        try:
+            with _open_env_key(scope, winreg.KEY_READ) as k:
+                val, vtype = winreg.QueryValueEx(k, name)
+                return (str(val), int(vtype))
+        except Exception:
+            return None
+
+    def set_value(self, scope: str, name: str, value: str, vtype: int) -> None:
+        with _open_env_key(scope, winreg.KEY_SET_VALUE) as k:
+            winreg.SetValueEx(k, name, 0, vtype, value)
+
+    def delete_value(self, scope: str, name: str) -> bool:
+        try:
+            with _open_env_key(scope, winreg.KEY_SET_VALUE) as k:
+                winreg.DeleteValue(k, name)
+        except FileNotFoundError:
+            return False
+        except Exception:
+            pass
+        return True
+
+    def last_write(self, scope: str):
+        # QueryInfoKey: (подключи, значения, время последней записи в 100-нс интервалах)
+        with _open_env_key(scope, winreg.KEY_READ) as k:
+            return winreg.QueryInfoKey(k)[2]
+
+
+class MemoryBackend(RegistryBackend):
+    """
+    Хранилище в памяти (опционально — в JSON-файле) для профилирования и прогонов на Linux.
+    Моделирует области user/machine, типы REG_SZ/REG_EXPAND_SZ и права администратора:
+    без admin запись в machine даёт PermissionError, как в реестре.
+    Формат файла: {"admin": true, "user": {"Path": ["C:\\x", 2]}, "machine": {...}};
+    значение можно задать и просто строкой — тип тогда выводится по наличию '%'.
+    """
+
+    name = "memory"
+
+    def __init__(self, data: Optional[dict] = None, admin: bool = True, path: Optional[str] = None):
+        self.path = path
+        self.admin = admin
+        self._lock = threading.Lock()
+        self._scopes: Dict[str, Dict[str, Tuple[str, str, int]]] = {"user": {}, "machine": {}}
+        self._writes = {"user": 0, "machine": 0}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8-sig") as f:
+                data = json.load(f)
+            self.name = "json"
+        elif path:
+            self.name = "json"
+        if data:
+            self.admin = bool(data.get("admin", admin))
+            for scope in ("user", "machine"):
+                for name, raw in (data.get(scope) or {}).items():
+                    if isinstance(raw, (list, tuple)):
+                        value, vtype = str(raw[0]), int(raw[1])
+                    else:
+                        value = str(raw)
+                        vtype = REG_EXPAND_SZ if "%" in value else REG_SZ
+                    self._scopes[scope][name.casefold()] = (name, value, vtype)
+
+    def _scope(self, scope: str) -> Dict[str, Tuple[str, str, int]]:
+        if scope not in self._scopes:
+            raise ValueError("scope must be user|machine")
+        return self._scopes[scope]
+
+    def _check_write(self, scope: str) -> None:
+        if scope == "machine" and not self.admin:
+            raise PermissionError("Требуются права администратора для записи в MACHINE.")
+
+    def _save_locked(self) -> None:
+        if not self.path:
+            return
+        data = {"admin": self.admin}
+        for scope, vals in self._scopes.items():
+            data[scope] = {name: [value, vtype] for name, value, vtype in vals.values()}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def is_admin(self) -> bool:
+        return self.admin
+
+    def list_values(self, scope: str) -> Dict[str, Tuple[str, int]]:
+        with self._lock:
+            return {name: (value, vtype) for name, value, vtype in self._scope(scope).values()}
+
+    def get_value(self, scope: str, name: str) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            hit = self._scope(scope).get(name.casefold())
+        return (hit[1], hit[2]) if hit else None
+
+    def set_value(self, scope: str, name: str, value: str, vtype: int) -> None:
+        self._check_write(scope)
+        with self._lock:
+            vals = self._scope(scope)
+            old = vals.get(name.casefold())
+            vals[name.casefold()] = (old[0] if old else name, value, int(vtype))
+            self._writes[scope] += 1
+            self._save_locked()
+
+    def delete_value(self, scope: str, name: str) -> bool:
+        self._check_write(scope)
+        with self._lock:
+            hit = self._scope(scope).pop(name.casefold(), None)
+            if hit is not None:
+                self._writes[scope] += 1
+                self._save_locked()
+        return hit is not None
+
+    def last_write(self, scope: str):
+        self._scope(scope)
+        with self._lock:
+            return self._writes[scope]
+
+
+_BACKEND: Optional[RegistryBackend] = None
+
+
+def _backend_from_spec(spec: str) -> RegistryBackend:
+    spec = (spec or "").strip()
+    low = spec.lower()
+    if not spec or low == "winreg":
+        return WinRegBackend()
+    if low == "memory":
+        return MemoryBackend()
+    if low.startswith("json:"):
+        return MemoryBackend(path=spec[5:])
+    if low.endswith(".json"):
+        return MemoryBackend(path=spec)
+    raise ValueError(f"неизвестный бэкенд {BACKEND_ENV_VAR}={spec}")
+
+
+def backend() -> RegistryBackend:
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = _backend_from_spec(os.environ.get(BACKEND_ENV_VAR, ""))
+    return _BACKEND
+
+
+def set_backend(b: Optional[RegistryBackend]) -> None:
+    """Подменить хранилище (MemoryBackend в тестах/бенчмарках); None — снова по MAHASHE_ENV_BACKEND."""
+    global _BACKEND
+    _BACKEND = b
+
+
+def _require_windows_registry():
+    # имя историческое: проверяет, что выбранный бэкенд доступен на этой машине
+    if not backend().available():
+        raise RuntimeError(f"Требуется Windows (winreg недоступен). Для других ОС: {BACKEND_ENV_VAR}=json:<file>.")
+
+
 def list_env(scope: str) -> Dict[str, Tuple[str, int]]:
     """
     returns {name: (value, reg_type)}
     """
     _require_windows_registry()
-    out: Dict[str, Tuple[str, int]] = {}
-    access = winreg.KEY_READ
-    with _open_env_key(scope, access) as k:
-        i = 0
-        while True:
-            try:
-                name, val, vtype = winreg.EnumValue(k, i)
-            except OSError:
-                break
-            out[str(name)] = (str(val), int(vtype))
-            i += 1
-    return out
+    return backend().list_values(scope)
 
 
 def get_env(scope: str, name: str) -> Optional[Tuple[str, int]]:
     _require_windows_registry()
     try:
-        with _open_env_key(scope, winreg.KEY_READ) as k:
-            val, vtype = winreg.QueryValueEx(k, name)
-            return (str(val), int(vtype))
+        return backend().get_value(scope, name)
     except Exception:
         return None
 
 
-def set_env(scope: str, name: str, value: str) -> None:
+def set_env(scope: str, name: str, value: str, vtype: Optional[int] = None) -> bool:
+    """
+    Записывает значение; если в реестре уже лежит то же значение того же типа —
+    ничего не пишет и не рассылает. Возвращает True, если запись была.
+    Существующий REG_EXPAND_SZ сохраняет тип, даже если в значении больше нет '%'.
+    vtype задаёт тип явно (откат правки возвращает значение вместе с прежним типом).
+    """
     _require_windows_registry()
     if scope == "machine" and not is_admin():
         raise PermissionError("Требуются права администратора для записи в MACHINE.")
-    vtype = winreg.REG_EXPAND_SZ if "%" in (value or "") else winreg.REG_SZ
-    with _open_env_key(scope, winreg.KEY_SET_VALUE) as k:
-        winreg.SetValueEx(k, name, 0, vtype, value)
-    broadcast_env_change()
+    cur = get_env(scope, name)
+    if vtype is None:
+        keep_expand = cur is not None and cur[1] == REG_EXPAND_SZ
+        vtype = REG_EXPAND_SZ if ("%" in (value or "") or keep_expand) else REG_SZ
+    if cur is not None and cur == (value, vtype):
+        return False
+    backend().set_value(scope, name, value, vtype)
+    if _EXPANDER is not None:
+        _EXPANDER.set(scope, name, value, vtype)
+    broadcaster().mark_dirty()
+    return True
 
 
-def delete_env(scope: str, name: str) -> None:
+def delete_env(scope: str, name: str) -> bool:
+    """Удаляет значение; отсутствующее — не трогает и не рассылает. True, если удаление было."""
     _require_windows_registry()
     if scope == "machine" and not is_admin():
         raise PermissionError("Требуются права администратора для удаления из MACHINE.")
-    try:
-        with _open_env_key(scope, winreg.KEY_SET_VALUE) as k:
-            winreg.DeleteValue(k, name)
-    except FileNotFoundError:
-        pass
-    except Exception:
-        pass
-    broadcast_env_change()
+    if get_env(scope, name) is None:
+        return False
+    if not backend().delete_value(scope, name):
+        return False
+    if _EXPANDER is not None:
+        _EXPANDER.set(scope, name, None)
+    broadcaster().mark_dirty()
+    return True
+
+
+# =========================
+# CHANGE NOTIFICATIONS
+# =========================
+
+class ChangeSource(ABC):
+    """Откуда узнавать об изменениях переменных снаружи: poll() -> области, изменившиеся с прошлого вызова."""
+
+    @abstractmethod
+    def poll(self) -> List[str]:
+        ...
+
+    @contextmanager
+    def own_writes(self, scopes: Iterable[str]):
+        """Блок, в котором пишем сами: его изменения poll() не должен выдавать за внешние."""
+        yield
+
+
+class RegistryChangeSource(ChangeSource):
+    """
+    Сравнивает время последней записи ключей Environment (QueryInfoKey) с прошлым опросом;
+    если бэкенд его не знает — сравнивает сами значения. Первый опрос только запоминает состояние.
+    """
+
+    def __init__(self, scopes: Iterable[str] = ("user", "machine")):
+        self.scopes = list(scopes)
+        self._seen: Dict[str, object] = {}
+        # poll() и own_writes() не перемешиваются: опрос не увидит запись на полпути
+        self._lock = threading.RLock()
+
+    def _stamp(self, scope: str):
+        b = backend()
+        try:
+            st = b.last_write(scope)
+        except Exception:
+            st = None
+        if st is None:
+            try:
+                st = tuple(sorted((k.casefold(), v) for k, v in b.list_values(scope).items()))
+            except Exception:
+                st = None
+        return st
+
+    def poll(self) -> List[str]:
+        changed = []
+        with self._lock:
+            for scope in self.scopes:
+                st = self._stamp(scope)
+                if scope in self._seen and self._seen[scope] != st:
+                    changed.append(scope)
+                self._seen[scope] = st
+        return changed
+
+    @contextmanager
+    def own_writes(self, scopes: Iterable[str]):
+        """
+        После блока запоминает новое время записи ключей как уже виденное. Если ключ успел измениться
+        снаружи до блока, его не трогаем — следующий poll() всё равно сообщит о нём.
+        """
+        scopes = [sc for sc in scopes if sc in self.scopes]
+        with self._lock:
+            pending = {sc for sc in scopes if sc in self._seen and self._stamp(sc) != self._seen[sc]}
+            try:
+                yield
+            finally:
+                for sc in scopes:
+                    if sc in self._seen and sc not in pending:
+                        self._seen[sc] = self._stamp(sc)
+
+
+class FakeChangeSource(ChangeSource):
+    """Для проверок: trigger(scope) — и следующий poll() вернёт эту область."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+
+    def trigger(self, *scopes: str) -> None:
+        with self._lock:
+            self._pending.extend(s for s in scopes if s not in self._pending)
+
+    def poll(self) -> List[str]:
+        with self._lock:
+            out, self._pending = self._pending, []
+        return out
+
+
+class ChangeWatcher:
+    """Опрашивает ChangeSource на daemon-потоке и зовёт callback(scopes) из него, если что-то изменилось."""
+
+    def __init__(self, source: ChangeSource, callback, interval: float = 1.0):
+        self.source = source
+        self.callback = callback
+        self.interval = float(interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ChangeWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="env-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                changed = self.source.poll()
+            except Exception:
+                changed = []
+            if changed:
+                try:
+                    self.callback(changed)
+                except Exception:
+                    pass
+            self._stop.wait(self.interval)
+
+
+# =========================
+# ENV EXPANSION
+# =========================
+
+_VAR_RE = re.compile(r"%([^%]+)%")
+# переменные, у которых значение User дописывается к Machine, а не заменяет его
+MERGED_VARS = ("path", "libpath", "os2libpath")
+
+
+class _Cycle(Exception):
+    def __init__(self, keys: List[str]):
+        super().__init__(keys)
+        self.keys = keys
+
+
+class EnvExpander:
+    """
+    Раскрытие %NAME% так, как его увидит свежий вход в систему: значения из реестра,
+    User поверх Machine (Path/LibPath — Machine;User), раскрываются только REG_EXPAND_SZ.
+    Имён нет в реестре (SystemRoot, USERPROFILE, ...) — берутся из окружения процесса.
+
+    Раскрытые значения кэшируются; set() сбрасывает только само имя и то, что на него ссылается.
+    Переменные, входящие в цикл ссылок, остаются нераскрытыми (см. cycles()).
+    """
+
+    def __init__(self, fallback: Optional[Dict[str, str]] = None):
+        self._lock = threading.RLock()
+        self._raw: Dict[str, Dict[str, Tuple[str, int]]] = {"machine": {}, "user": {}}
+        self._fallback = {k.casefold(): v for k, v in (os.environ if fallback is None else fallback).items()}
+        self._memo: Dict[str, str] = {}
+        self._deps: Dict[str, set] = {}   # имя -> имена, на которые оно ссылается
+        self._rdeps: Dict[str, set] = {}  # имя -> имена, которые ссылаются на него
+        self._cyclic: set = set()
+
+    @classmethod
+    def from_registry(cls, scopes: Iterable[str] = ("machine", "user")) -> "EnvExpander":
+        exp = cls()
+        exp.load(scopes)
+        return exp
+
+    def load(self, scopes: Iterable[str] = ("machine", "user")) -> None:
+        """
+        Перечитать области scopes из реестра, остальные — пустые (сбрасывает весь кэш).
+        scopes=("machine",) — значения так, как их видит PATH машины: без переменных User.
+        """
+        raw: Dict[str, Dict[str, Tuple[str, int]]] = {"machine": {}, "user": {}}
+        for scope in scopes:
+            try:
+                raw[scope] = {k.casefold(): v for k, v in list_env(scope).items()}
+            except Exception:
+                raw[scope] = {}
+        with self._lock:
+            self._raw = raw
+            self._memo.clear()
+            self._cyclic.clear()
+            self._deps.clear()
+            self._rdeps.clear()
+            for key in set(raw["machine"]) | set(raw["user"]):
+                self._link(key)
+
+    # ---- raw values ----
+
+    def _merged(self, key: str) -> Optional[Tuple[str, bool]]:
+        """(значение, раскрывать ли) после наложения User на Machine."""
+        m = self._raw["machine"].get(key)
+        u = self._raw["user"].get(key)
+        if m and u and key in MERGED_VARS:
+            return _join_path(_split_path(m[0]) + _split_path(u[0])), REG_EXPAND_SZ in (m[1], u[1])
+        cur = u or m
+        if cur is None:
+            return None
+        return cur[0], cur[1] == REG_EXPAND_SZ
+
+    def _link(self, key: str) -> None:
+        for ref in self._deps.pop(key, ()):
+            self._rdeps.get(ref, set()).discard(key)
+        cur = self._merged(key)
+        refs = {r.casefold() for r in _VAR_RE.findall(cur[0])} if cur and cur[1] else set()
+        if refs:
+            self._deps[key] = refs
+            for ref in refs:
+                self._rdeps.setdefault(ref, set()).add(key)
+
+    def _invalidate(self, key: str) -> None:
+        stack = [key]
+        seen = set()
+        while stack:
+            k = stack.pop()
+            if k in seen:
+                continue
+            seen.add(k)
+            self._memo.pop(k, None)
+            self._cyclic.discard(k)
+            stack.extend(self._rdeps.get(k, ()))
+
+    def set(self, scope: str, name: str, value: Optional[str], reg_type: Optional[int] = None) -> None:
+        """Учесть новое (или несохранённое) значение; None — удаление."""
+        key = name.casefold()
+        with self._lock:
+            if value is None:
+                self._raw[scope].pop(key, None)
+            else:
+                if reg_type is None:
+                    reg_type = REG_EXPAND_SZ if "%" in value else REG_SZ
+                self._raw[scope][key] = (value, reg_type)
+            self._link(key)
+            self._invalidate(key)
+
+    # ---- resolution ----
+
+    def _resolve(self, key: str, stack: List[str]) -> Optional[str]:
+        if key in self._memo:
+            return self._memo[key]
+        cur = self._merged(key)
+        if cur is None:
+            return self._fallback.get(key)
+        val, expandable = cur
+        if expandable and "%" in val:
+            if key in stack:
+                raise _Cycle(stack[stack.index(key):])
+            stack.append(key)
+            try:
+                val = self._subst(val, stack)
+            except _Cycle as c:
+                if c.keys[0] != key:
+                    raise
+                # весь цикл остаётся как есть, независимо от того, с какого имени начали
+                for k in c.keys:
+                    self._memo[k] = self._merged(k)[0]
+                    self._cyclic.add(k)
+                return self._memo[key]
+            finally:
+                stack.pop()
+        self._memo[key] = val
+        return val
+
+    def _subst(self, text: str, stack: List[str]) -> str:
+        def repl(m):
+            v = self._resolve(m.group(1).casefold(), stack)
+            return m.group(0) if v is None else v
+        return _VAR_RE.sub(repl, text)
+
+    def value(self, name: str) -> Optional[str]:
+        """Раскрытое значение переменной; None, если её нет нигде."""
+        with self._lock:
+            return self._resolve(name.casefold(), [])
+
+    def expand(self, text: str) -> str:
+        """Раскрыть %NAME% в произвольной строке; неизвестные ссылки остаются как есть."""
+        if not text or "%" not in text:
+            return text
+        with self._lock:
+            return self._subst(text, [])
+
+    def cycles(self, text: Optional[str] = None) -> List[str]:
+        """
+        Имена в циклах ссылок, найденные при раскрытии. text — только те, до которых
+        доходит раскрытие этой строки (её %NAME% и дальше по ссылкам).
+        """
+        with self._lock:
+            if text is None:
+                return sorted(self._cyclic)
+            stack = [r.casefold() for r in _VAR_RE.findall(text)]
+            seen = set()
+            while stack:
+                k = stack.pop()
+                if k not in seen:
+                    seen.add(k)
+                    stack.extend(self._deps.get(k, ()))
+            return sorted(seen & self._cyclic)
+
+
+_EXPANDER: Optional[EnvExpander] = None
+
+
+def env_expander(load: bool = True) -> EnvExpander:
+    """
+    Общий EnvExpander. load=False — если его ещё нет, создать пустым, без чтения реестра:
+    GUI ставит такой при старте и грузит его .load() только из фоновых потоков.
+    """
+    global _EXPANDER
+    if _EXPANDER is None:
+        _EXPANDER = EnvExpander.from_registry() if load else EnvExpander()
+    return _EXPANDER
+
+
+def set_env_expander(e: Optional[EnvExpander]) -> None:
+    global _EXPANDER
+    _EXPANDER = e
 
 
 # =========================
 # PATH LOGIC
 # =========================
 
+# PATH в реестре всегда разделяется ';' — не os.pathsep, чтобы логика работала и вне Windows
+PATH_SEP = ";"
+
+
 def _split_path(raw: str) -> List[str]:
     parts = []
-    for p in (raw or "").split(os.pathsep):
+    for p in (raw or "").split(PATH_SEP):
         p = p.strip()
         if p:
             parts.append(p)
     return parts
 
 
-def _join_path(parts: List[str]) -> str:
-    return os.pathsep.join(parts)
+def _join_path(parts: Iterable[str]) -> str:
+    return PATH_SEP.join(parts)
+
+
+class PathEntry:
+    __slots__ = ("value", "key", "pos", "checked")
+
+    def __init__(self, value: str, key: str, pos: int = -1):
+        self.value = value
+        self.key = key
+        self.pos = pos
+        self.checked = False
+
+    def __repr__(self) -> str:
+        return f"PathEntry({self.value!r})"
 
 
-def read_path(scope: str) -> List[str]:
+class PathList:
+    """
+    Список элементов PATH: записи PathEntry (__slots__) + индекс ключ -> записи с этим ключом.
+    Членство, число дубликатов и поиск позиции — O(1) (позиция кэшируется в записи и
+    перепроверяется по тождеству, устаревшая ищется через list.index на C-скорости).
+    key — функция ключа (по умолчанию точная строка, как в dedup_keep_first).
+    Итерация, [] и == работают со строками, поэтому PathList можно отдавать туда, где ждут List[str].
+    """
+
+    __hash__ = None  # изменяемый
+
+    def __init__(self, items: Iterable[str] = (), key=None):
+        self.key = key
+        self._entries: List[PathEntry] = []
+        self._index: Dict[str, List[PathEntry]] = {}
+        self.extend(items)
+
+    # ---- helpers ----
+
+    def _key(self, value: str) -> str:
+        return self.key(value) if self.key else value
+
+    def _new(self, value: str) -> PathEntry:
+        e = PathEntry(value, self._key(value))
+        self._index.setdefault(e.key, []).append(e)
+        return e
+
+    def _unindex(self, e: PathEntry) -> None:
+        lst = self._index.get(e.key)
+        if lst is None:
+            return
+        for k, x in enumerate(lst):
+            if x is e:
+                del lst[k]
+                break
+        if not lst:
+            del self._index[e.key]
+
+    def _pos_of(self, e: PathEntry) -> int:
+        p = e.pos
+        if not (0 <= p < len(self._entries) and self._entries[p] is e):
+            p = self._entries.index(e)
+            e.pos = p
+        return p
+
+    def _renumber(self, start: int = 0) -> None:
+        for i, e in enumerate(self._entries[start:], start):
+            e.pos = i
+
+    # ---- sequence protocol ----
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return (e.value for e in self._entries)
+
+    def __getitem__(self, i: int) -> str:
+        return self._entries[i].value
+
+    def __contains__(self, value) -> bool:
+        return self._key(value) in self._index
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (PathList, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"PathList({self.to_list()!r})"
+
+    def to_list(self) -> List[str]:
+        return [e.value for e in self._entries]
+
+    def copy(self) -> "PathList":
+        return PathList(self, key=self.key)
+
+    @property
+    def entries(self) -> List[PathEntry]:
+        return self._entries
+
+    def entry(self, i: int) -> PathEntry:
+        e = self._entries[i]
+        e.pos = i
+        return e
+
+    # ---- queries ----
+
+    def count(self, value: str) -> int:
+        """Сколько элементов с тем же ключом (для точного ключа — число дубликатов)."""
+        return len(self._index.get(self._key(value), ()))
+
+    def count_entry(self, e: PathEntry) -> int:
+        return len(self._index.get(e.key, ()))
+
+    def position(self, e: PathEntry) -> int:
+        """Текущая позиция записи; ValueError, если её уже нет в списке."""
+        return self._pos_of(e)
+
+    def positions(self, value: str) -> List[int]:
+        return sorted(self._pos_of(e) for e in self._index.get(self._key(value), ()))
+
+    def index(self, value: str) -> int:
+        """Позиция первого элемента с точно таким значением; ValueError, если нет."""
+        for pos in self.positions(value):
+            if self._entries[pos].value == value:
+                return pos
+        raise ValueError(value)
+
+    def checked_positions(self) -> List[int]:
+        return [i for i, e in enumerate(self._entries) if e.checked]
+
+    # ---- insert ----
+
+    def append(self, value: str) -> PathEntry:
+        e = self._new(value)
+        e.pos = len(self._entries)
+        self._entries.append(e)
+        return e
+
+    def add_once(self, value: str) -> bool:
+        if not value or value in self:
+            return False
+        self.append(value)
+        return True
+
+    def extend(self, values: Iterable[str]) -> None:
+        # горячий путь при загрузке: без вызовов методов на элемент
+        entries = self._entries
+        index = self._index
+        keyf = self.key
+        pos = len(entries)
+        for v in values:
+            k = keyf(v) if keyf else v
+            e = PathEntry(v, k, pos)
+            lst = index.get(k)
+            if lst is None:
+                index[k] = [e]
+            else:
+                lst.append(e)
+            entries.append(e)
+            pos += 1
+
+    def insert(self, i: int, value: str) -> PathEntry:
+        self.insert_many(i, [value])
+        return self._entries[max(0, min(i, len(self._entries) - 1))]
+
+    def insert_many(self, i: int, values: Iterable[str]) -> None:
+        i = max(0, min(int(i), len(self._entries)))
+        self._entries[i:i] = [self._new(v) for v in values]
+        self._renumber(i)
+
+    # ---- update / remove ----
+
+    def set_at(self, i: int, value: str) -> None:
+        e = self._entries[i]
+        self._unindex(e)
+        e.value = value
+        e.key = self._key(value)
+        self._index.setdefault(e.key, []).append(e)
+
+    def remove_at(self, i: int) -> str:
+        e = self._entries.pop(i)
+        self._unindex(e)
+        return e.value
+
+    def remove_entry(self, e: PathEntry) -> None:
+        self.remove_at(self._pos_of(e))
+
+    def remove_value(self, value: str) -> int:
+        """Удалить все элементы с точно таким значением; вернуть их число."""
+        victims = [e for e in self._index.get(self._key(value), ()) if e.value == value]
+        if len(victims) == 1:
+            self.remove_entry(victims[0])
+            return 1
+        return self.remove_where(lambda e: e.value == value) if victims else 0
+
+    def remove_positions(self, positions: Iterable[int]) -> int:
+        drop = set(positions)
+        return self.remove_where(lambda e: e.pos in drop) if drop else 0
+
+    def remove_checked(self) -> int:
+        return self.remove_where(lambda e: e.checked)
+
+    def remove_where(self, pred) -> int:
+        """Массовое удаление одним проходом."""
+        self._renumber()
+        keep: List[PathEntry] = []
+        for e in self._entries:
+            if pred(e):
+                self._unindex(e)
+            else:
+                keep.append(e)
+        removed = len(self._entries) - len(keep)
+        if removed:
+            self._entries = keep
+            self._renumber()
+        return removed
+
+    def clear_checks(self) -> None:
+        for e in self._entries:
+            e.checked = False
+
+    # ---- reorder ----
+
+    def move(self, src: int, dst: int) -> int:
+        """Переместить элемент src на позицию dst (после удаления из src); вернуть новую позицию."""
+        n = len(self._entries)
+        if not (0 <= src < n):
+            raise IndexError(src)
+        dst = max(0, min(int(dst), n - 1))
+        if dst != src:
+            e = self._entries.pop(src)
+            self._entries.insert(dst, e)
+            self._renumber(min(src, dst))
+        return dst
+
+    def move_up(self, i: int) -> int:
+        return self.move(i, i - 1) if i > 0 else i
+
+    def move_down(self, i: int) -> int:
+        return self.move(i, i + 1) if i < len(self._entries) - 1 else i
+
+    def reorder(self, order: List[int]) -> None:
+        """Переставить элементы: order — перестановка текущих позиций."""
+        if sorted(order) != list(range(len(self._entries))):
+            raise ValueError("order must be a permutation of positions")
+        self._entries = [self._entries[i] for i in order]
+        self._renumber()
+
+    # ---- dedup ----
+
+    def dedup(self) -> int:
+        """Оставить первый элемент каждого ключа; вернуть число удалённых."""
+        if len(self._index) == len(self._entries):
+            return 0
+        seen = set()
+        keep: List[PathEntry] = []
+        for e in self._entries:
+            if e.key in seen:
+                self._unindex(e)
+            else:
+                seen.add(e.key)
+                keep.append(e)
+        removed = len(self._entries) - len(keep)
+        self._entries = keep
+        self._renumber()
+        return removed
+
+
+def _as_pathlist(parts) -> PathList:
+    """PathList изменяется на месте; обычный список не трогаем — делаем PathList-копию."""
+    return parts if isinstance(parts, PathList) else PathList(parts)
+
+
+def read_path(scope: str) -> PathList:
     cur = get_env(scope, "Path")
     if not cur:
-        return []
-    return _split_path(cur[0])
+        return PathList()
+    return PathList(_split_path(cur[0]))
+
 
+# setx, старые диалоги и часть инструментов молча обрезают PATH длиннее PATH_LIMIT_SOFT;
+# PATH_LIMIT_HARD — предел значения переменной окружения вообще
+PATH_LIMIT_SOFT = 2047
+PATH_LIMIT_HARD = 32767
 
-def write_path(scope: str, parts: List[str]) -> None:
-    set_env(scope, "Path", _join_path(parts))
+
+def write_path(scope: str, parts: Iterable[str]) -> bool:
+    parts = list(parts)
+    raw = _join_path(parts)
+    if len(raw) > PATH_LIMIT_HARD:
+        raise ValueError(f"PATH длиннее {PATH_LIMIT_HARD} символов ({len(raw)}) — сожми его (-compactpath)")
+    cur = get_env(scope, "Path")
+    if cur is not None and _split_path(cur[0]) == parts:
+        return False  # те же элементы: пустые/с пробелами сегменты — не повод для записи
+    return set_env(scope, "Path", raw)
 
 
 def expand_exists(p: str) -> bool:
     try:
-        ex = os.path.expandvars(p)
+        ex = env_expander().expand(p)
         return os.path.exists(ex)
     except Exception:
         return False
 
 
-def dedup_keep_first(parts: List[str]) -> List[str]:
-    seen = set()
-    out = []
-    for p in parts:
-        if p not in seen:
-            seen.add(p)
-            out.append(p)
+def dedup_keep_first(parts) -> PathList:
+    pl = _as_pathlist(parts)
+    pl.dedup()
+    return pl
+
+
+def normalize_path_key(p: str, expand=None) -> str:
+    """
+    Ключ сравнения элемента PATH так, как его видит Windows: переменные раскрыты,
+    '/' -> '\\', '.'/'..' свёрнуты, без хвостового разделителя и кавычек, без учёта регистра.
+    C:\\Tools, c:\\tools\\ и C:\\Tools\\bin\\.. дают один ключ.
+    """
+    s = (p or "").strip().strip('"').strip()
+    if not s:
+        return ""
+    try:
+        s = (expand or env_expander().expand)(s)
+    except Exception:
+        pass
+    return ntpath.normpath(s).casefold()
+
+
+def redundant_entries(parts, shadow: Iterable[str] = (), key=None) -> List[PathEntry]:
+    """
+    Записи, которые ничего не добавляют к поиску: повтор более раннего элемента
+    или элемента из shadow (для User — PATH машины, он стоит в поиске раньше).
+    Один проход; остаётся первое вхождение в исходном написании.
+    """
+    key = key or normalize_path_key
+    seen = {key(p) for p in shadow}
+    out: List[PathEntry] = []
+    for e in _as_pathlist(parts).entries:
+        k = key(e.value)
+        if k in seen:
+            out.append(e)
+        else:
+            seen.add(k)
     return out
 
 
-def prune_nonexistent(parts: List[str]) -> List[str]:
-    return [p for p in parts if expand_exists(p)]
+def dedup_normalized(parts, shadow: Iterable[str] = (), key=None) -> PathList:
+    pl = _as_pathlist(parts)
+    drop = set(map(id, redundant_entries(pl, shadow, key)))
+    if drop:
+        pl.remove_where(lambda e: id(e) in drop)
+    return pl
 
 
-def add_path_once(parts: List[str], new_p: str) -> List[str]:
-    if new_p and new_p not in parts:
-        parts.append(new_p)
-    return parts
+def prune_nonexistent(parts, timeout: Optional[float] = None, on_timeout: str = "skip") -> PathList:
+    """
+    Убирает несуществующие пути. Проверки идут параллельно через existence_checker();
+    пути, не ответившие за timeout, оставляются (on_timeout="skip") или удаляются ("remove").
+    """
+    return _keep_existing(parts, existence_checker().check_many(parts, timeout=timeout), on_timeout)
 
 
-def rm_path_exact(parts: List[str], target: str) -> List[str]:
-    return [p for p in parts if p != target]
+def _keep_existing(parts, res: Dict[str, Optional[bool]], on_timeout: str = "skip") -> PathList:
+    keep_unknown = on_timeout != "remove"
+    pl = _as_pathlist(parts)
+    pl.remove_where(lambda e: not (res.get(e.value) or (res.get(e.value) is None and keep_unknown)))
+    return pl
+
+
+def add_path_once(parts, new_p: str) -> PathList:
+    pl = _as_pathlist(parts)
+    pl.add_once(new_p)
+    return pl
+
+
+def rm_path_exact(parts, target: str) -> PathList:
+    pl = _as_pathlist(parts)
+    pl.remove_value(target)
+    return pl
 
 
 # =========================
-# TOAST (Install Hub style)
+# PATH COMPACTION
 # =========================
 
-class ToastManager:
-    def __init__(self, root, theme):
-        self.root = root
-        self.theme = theme
-        self.active: List[ctk.CTkToplevel] = []
-
-    def show(self, title: str, text: str, ms=3000, width=380):
-        win = ctk.CTkToplevel(self.root)
-        win.overrideredirect(True)
-        win.attributes("-topmost", True)
-        win.attributes("-alpha", 0.0)
-        win.configure(fg_color=self.theme["CARD"])
-
-        frame = ctk.CTkFrame(
-            win,
-            fg_color=self.theme["CARD"],
-            corner_radius=12,
-            border_width=1,
-            border_color=self.theme["BORDER"],
-        )
-        frame.pack(fill="both", expand=True)
-
-        title_lbl = ctk.CTkLabel(frame, text=title, font=ctk.CTkFont(size=13, weight="bold"), text_color=self.theme["TEXT"])
-        body_lbl = ctk.CTkLabel(frame, text=text, font=ctk.CTkFont(size=12), text_color=self.theme["MUTED"], justify="left")
-        title_lbl.pack(anchor="w", padx=14, pady=(10, 2))
-        body_lbl.pack(anchor="w", padx=14, pady=(0, 12))
-
-        win.update_idletasks()
-        h = frame.winfo_reqheight() + 2
-        x = self.root.winfo_screenwidth() - width - 16
-        y = self.root.winfo_screenheight() - 16 - (len(self.active) * (h + 10)) - h
-        win.geometry(f"{width}x{h}+{x}+{y}")
-
-        self.active.append(win)
-        self._fade(win, 0.0, 0.98, step=0.08, delay=20)
-        win.after(ms, lambda: self._dismiss(win))
-
-    def _fade(self, win, a_from, a_to, step=0.05, delay=25):
-        a = a_from + step
-        if (step > 0 and a >= a_to) or (step < 0 and a <= a_to):
+# переменные, которые Windows задаёт сама и которыми можно сокращать PATH любой области
+WELL_KNOWN_VARS = (
+    "SystemRoot", "windir", "ProgramFiles", "ProgramFiles(x86)", "ProgramW6432",
+    "ProgramData", "CommonProgramFiles", "CommonProgramFiles(x86)",
+)
+_SEP_RE = re.compile(r"[\\/]")
+
+
+def _dir_prefixes(entry: str) -> List[str]:
+    """Каталоги-префиксы записи, включая её саму: C:\\A\\B -> C:\\A, C:\\A\\B."""
+    e = entry.rstrip("\\/")
+    out = [e[:m.start()] for m in _SEP_RE.finditer(e) if m.start() > 0]
+    out.append(e)
+    return [p for p in out if len(p) > 3]
+
+
+def _uses_prefix(entry: str, prefix: str) -> bool:
+    return entry.startswith(prefix) and (len(entry) == len(prefix) or entry[len(prefix)] in "\\/")
+
+
+class PathCompactor:
+    """
+    Укорачивает значение PATH: убирает повторы (normalize_path_key, User — и повторы Machine)
+    и выносит общие префиксы-каталоги во вспомогательные переменные (%NAME%). Если префикс уже
+    совпадает со значением существующей переменной (JAVA_HOME, ProgramFiles, ...), она переиспользуется.
+
+    Префикс выбирается жадно по выигрышу в символах, пока длина больше target (0 — сжимать до упора)
+    и вспомогательных переменных меньше max_vars. Записи, уже содержащие %VAR%, не трогаются:
+    вложенных ссылок между новыми переменными нет. Результат проверяется: раскрытый список
+    совпадает с исходным (после удаления повторов) по порядку и содержимому.
+    """
+
+    def __init__(self, parts: Iterable[str], scope: str, shadow: Iterable[str] = (), target: int = PATH_LIMIT_SOFT,
+                 max_vars: int = 16, dedup: bool = True, taken: Iterable[str] = ()):
+        self.parts = list(parts)
+        self.scope = scope
+        self.shadow = list(shadow)
+        self.target = max(0, int(target))
+        self.max_vars = max(0, int(max_vars))
+        self.dedup = dedup
+        self.taken = {n.casefold() for n in taken}
+        self.helpers: Dict[str, str] = {}  # новые переменные: имя -> значение
+        self.reused: List[str] = []        # существующие переменные, которые пошли в дело
+        self.removed: List[str] = []
+        self.before = len(_join_path(self.parts))
+        self.after = self.before
+
+    def _existing(self, exp: "EnvExpander") -> Dict[str, str]:
+        """{значение: имя} переменных, видимых PATH этой области (Machine не видит User)."""
+        names = list(WELL_KNOWN_VARS)
+        for sc in ("machine",) if self.scope == "machine" else ("machine", "user"):
             try:
-                win.attributes("-alpha", a_to)
+                names.extend(list_env(sc))
             except Exception:
                 pass
-            return
-        try:
-            win.attributes("-alpha", a)
-        except Exception:
-            return
-        win.after(delay, lambda: self._fade(win, a, a_to, step, delay))
-
-    def _dismiss(self, win):
-        if not win.winfo_exists():
-            return
-        try:
-            cur = float(win.attributes("-alpha"))
-        except Exception:
-            cur = 1.0
-        self._fade(win, cur, 0.0, step=-0.08, delay=20)
-        win.after(220, lambda: self._destroy(win))
-
-    def _destroy(self, win):
-        if win in self.active:
-            self.active.remove(win)
-        try:
-            win.destroy()
-        except Exception:
-            pass
+        out: Dict[str, str] = {}
+        for name in names:
+            if name.casefold() in MERGED_VARS or name.casefold() == "pathext":
+                continue
+            v = exp.value(name)
+            if v and PATH_SEP not in v and "%" not in v and len(v) > len(name) + 2:
+                out.setdefault(v.rstrip("\\/"), name)
+        return out
+
+    def _new_name(self, prefix: str, exp: "EnvExpander") -> str:
+        comps = [c for c in _SEP_RE.split(prefix) if c and not c.endswith(":")]
+        words: List[str] = []
+        for c in reversed(comps):
+            w = re.sub(r"[^A-Za-z0-9]+", "_", c).strip("_").upper()
+            if w:
+                words.insert(0, w)
+            if words and len("_".join(words)) >= 4 and not words[0][0].isdigit():
+                break
+        base = ("_".join(words) or "PATH_PREFIX")[:32]
+        if base[0].isdigit():
+            base = "P_" + base
+        name, n = base, 1
+        while name.casefold() in self.taken or exp.value(name) is not None:
+            n += 1
+            name = f"{base}_{n}"
+        return name
+
+    def run(self) -> PathList:
+        pl = PathList(self.parts)
+        if self.dedup:
+            self.removed = [e.value for e in redundant_entries(pl, self.shadow)]
+            dedup_normalized(pl, self.shadow)
+        baseline = pl.to_list()
+        entries = list(baseline)
+
+        # Machine PATH раскрывается по значениям Machine: подмена через User-переменную с тем же
+        # именем увела бы его в другое место, поэтому и поиск, и проверка идут без области User
+        if self.scope == "machine":
+            exp = EnvExpander.from_registry(("machine",))
+            try:
+                # новое имя не должно совпасть и с переменной пользователя
+                self.taken.update(n.casefold() for n in list_env("user"))
+            except Exception:
+                pass
+        else:
+            exp = EnvExpander.from_registry()
+        existing = self._existing(exp)
+        length = len(_join_path(entries))
+        while length > self.target and len(self.helpers) < self.max_vars:
+            count: Dict[str, int] = {}
+            for e in entries:
+                if "%" not in e:
+                    for p in _dir_prefixes(e):
+                        count[p] = count.get(p, 0) + 1
+            best, best_gain, best_name = None, 0, None
+            for p, c in count.items():
+                name = existing.get(p)
+                if name is None and c < 2:
+                    continue
+                ref = len(name or self._new_name(p, exp)) + 2
+                gain = c * (len(p) - ref)
+                if gain > best_gain or (gain == best_gain and best is not None and len(p) > len(best)):
+                    best, best_gain, best_name = p, gain, name
+            if best is None:
+                break
+            if best_name is None:
+                best_name = self._new_name(best, exp)
+                self.helpers[best_name] = best
+                self.taken.add(best_name.casefold())
+                exp.set(self.scope, best_name, best)
+            elif best_name not in self.reused:
+                self.reused.append(best_name)
+            ref = f"%{best_name}%"
+            entries = [ref + e[len(best):] if "%" not in e and _uses_prefix(e, best) else e for e in entries]
+            length = len(_join_path(entries))
+
+        if [exp.expand(e) for e in entries] != [exp.expand(e) for e in baseline]:
+            raise RuntimeError("сжатие изменило бы раскрытый PATH — отменено")
+        self.after = length
+        return PathList(entries)
 
 
 # =========================
-# UI DIALOGS
+# PATH DIFF
 # =========================
 
-class BigEditDialog(ctk.CTkToplevel):
-    def __init__(self, parent, theme, title: str, name: str = "", value: str = "", name_editable: bool = True):
-        super().__init__(parent)
-        self.theme = theme
-        self.result = None
-
-        self.title(title)
-        self.geometry("760x420")
-        self.resizable(False, False)
-        self.configure(fg_color=theme["BG"])
-        self.grab_set()
-        self.transient(parent)
-
-        card = ctk.CTkFrame(self, fg_color=theme["CARD"], corner_radius=15, border_width=1, border_color=theme["BORDER"])
-        card.pack(fill="both", expand=True, padx=14, pady=14)
-        card.grid_columnconfigure(0, weight=1)
-
-        ctk.CTkLabel(card, text=title, font=ctk.CTkFont(size=16, weight="bold"), text_color=theme["TEXT"]).grid(
-            row=0, column=0, columnspan=2, sticky="w", padx=14, pady=(12, 8)
-        )
+class DiffOp:
+    """Шаг сценария правки PATH: kind = insert | delete | move; old/new — позиции (None, если нет)."""
 
-        ctk.CTkLabel(card, text="Имя:", font=ctk.CTkFont(size=13, weight="bold"), text_color=theme["TEXT"]).grid(
-            row=1, column=0, sticky="w", padx=14, pady=(0, 6)
-        )
-        self.ent_name = ctk.CTkEntry(card, height=34)
-        self.ent_name.grid(row=2, column=0, columnspan=2, sticky="ew", padx=14, pady=(0, 12))
-        self.ent_name.insert(0, name or "")
-        if not name_editable:
-            self.ent_name.configure(state="disabled")
-
-        ctk.CTkLabel(card, text="Значение:", font=ctk.CTkFont(size=13, weight="bold"), text_color=theme["TEXT"]).grid(
-            row=3, column=0, sticky="w", padx=14, pady=(0, 6)
-        )
+    __slots__ = ("kind", "value", "old", "new")
 
-        self.txt_val = ctk.CTkTextbox(card, height=220, corner_radius=12, border_width=1, border_color=theme["BORDER"])
-        self.txt_val.grid(row=4, column=0, columnspan=2, sticky="nsew", padx=14, pady=(0, 10))
-        self.txt_val.insert("1.0", value or "")
+    def __init__(self, kind: str, value: str, old: Optional[int], new: Optional[int]):
+        self.kind = kind
+        self.value = value
+        self.old = old
+        self.new = new
 
-        btns = ctk.CTkFrame(card, fg_color=theme["CARD"])
-        btns.grid(row=5, column=0, columnspan=2, sticky="ew", padx=14, pady=(0, 14))
-        btns.grid_columnconfigure(0, weight=1)
+    def __repr__(self) -> str:
+        return f"DiffOp({self.kind!r}, {self.value!r}, {self.old!r}, {self.new!r})"
 
-        self.btn_ok = ctk.CTkButton(btns, text="Сохранить", corner_radius=15, command=self._ok, width=140)
-        self.btn_cancel = ctk.CTkButton(btns, text="Отмена", corner_radius=15, command=self._cancel, width=120)
 
-        self.btn_ok.pack(side="left")
-        self.btn_cancel.pack(side="right")
+def _lis(seq: List[int]) -> List[int]:
+    """Индексы (в seq) одной из наибольших возрастающих подпоследовательностей; O(n log n)."""
+    import bisect
+    tails: List[int] = []  # значения хвостов
+    tails_at: List[int] = []  # индексы хвостов в seq
+    prev = [-1] * len(seq)
+    for i, x in enumerate(seq):
+        k = bisect.bisect_left(tails, x)
+        if k == len(tails):
+            tails.append(x)
+            tails_at.append(i)
+        else:
+            tails[k] = x
+            tails_at[k] = i
+        prev[i] = tails_at[k - 1] if k else -1
+    out: List[int] = []
+    i = tails_at[-1] if tails_at else -1
+    while i >= 0:
+        out.append(i)
+        i = prev[i]
+    out.reverse()
+    return out
 
-        self._center(parent)
 
-    def _center(self, parent):
-        self.update_idletasks()
-        sw = self.winfo_screenwidth()
-        sh = self.winfo_screenheight()
-        w = self.winfo_width()
-        h = self.winfo_height()
-        x = (sw - w) // 2
-        y = (sh - h) // 2
-        self.geometry(f"{w}x{h}+{x}+{y}")
+def diff_path(old: Iterable[str], new: Iterable[str], key=None) -> List[DiffOp]:
+    """
+    Минимальный сценарий правки old -> new с учётом перемещений.
+    Элемент — токен (ключ, номер вхождения ключа), так что повторы сопоставляются по порядку
+    и каждый токен уникален. Тогда LCS двух списков — это наибольшая возрастающая
+    подпоследовательность старых позиций в новом порядке (O(n log n), 10 000 элементов — миллисекунды).
+    Общие элементы вне LCS — перемещения, несопоставленные — удаления/вставки.
+    Порядок результата: удаления (по старой позиции), затем перемещения и вставки (по новой).
+    """
+    keyf = key or (lambda v: v)
+    old = list(old)
+    seen: Dict[str, int] = {}
+    old_at: Dict[Tuple[str, int], int] = {}
+    for i, v in enumerate(old):
+        k = keyf(v)
+        n = seen.get(k, 0)
+        seen[k] = n + 1
+        old_at[(k, n)] = i
+
+    seen = {}
+    pairs: List[Tuple[int, int]] = []
+    inserts: List[DiffOp] = []
+    for j, v in enumerate(new):
+        k = keyf(v)
+        n = seen.get(k, 0)
+        seen[k] = n + 1
+        i = old_at.pop((k, n), None)
+        if i is None:
+            inserts.append(DiffOp("insert", v, None, j))
+        else:
+            pairs.append((i, j))
+
+    stable = set(_lis([i for i, _j in pairs]))
+    moves = [DiffOp("move", old[i], i, j) for n, (i, j) in enumerate(pairs) if n not in stable]
+    deletes = [DiffOp("delete", old[i], i, None) for i in sorted(old_at.values())]
+    return deletes + sorted(moves + inserts, key=lambda op: op.new)
+
+
+def format_path_diff(ops: List[DiffOp], scope: str = "") -> List[str]:
+    """Строки для вывода: "+ [j] путь", "- [i] путь", "~ [i -> j] путь" и итог."""
+    head = f"DIFF {scope}: " if scope else "DIFF: "
+    if not ops:
+        return [head + "без изменений"]
+    counts = {k: sum(1 for op in ops if op.kind == k) for k in ("insert", "delete", "move")}
+    lines = [head + f"+{counts['insert']} -{counts['delete']} ~{counts['move']}"]
+    for op in ops:
+        if op.kind == "insert":
+            lines.append(f"  + [{op.new}] {op.value}")
+        elif op.kind == "delete":
+            lines.append(f"  - [{op.old}] {op.value}")
+        else:
+            lines.append(f"  ~ [{op.old} -> {op.new}] {op.value}")
+    return lines
 
-    def _ok(self):
-        name = (self.ent_name.get() or "").strip()
-        val = self.txt_val.get("1.0", "end").rstrip("\n")
-        if not name:
-            return
-        self.result = (name, val)
-        self.destroy()
 
-    def _cancel(self):
-        self.result = None
-        self.destroy()
+# =========================
+# STAGED CHANGES
+# =========================
+
+class EnvStage:
+    """
+    Изменения переменных в памяти: каждое значение читается из реестра один раз,
+    а commit() пишет только реально изменённые — по одной записи на (scope, имя).
+    Имена сравниваются без учёта регистра, как в реестре.
+    """
+
+    def __init__(self):
+        self._orig: Dict[Tuple[str, str], Optional[str]] = {}
+        self._cur: Dict[Tuple[str, str], Optional[str]] = {}
+        self._names: Dict[Tuple[str, str], str] = {}
+
+    def _load(self, scope: str, name: str) -> Tuple[str, str]:
+        key = (scope, name.casefold())
+        if key not in self._orig:
+            cur = get_env(scope, name)
+            self._orig[key] = cur[0] if cur else None
+            self._cur[key] = self._orig[key]
+            self._names[key] = name
+        return key
+
+    def get(self, scope: str, name: str) -> Optional[str]:
+        return self._cur[self._load(scope, name)]
+
+    def set(self, scope: str, name: str, value: str) -> None:
+        self._cur[self._load(scope, name)] = value
+
+    def delete(self, scope: str, name: str) -> None:
+        self._cur[self._load(scope, name)] = None
+
+    def path(self, scope: str) -> PathList:
+        return PathList(_split_path(self.get(scope, "Path") or ""))
+
+    def set_path(self, scope: str, parts: Iterable[str]) -> None:
+        # тот же список — сырое значение не трогаем: иначе ';;' и пробелы вокруг элементов
+        # превратились бы в запись и рассылку без реальных изменений
+        key = self._load(scope, "Path")
+        parts = list(parts)
+        if parts == _split_path(self._cur[key] or ""):
+            return
+        if parts == _split_path(self._orig[key] or ""):
+            self._cur[key] = self._orig[key]
+            return
+        self._cur[key] = _join_path(parts)
+
+    def changes(self) -> List[Tuple[str, str, Optional[str]]]:
+        """[(scope, name, new_value | None=удалить)] в порядке первого обращения."""
+        return [
+            (key[0], self._names[key], self._cur[key])
+            for key in self._cur
+            if self._cur[key] != self._orig[key]
+        ]
+
+    def commit(self) -> List[Tuple[str, str, Optional[str]]]:
+        done = []
+        with env_batch():
+            for scope, name, value in self.changes():
+                if value is None:
+                    wrote = delete_env(scope, name)
+                else:
+                    wrote = set_env(scope, name, value)
+                key = (scope, name.casefold())
+                self._orig[key] = value
+                if wrote:
+                    done.append((scope, name, value))
+        return done
 
 
 # =========================
-# MAIN APP (customtkinter)
+# EDIT HISTORY
 # =========================
 
-class App(ctk.CTk):
-    def __init__(self):
-        super().__init__()
-
-        ctk.set_appearance_mode("dark")
-        ctk.set_default_color_theme("dark-blue")
-
-        self.th = _theme()
-        self.configure(fg_color=self.th["BG"])
-        self.title(APP_TITLE + ("" if is_admin() else " — Без прав администратора"))
-        self.geometry("1040x760")
-        self.resizable(False, False)
-
-        self.toaster = ToastManager(self, self.th)
-
-        top = ctk.CTkFrame(self, fg_color=self.th["BG"], corner_radius=0)
-        top.pack(fill="x", padx=16, pady=12)
-
-        ctk.CTkLabel(
-            top, text="Mahashe Env Manager",
-            font=ctk.CTkFont(size=18, weight="bold"),
-            text_color=self.th["TEXT"]
-        ).pack(side="left")
-
-        ctk.CTkButton(
-            top, text="Обновить всё",
-            corner_radius=15,
-            command=self.refresh_all
-        ).pack(side="right")
-
-        self.tabs = ctk.CTkTabview(
-            self,
-            corner_radius=15,
-            border_width=1,
-            border_color=self.th["BORDER"],
-            fg_color=self.th["BG"],
-            segmented_button_fg_color=self.th["CARD"],
-            segmented_button_selected_color=self.th["BLUE"],
-            segmented_button_selected_hover_color="#2563eb",
-            segmented_button_unselected_color=self.th["CARD"],
-            segmented_button_unselected_hover_color="#142352",
-            text_color="white",
-        )
-        self.tabs.pack(fill="both", expand=True, padx=12, pady=(0, 12))
+# Куски снимка PATH: граница — элемент, у которого младшие биты хеша нулевые (в среднем раз
+# в 32 элемента), но не длиннее _CHUNK_MAX. Границы зависят только от содержимого.
+_CHUNK_MASK = 31
+_CHUNK_MAX = 128
+HISTORY_LIMIT = 500
 
-        self.tab_path = self.tabs.add("PATH")
-        self.tab_env = self.tabs.add("Переменные среды")
 
-        self._build_path_tab()
-        self._build_env_tab()
+class PathSnapshot:
+    """
+    Неизменяемый снимок списка PATH — кортеж кусков (кортежей строк). Границы кусков
+    выбираются по содержимому, поэтому после вставки/удаления/правки меняются только
+    затронутые куски, а остальные take() берёт из предыдущего снимка как есть.
+    Сотня шагов по PATH из 10 000 элементов стоит памяти на изменённые куски, а не на 100 копий.
+    """
 
-        self.refresh_all()
+    __slots__ = ("chunks", "size")
+
+    def __init__(self, chunks: Tuple[Tuple[str, ...], ...] = (), size: int = 0):
+        self.chunks = chunks
+        self.size = size
+
+    @classmethod
+    def take(cls, values: Iterable[str], prev: Optional["PathSnapshot"] = None) -> "PathSnapshot":
+        known = {c: c for c in prev.chunks} if prev is not None else {}
+        chunks: List[Tuple[str, ...]] = []
+        cur: List[str] = []
+        size = 0
+        for v in values:
+            cur.append(v)
+            if not (hash(v) & _CHUNK_MASK) or len(cur) >= _CHUNK_MAX:
+                c = tuple(cur)
+                chunks.append(known.get(c, c))
+                size += len(cur)
+                cur = []
+        if cur:
+            c = tuple(cur)
+            chunks.append(known.get(c, c))
+            size += len(cur)
+        return cls(tuple(chunks), size)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        for c in self.chunks:
+            yield from c
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PathSnapshot):
+            return NotImplemented
+        # разбиение однозначно задаётся содержимым; общие куски сравниваются по тождеству
+        return self.size == other.size and self.chunks == other.chunks
+
+    __hash__ = None
+
+    def to_list(self) -> List[str]:
+        return [v for c in self.chunks for v in c]
+
+    def shared_with(self, other: "PathSnapshot") -> int:
+        """Сколько элементов лежит в кусках, общих с other (для замеров)."""
+        ids = {id(c) for c in other.chunks}
+        return sum(len(c) for c in self.chunks if id(c) in ids)
+
+
+class PathStep:
+    """Шаг истории над списком PATH: снимки до/после и несохранённые переменные сжатия."""
+
+    __slots__ = ("label", "before", "after", "helpers_before", "helpers_after")
+
+    def __init__(self, label: str, before: PathSnapshot, after: PathSnapshot,
+                 helpers_before: Optional[Dict[str, str]] = None, helpers_after: Optional[Dict[str, str]] = None):
+        self.label = label
+        self.before = before
+        self.after = after
+        self.helpers_before = helpers_before or {}
+        self.helpers_after = helpers_after or {}
+
+
+class EnvStep:
+    """
+    Шаг истории над переменными: changes = [(scope, name, до, после)], до/после — (value, reg_type)
+    или None (переменной нет). Переменные пишутся в реестр сразу, поэтому откат — тоже запись.
+    """
 
-    # ---------------- PATH TAB ----------------
+    __slots__ = ("label", "changes")
 
-    def _card(self, parent):
-        f = ctk.CTkFrame(parent, fg_color=self.th["CARD"], corner_radius=15, border_width=1, border_color=self.th["BORDER"])
-        f._is_card = True
-        return f
+    def __init__(self, label: str, changes: List[Tuple[str, str, Optional[Tuple[str, int]], Optional[Tuple[str, int]]]]):
+        self.label = label
+        self.changes = changes
 
-    def _build_path_tab(self):
-        root = ctk.CTkFrame(self.tab_path, fg_color=self.th["BG"], corner_radius=0)
-        root.pack(fill="both", expand=True, padx=10, pady=10)
+    def apply(self, undo: bool) -> None:
+        with env_batch():
+            for scope, name, before, after in (reversed(self.changes) if undo else self.changes):
+                target = before if undo else after
+                if target is None:
+                    delete_env(scope, name)
+                else:
+                    set_env(scope, name, target[0], target[1])
 
-        top_card = self._card(root)
-        top_card.pack(fill="x", padx=6, pady=(0, 10))
-        top_card.grid_columnconfigure(1, weight=1)
 
-        ctk.CTkLabel(top_card, text="PATH редактор", font=ctk.CTkFont(size=14, weight="bold")).grid(
-            row=0, column=0, sticky="w", padx=14, pady=(12, 6)
-        )
+class EditHistory:
+    """
+    Линейная история правок с курсором: steps[:cursor] применены, steps[cursor:] — для redo.
+    Новый шаг отбрасывает хвост redo; старше limit шагов не хранится.
+    """
 
-        self.path_scope = ctk.CTkOptionMenu(top_card, values=["both", "user", "machine"])
-        self.path_scope.set("both")
-        self.path_scope.grid(row=0, column=1, sticky="e", padx=14, pady=(12, 6))
-
-        self.path_search = ctk.CTkEntry(top_card, placeholder_text="Поиск по PATH")
-        self.path_search.grid(row=1, column=0, columnspan=2, sticky="ew", padx=14, pady=(0, 12))
-        self.path_search.bind("<KeyRelease>", lambda e: self._path_apply_filter())
-
-        self.path_list = ctk.CTkScrollableFrame(
-            root,
-            corner_radius=15,
-            fg_color=self.th["BG"],
-            border_width=0,
-            scrollbar_button_color=self.th["BG"],
-            scrollbar_button_hover_color=self.th["BG"],
-            scrollbar_fg_color=self.th["BG"],
-        )
-        self.path_list.pack(fill="both", expand=True, padx=6, pady=(0, 10))
-
-        bottom = self._card(root)
-        bottom.pack(fill="x", padx=6, pady=(0, 0))
-
-        b1 = ctk.CTkButton(bottom, text="Добавить папку", corner_radius=15, command=self.path_add_folder)
-        b2 = ctk.CTkButton(bottom, text="Удалить выбранные", corner_radius=15, command=self.path_delete_selected)
-        b3 = ctk.CTkButton(bottom, text="Удалить дубликаты", corner_radius=15, command=self.path_dedup)
-        b4 = ctk.CTkButton(bottom, text="Удалить несуществующие", corner_radius=15, command=self.path_prune)
-        b5 = ctk.CTkButton(bottom, text="Сохранить", corner_radius=15, command=self.path_apply)
-
-        b1.pack(side="left", padx=12, pady=12)
-        b2.pack(side="left", padx=(0, 10), pady=12)
-        b3.pack(side="left", padx=(0, 10), pady=12)
-        b4.pack(side="left", padx=(0, 10), pady=12)
-        b5.pack(side="right", padx=12, pady=12)
-
-        self._path_rows = []
-        self._path_items: List[str] = []
-
-    def _path_load(self) -> List[str]:
-        scope = self.path_scope.get()
-        items: List[str] = []
-        if scope == "user":
-            items = read_path("user")
-        elif scope == "machine":
-            items = read_path("machine")
-        else:
-            u = read_path("user")
-            m = read_path("machine")
-            seen = set()
-            out = []
-            for p in u + m:
-                if p not in seen:
-                    seen.add(p)
-                    out.append(p)
-            items = out
-        return items
-
-    def _path_rebuild(self):
-        for w in self.path_list.winfo_children():
-            w.destroy()
-        self._path_rows.clear()
-
-        items = self._path_items
-        counts = Counter(items)
-        flt = (self.path_search.get() or "").strip().lower()
-
-        for p in items:
-            if flt and flt not in p.lower():
-                continue
+    def __init__(self, limit: int = HISTORY_LIMIT):
+        self.limit = max(1, int(limit))
+        self.steps: List[object] = []
+        self.cursor = 0
+
+    def push(self, step) -> None:
+        del self.steps[self.cursor:]
+        self.steps.append(step)
+        if len(self.steps) > self.limit:
+            del self.steps[: len(self.steps) - self.limit]
+        self.cursor = len(self.steps)
+
+    def can_undo(self) -> bool:
+        return self.cursor > 0
+
+    def can_redo(self) -> bool:
+        return self.cursor < len(self.steps)
+
+    def peek(self, undo: bool):
+        """Шаг, который вернёт undo() (или redo()), без сдвига курсора; None — некуда."""
+        if undo:
+            return self.steps[self.cursor - 1] if self.can_undo() else None
+        return self.steps[self.cursor] if self.can_redo() else None
+
+    def undo(self):
+        """Шаг, который нужно откатить (курсор уже сдвинут), или None."""
+        if not self.can_undo():
+            return None
+        self.cursor -= 1
+        return self.steps[self.cursor]
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+        self.cursor += 1
+        return self.steps[self.cursor - 1]
+
+    def drop(self, kind: type) -> None:
+        """Убрать шаги одного вида (например, PathStep после перечитывания PATH)."""
+        applied = [s for s in self.steps[: self.cursor] if not isinstance(s, kind)]
+        pending = [s for s in self.steps[self.cursor:] if not isinstance(s, kind)]
+        self.steps = applied + pending
+        self.cursor = len(applied)
+
+    def clear(self) -> None:
+        self.steps = []
+        self.cursor = 0
+
+    def labels(self) -> List[str]:
+        return [s.label for s in self.steps]
 
-            valid = expand_exists(p)
-            dup = counts[p]
-
-            row = ctk.CTkFrame(self.path_list, fg_color=self.th["CARD"], corner_radius=14, border_width=1, border_color=self.th["BORDER"])
-            row.pack(fill="x", padx=6, pady=6)
-            row.grid_columnconfigure(2, weight=1)
-
-            var = ctk.BooleanVar(value=False)
-            cb = ctk.CTkCheckBox(row, text="", variable=var, width=24)
-            cb.grid(row=0, column=0, padx=(12, 8), pady=10)
-
-            dot = ctk.CTkLabel(row, text="●", width=12)
-            color = self.th["WARN"] if dup > 1 else (self.th["OK"] if valid else self.th["BAD"])
-            dot.configure(text_color=color, font=ctk.CTkFont(size=14, weight="bold"))
-            dot.grid(row=0, column=1, padx=(0, 8), pady=10)
-
-            ent = ctk.CTkEntry(row, height=34)
-            ent.grid(row=0, column=2, sticky="ew", padx=(0, 8), pady=10)
-            ent.insert(0, p)
-            ent.configure(state="readonly")
-
-            btn = ctk.CTkButton(row, text="⋮", width=44, corner_radius=12, command=lambda pp=p: self.path_row_menu(pp))
-            btn.grid(row=0, column=3, padx=(0, 12), pady=10)
-
-            self._path_rows.append((p, var))
-
-    def _path_apply_filter(self):
-        self._path_rebuild()
-
-    def path_row_menu(self, p: str):
-        win = ctk.CTkToplevel(self)
-        win.title("PATH")
-        win.geometry("360x180")
-        win.resizable(False, False)
-        win.configure(fg_color=self.th["BG"])
-        win.grab_set()
-        win.transient(self)
-
-        card = self._card(win)
-        card.pack(fill="both", expand=True, padx=14, pady=14)
-
-        ctk.CTkLabel(card, text="Действия", font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w", padx=14, pady=(12, 8))
-        ctk.CTkLabel(card, text=p, wraplength=320, text_color=self.th["MUTED"]).pack(anchor="w", padx=14, pady=(0, 10))
-
-        def do_edit():
-            win.destroy()
-            self.path_edit(p)
-
-        def do_del():
-            win.destroy()
-            self._path_items = rm_path_exact(self._path_items, p)
-            self._path_rebuild()
-
-        btns = ctk.CTkFrame(card, fg_color=self.th["CARD"])
-        btns.pack(fill="x", padx=14, pady=(0, 14))
-        ctk.CTkButton(btns, text="Редактировать", corner_radius=15, command=do_edit).pack(side="left")
-        ctk.CTkButton(btns, text="Удалить", corner_radius=15, command=do_del).pack(side="right")
-
-        win.update_idletasks()
-        sw = self.winfo_screenwidth()
-        sh = self.winfo_screenheight()
-        w = win.winfo_width()
-        h = win.winfo_height()
-        win.geometry(f"{w}x{h}+{(sw-w)//2}+{(sh-h)//2}")
-
-    def path_add_folder(self):
-        from tkinter import filedialog
-        d = filedialog.askdirectory(parent=self, title="Выберите папку для PATH")
-        if not d:
-            return
-        self._path_items = add_path_once(self._path_items, d)
-        self._path_rebuild()
-        self.toaster.show("PATH", "Путь добавлен в список", ms=2200)
-
-    def path_edit(self, p: str):
-        dlg = BigEditDialog(self, self.th, "Редактирование пути (PATH)", name="PathItem", value=p, name_editable=False)
-        self.wait_window(dlg)
-        if not dlg.result:
-            return
-        _, new_val = dlg.result
-        new_val = (new_val or "").strip().splitlines()[0].strip()
-        if not new_val:
-            return
+
+# =========================
+# EXISTENCE CHECKS
+# =========================
+
+class ExistenceChecker:
+    """
+    Проверка существования путей на пуле daemon-потоков с кэшем (TTL).
+    Зависшая сетевая шара блокирует только свой поток: check_many() ждёт каждый путь не дольше
+    timeout секунд с момента начала проверки и возвращает для него None ("неизвестно"),
+    check_async() в тот же срок сообщает None. Поток, зависший дольше timeout, списывается,
+    и вместо него запускается новый (не больше max_workers * STUCK_FACTOR висящих сразу),
+    так что очередь не встаёт. Поздний ответ всё равно попадает в кэш.
+    """
+
+    STUCK_FACTOR = 4
+    WATCH_TICK_S = 0.05
+
+    def __init__(self, max_workers: int = 16, timeout: float = 2.0, ttl: float = 30.0, expand=None):
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = float(timeout)
+        self.ttl = float(ttl)
+        self.expand = expand or os.path.expandvars
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._cache: Dict[str, Tuple[float, bool]] = {}  # expanded -> (monotonic stamp, exists)
+        self._pending: Dict[str, Future] = {}
+        self._stuck: List[threading.Thread] = []  # списанные потоки, которые ещё висят в проверке
+        self._watchdog: Optional[threading.Thread] = None
+
+    def _key(self, p: str) -> str:
         try:
-            idx = self._path_items.index(p)
-            self._path_items[idx] = new_val
-            self._path_rebuild()
-            self.toaster.show("PATH", "Путь обновлён", ms=2200)
-        except ValueError:
-            pass
+            return self.expand(p)
+        except Exception:
+            return p
 
-    def path_delete_selected(self):
-        selected = [p for (p, v) in self._path_rows if v.get()]
-        if not selected:
-            self.toaster.show("PATH", "Нечего удалять", ms=2000)
-            return
-        s = set(selected)
-        self._path_items = [p for p in self._path_items if p not in s]
-        self._path_rebuild()
-        self.toaster.show("PATH", f"Удалено: {len(selected)}", ms=2200)
-
-    def path_dedup(self):
-        self._path_items = dedup_keep_first(self._path_items)
-        self._path_rebuild()
-        self.toaster.show("PATH", "Дубликаты удалены", ms=2200)
-
-    def path_prune(self):
-        before = len(self._path_items)
-        self._path_items = prune_nonexistent(self._path_items)
-        removed = before - len(self._path_items)
-        self._path_rebuild()
-        self.toaster.show("PATH", f"Удалено несуществующих: {removed}", ms=2400)
-
-    def path_apply(self):
-        scope = self.path_scope.get()
+    @staticmethod
+    def _probe(path: str) -> bool:
         try:
-            if scope == "user":
-                write_path("user", self._path_items)
-                self.toaster.show("PATH", "Сохранено: USER", ms=2400)
-            elif scope == "machine":
-                if not is_admin():
-                    self.toaster.show("PATH", "Нужен админ для MACHINE", ms=2600)
-                    return
-                write_path("machine", self._path_items)
-                self.toaster.show("PATH", "Сохранено: MACHINE", ms=2400)
-            else:
-                write_path("user", self._path_items)
-                if is_admin():
-                    write_path("machine", self._path_items)
-                    self.toaster.show("PATH", "Сохранено: USER + MACHINE", ms=2600)
+            return os.path.exists(path)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _future(started: Optional[float] = None) -> Future:
+        fut: Future = Future()
+        fut.started = started
+        fut.worker = None
+        fut.timed_out = False
+        fut.on_timeout = []  # вызвать без аргументов, если проверка висит дольше timeout
+        return fut
+
+    def _spawn_locked(self) -> None:
+        t = threading.Thread(target=self._worker, name="exists-check", daemon=True)
+        self._threads.append(t)
+        t.start()
+
+    def _worker(self):
+        me = threading.current_thread()
+        while True:
+            key, fut = self._queue.get()
+            fut.worker = me
+            fut.started = time.monotonic()
+            res = self._probe(key)
+            with self._lock:
+                self._cache[key] = (time.monotonic(), res)
+                self._pending.pop(key, None)
+                retired = me not in self._threads
+                if retired and me in self._stuck:
+                    self._stuck.remove(me)
+            fut.set_result(res)
+            if retired:
+                return  # вместо этого потока уже работает замена
+
+    def _watch(self):
+        """Пока есть незавершённые проверки: списывать зависшие потоки и сообщать о просроченных путях."""
+        while True:
+            time.sleep(self.WATCH_TICK_S)
+            now = time.monotonic()
+            fire = []
+            with self._lock:
+                for fut in self._pending.values():
+                    if fut.timed_out or fut.started is None or now - fut.started < self.timeout:
+                        continue
+                    fut.timed_out = True
+                    fire.extend(fut.on_timeout)
+                    if fut.worker in self._threads:
+                        self._threads.remove(fut.worker)
+                        self._stuck = [t for t in self._stuck if t.is_alive()]
+                        self._stuck.append(fut.worker)
+                        if len(self._stuck) <= self.max_workers * self.STUCK_FACTOR:
+                            self._spawn_locked()
+                idle = not self._pending
+                if idle:
+                    self._watchdog = None
+            for cb in fire:
+                try:
+                    cb()
+                except Exception:
+                    pass
+            if idle:
+                return
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def peek(self, p: str) -> Optional[bool]:
+        """Результат из кэша без ожидания; None, если свежего результата нет."""
+        key = self._key(p)
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit is not None and time.monotonic() - hit[0] < self.ttl:
+            return hit[1]
+        return None
+
+    def submit(self, p: str) -> Future:
+        key = self._key(p)
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                fut = self._future(hit[0])
+                fut.set_result(hit[1])
+                return fut
+            fut = self._pending.get(key)
+            if fut is not None:
+                return fut
+            fut = self._future()
+            self._pending[key] = fut
+            if len(self._threads) < self.max_workers and len(self._threads) < len(self._pending):
+                self._spawn_locked()
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch, name="exists-watchdog", daemon=True)
+                self._watchdog.start()
+        self._queue.put((key, fut))
+        return fut
+
+    def check_async(self, paths: Iterable[str], callback) -> None:
+        """
+        callback(p, exists) вызывается из рабочего потока по мере готовности. Путь, проверка которого
+        висит дольше timeout, получает callback(p, None); если ответ всё же придёт — второй вызов с ним.
+        """
+        for p in dict.fromkeys(paths):
+            fut = self.submit(p)
+            with self._lock:
+                late = fut.timed_out and not fut.done()
+                if not late:
+                    fut.on_timeout.append(lambda p=p: callback(p, None))
+            if late:
+                callback(p, None)
+            fut.add_done_callback(lambda f, p=p: callback(p, f.result()))
+
+    def check_many(self, paths: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Optional[bool]]:
+        """{path: True|False|None}; None — не уложились в timeout."""
+        timeout = self.timeout if timeout is None else float(timeout)
+        futs = {p: self.submit(p) for p in dict.fromkeys(paths)}
+        # страховка на случай, когда все потоки висят и очередь не двигается
+        hard = time.monotonic() + timeout * (2 + len(futs) // self.max_workers)
+        out: Dict[str, Optional[bool]] = {}
+        pending = dict(futs)
+        while pending:
+            wait(list(pending.values()), timeout=0.05, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for p, fut in list(pending.items()):
+                if fut.done():
+                    out[p] = fut.result()
+                elif now >= hard or (fut.started is not None and now - fut.started >= timeout):
+                    out[p] = None
                 else:
-                    self.toaster.show("PATH", "Сохранено: USER (MACHINE требует админ)", ms=3000)
-        except PermissionError:
-            self.toaster.show("PATH", "Отказано в доступе (админ)", ms=2800)
-        except Exception as e:
-            self.toaster.show("PATH", f"Ошибка: {e}", ms=3400)
+                    continue
+                del pending[p]
+        return out
 
-    # ---------------- ENV TAB ----------------
 
-    def _build_env_tab(self):
-        root = ctk.CTkFrame(self.tab_env, fg_color=self.th["BG"], corner_radius=0)
-        root.pack(fill="both", expand=True, padx=10, pady=10)
+_EXISTENCE_CHECKER: Optional[ExistenceChecker] = None
 
-        top_card = self._card(root)
-        top_card.pack(fill="x", padx=6, pady=(0, 10))
-        top_card.grid_columnconfigure(2, weight=1)
 
-        ctk.CTkLabel(top_card, text="Переменные среды", font=ctk.CTkFont(size=14, weight="bold")).grid(
-            row=0, column=0, sticky="w", padx=14, pady=(12, 6)
-        )
+def existence_checker() -> ExistenceChecker:
+    global _EXISTENCE_CHECKER
+    if _EXISTENCE_CHECKER is None:
+        # пути раскрываются по реестру, а не по (устаревшему) окружению процесса
+        _EXISTENCE_CHECKER = ExistenceChecker(expand=lambda p: env_expander().expand(p))
+    return _EXISTENCE_CHECKER
 
-        self.env_scope = ctk.CTkOptionMenu(top_card, values=["user", "machine", "both"], command=lambda _: self.env_reload())
-        self.env_scope.set("user")
-        self.env_scope.grid(row=0, column=1, sticky="e", padx=14, pady=(12, 6))
-
-        self.env_search = ctk.CTkEntry(top_card, placeholder_text="Поиск по переменным (имя/значение)")
-        self.env_search.grid(row=1, column=0, columnspan=2, sticky="ew", padx=14, pady=(0, 12))
-        self.env_search.bind("<KeyRelease>", lambda e: self.env_rebuild())
-
-        self.env_list = ctk.CTkScrollableFrame(
-            root,
-            corner_radius=15,
-            fg_color=self.th["BG"],
-            border_width=0,
-            scrollbar_button_color=self.th["BG"],
-            scrollbar_button_hover_color=self.th["BG"],
-            scrollbar_fg_color=self.th["BG"],
-        )
-        self.env_list.pack(fill="both", expand=True, padx=6, pady=(0, 10))
 
-        bottom = self._card(root)
-        bottom.pack(fill="x", padx=6, pady=0)
+# =========================
+# EXECUTABLE INDEX
+# =========================
+
+DEFAULT_PATHEXT = ".COM;.EXE;.BAT;.CMD;.VBS;.VBE;.JS;.JSE;.WSF;.WSH;.MSC"
+EXEC_INDEX_ENV_VAR = "MAHASHE_EXEC_INDEX"
+EXEC_INDEX_VERSION = 1
+
+
+def _default_exec_index_file() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "Mahashe", "exec_index.json")
 
-        ctk.CTkButton(bottom, text="Создать переменную", corner_radius=15, command=self.env_create).pack(
-            side="left", padx=12, pady=12
-        )
-        ctk.CTkButton(bottom, text="Обновить список", corner_radius=15, command=self.env_reload).pack(
-            side="right", padx=12, pady=12
-        )
 
-        self._env_data = []  # list of tuples (scope, name, value, regtype)
+def pathext() -> List[str]:
+    """Расширения исполняемых файлов (casefold) в порядке PATHEXT из реестра."""
+    raw = env_expander().value("PATHEXT") or DEFAULT_PATHEXT
+    return list(dict.fromkeys(e.strip().casefold() for e in raw.split(PATH_SEP) if e.strip().startswith(".")))
 
-    def env_reload(self):
-        self._env_data.clear()
-        scope = self.env_scope.get()
 
-        def load_one(sc):
+def effective_path(machine: Optional[Iterable[str]] = None, user: Optional[Iterable[str]] = None) -> List[Tuple[str, str, str]]:
+    """
+    PATH, который увидит новый процесс: Machine, затем User (по умолчанию — из реестра,
+    можно подставить несохранённый список). -> [(scope, исходный элемент, раскрытый каталог)],
+    повторы (по normalize_path_key) убраны.
+    """
+    exp = env_expander()
+    seen = set()
+    out: List[Tuple[str, str, str]] = []
+    for scope, parts in (("machine", machine), ("user", user)):
+        for raw in read_path(scope) if parts is None else parts:
+            d = exp.expand(raw).strip().strip('"')
+            k = normalize_path_key(d)
+            if not d or k in seen:
+                continue
+            seen.add(k)
+            out.append((scope, raw, d))
+    return out
+
+
+def _parallel_iter(fn, items: Iterable, max_workers: int = 16, timeout: float = 2.0):
+    """
+    (item, fn(item) | None) по мере готовности, на daemon-потоках: зависший каталог (сетевая шара)
+    не держит ни остальные результаты, ни выход из процесса; через timeout секунд после начала
+    его результат считается None. Исключение в fn — тоже None.
+    """
+    items = list(dict.fromkeys(items))
+    if not items:
+        return
+    q: "queue.Queue" = queue.Queue()
+    futs: Dict = {}
+    for it in items:
+        fut: Future = Future()
+        fut.started = None
+        futs[it] = fut
+        q.put((it, fut))
+
+    def worker():
+        while True:
             try:
-                d = list_env(sc)
-                for k, (v, t) in d.items():
-                    self._env_data.append((sc, k, v, t))
-            except PermissionError:
-                pass
+                it, fut = q.get_nowait()
+            except queue.Empty:
+                return
+            fut.started = time.monotonic()
+            try:
+                fut.set_result(fn(it))
             except Exception:
-                pass
+                fut.set_result(None)
+
+    for _ in range(min(max(1, int(max_workers)), len(items))):
+        threading.Thread(target=worker, name="path-scan", daemon=True).start()
+
+    hard = time.monotonic() + timeout * (2 + len(items) // max(1, int(max_workers)))
+    pending = dict(futs)
+    while pending:
+        wait(list(pending.values()), timeout=0.05, return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+        for it, fut in list(pending.items()):
+            if fut.done():
+                res = fut.result()
+            elif now >= hard or (fut.started is not None and now - fut.started >= timeout):
+                res = None
+            else:
+                continue
+            del pending[it]
+            yield it, res
 
-        if scope in ("user", "both"):
-            load_one("user")
-        if scope in ("machine", "both"):
-            load_one("machine")
 
-        self._env_data.sort(key=lambda x: (x[1].lower(), x[0]))
-        self.env_rebuild()
-        self.toaster.show("Переменные среды", "Список обновлён", ms=1700)
+def _parallel_map(fn, items: Iterable, max_workers: int = 16, timeout: float = 2.0) -> Dict:
+    """{item: fn(item) | None} — то же, что _parallel_iter, но целиком."""
+    return dict(_parallel_iter(fn, items, max_workers=max_workers, timeout=timeout))
 
-    def env_rebuild(self):
-        for w in self.env_list.winfo_children():
-            w.destroy()
 
-        flt = (self.env_search.get() or "").strip().lower()
+class ExecIndex:
+    """
+    Индекс "каталог -> имена исполняемых файлов" на диске (JSON).
+    Каталог пересканируется, только если изменился его mtime (добавление/удаление/переименование
+    файлов меняет mtime каталога); каталоги, ушедшие из PATH, выбрасываются, новые — сканируются.
+    Сканирование — параллельно, с таймаутом на каталог.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_workers: int = 16, timeout: float = 2.0):
+        self.path = path or os.environ.get(EXEC_INDEX_ENV_VAR) or _default_exec_index_file()
+        self.max_workers = max_workers
+        self.timeout = float(timeout)
+        self._dirs: Dict[str, dict] = {}  # normalize_path_key -> {"path", "mtime", "names"}
+        self._exts: List[str] = []
+        self._loaded = False
+        self.last_scanned = 0
+        self.last_timeouts: List[str] = []
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if isinstance(data, dict) and data.get("version") == EXEC_INDEX_VERSION:
+            self._exts = list(data.get("pathext") or [])
+            self._dirs = dict(data.get("dirs") or {})
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": EXEC_INDEX_VERSION, "pathext": self._exts, "dirs": self._dirs}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _scan(d: str, cached: Optional[dict], exts: List[str]) -> dict:
+        """Запись индекса для каталога; {} — каталога нет или он недоступен."""
+        try:
+            mtime = os.stat(d).st_mtime_ns
+            if cached is not None and cached.get("mtime") == mtime:
+                return cached
+            extset = set(exts)
+            names = []
+            with os.scandir(d) as it:
+                for e in it:
+                    if os.path.splitext(e.name)[1].casefold() in extset and e.is_file():
+                        names.append(e.name)
+        except OSError:
+            return {}
+        return {"path": d, "mtime": mtime, "names": names, "scanned": True}
+
+    def scan_iter(self, dirs: Iterable[str], force: bool = False):
+        """
+        Привести индекс к списку каталогов, отдавая (ключ, каталог, статус) по мере готовности:
+        "ok" | "missing" (нет каталога/доступа) | "timeout". Каталоги не из dirs выбрасываются.
+        """
+        self._load()
+        exts = pathext()
+        if force or exts != self._exts:
+            self._dirs = {}
+            self._exts = exts
+        keyed = {normalize_path_key(d): d for d in dirs}
+        changed = False
+        for k in list(self._dirs):
+            if k not in keyed:
+                del self._dirs[k]
+                changed = True
+
+        self.last_scanned = 0
+        self.last_timeouts = []
+        try:
+            for k, entry in _parallel_iter(
+                lambda k: self._scan(keyed[k], self._dirs.get(k), exts),
+                keyed,
+                max_workers=self.max_workers,
+                timeout=self.timeout,
+            ):
+                if not entry:
+                    # нет каталога, нет доступа или таймаут — в индексе его быть не должно
+                    if self._dirs.pop(k, None) is not None:
+                        changed = True
+                    if entry is None:
+                        self.last_timeouts.append(keyed[k])
+                    yield k, keyed[k], "missing" if entry is not None else "timeout"
+                    continue
+                if entry.pop("scanned", False):
+                    self._dirs[k] = entry
+                    self.last_scanned += 1
+                    changed = True
+                yield k, keyed[k], "ok"
+        finally:
+            if changed:
+                try:
+                    self._save()
+                except OSError:
+                    pass
+
+    def refresh(self, dirs: Iterable[str], force: bool = False) -> List[str]:
+        """scan_iter() целиком; -> ключи каталогов в порядке dirs."""
+        dirs = list(dirs)
+        for _ in self.scan_iter(dirs, force=force):
+            pass
+        return list(dict.fromkeys(normalize_path_key(d) for d in dirs))
+
+    def names(self, key: str) -> List[str]:
+        return self._dirs.get(key, {}).get("names", [])
+
+    def dir_path(self, key: str) -> str:
+        return self._dirs.get(key, {}).get("path", "")
+
+    def candidates(self, name: str) -> List[str]:
+        """Имена, которые пробует cmd.exe для name: само имя (если расширение из PATHEXT), затем name+ext."""
+        ext = os.path.splitext(name)[1].casefold()
+        out = [name] if ext and ext in self._exts else []
+        out.extend(name + e for e in self._exts)
+        return out
+
+    def which(self, name: str, path: List[Tuple[str, str, str]], all_matches: bool = False) -> List[Tuple[str, str]]:
+        """-> [(полный путь, scope)] в порядке поиска (как where.exe); без all_matches — только первый."""
+        keys = self.refresh(d for _sc, _raw, d in path)
+        scopes = {normalize_path_key(d): sc for sc, _raw, d in path}
+        wanted = [c.casefold() for c in self.candidates(name)]
+        out: List[Tuple[str, str]] = []
+        for k in keys:
+            if k not in self._dirs:
+                continue
+            have = {n.casefold(): n for n in self.names(k)}
+            for c in wanted:
+                if c in have:
+                    out.append((os.path.join(self.dir_path(k), have[c]), scopes.get(k, "")))
+                    if not all_matches:
+                        return out
+        return out
+
 
-        for sc, name, val, _t in self._env_data:
-            if flt and (flt not in name.lower()) and (flt not in (val or "").lower()):
+def scan_shadowed(path: List[Tuple[str, str, str]], on_shadow=None, on_dir=None, ix: Optional[ExecIndex] = None) -> List[tuple]:
+    """
+    Команды, которые есть больше чем в одном каталоге PATH (по имени без расширения, как их ищет cmd.exe).
+    path — effective_path(). Каталоги сканируются параллельно; каталог обрабатывается, как только
+    готовы он и все каталоги перед ним, поэтому победитель уже окончательный, а не ответивший каталог
+    задерживает отчёт не дольше таймаута.
+
+    on_shadow(hit) — сразу по каждому найденному затенению, hit = (имя, победитель, scope победителя,
+    затенённый файл, scope, cross_scope). on_dir(done, total, каталог, статус) — по готовности каталога.
+    Оба вызываются из вызывающего потока. -> все hit в порядке PATH.
+    """
+    ix = ix or exec_index()
+    order = [normalize_path_key(d) for _sc, _raw, d in path]
+    scopes = {k: sc for k, (sc, _raw, _d) in zip(order, path)}
+    rank = {e: i for i, e in enumerate(pathext())}
+    winners: Dict[str, Tuple[str, str]] = {}
+    ready: Dict[str, bool] = {}
+    hits: List[tuple] = []
+    nxt = 0
+    done = 0
+
+    for k, d, status in ix.scan_iter([d for _sc, _raw, d in path]):
+        done += 1
+        ready[k] = status == "ok"
+        if on_dir:
+            on_dir(done, len(order), d, status)
+        while nxt < len(order) and order[nxt] in ready:
+            key = order[nxt]
+            nxt += 1
+            if not ready[key]:
                 continue
+            # в одном каталоге побеждает расширение, стоящее раньше в PATHEXT
+            best: Dict[str, str] = {}
+            for n in ix.names(key):
+                stem, ext = os.path.splitext(n)
+                cur = best.get(stem.casefold())
+                if cur is None or rank.get(ext.casefold(), 99) < rank.get(os.path.splitext(cur)[1].casefold(), 99):
+                    best[stem.casefold()] = n
+            sc = scopes[key]
+            for stem, n in best.items():
+                full = os.path.join(ix.dir_path(key), n)
+                win = winners.get(stem)
+                if win is None:
+                    winners[stem] = (full, sc)
+                    continue
+                hit = (os.path.splitext(os.path.basename(win[0]))[0], win[0], win[1], full, sc, win[1] != sc)
+                hits.append(hit)
+                if on_shadow:
+                    on_shadow(hit)
+    return hits
 
-            card = ctk.CTkFrame(self.env_list, fg_color=self.th["CARD"], corner_radius=15, border_width=1, border_color=self.th["BORDER"])
-            card.pack(fill="x", padx=6, pady=6)
-            card.grid_columnconfigure(1, weight=1)
 
-            badge = "USER" if sc == "user" else "MACHINE"
-            badge_color = self.th["BLUE"] if sc == "user" else "#6b7280"
+_EXEC_INDEX: Optional[ExecIndex] = None
 
-            b = ctk.CTkLabel(card, text=badge, text_color=self.th["TEXT"])
-            b.configure(font=ctk.CTkFont(size=11, weight="bold"))
-            b.grid(row=0, column=0, padx=(12, 10), pady=10, sticky="w")
 
-            lbl = ctk.CTkLabel(card, text=name, font=ctk.CTkFont(size=13, weight="bold"), text_color=self.th["TEXT"])
-            lbl.grid(row=0, column=1, padx=(0, 10), pady=(10, 2), sticky="w")
+def exec_index() -> ExecIndex:
+    global _EXEC_INDEX
+    if _EXEC_INDEX is None:
+        _EXEC_INDEX = ExecIndex()
+    return _EXEC_INDEX
 
-            short = (val or "").replace("\r", "").replace("\n", " ")
-            if len(short) > 140:
-                short = short[:140] + "…"
-            sub = ctk.CTkLabel(card, text=short, font=ctk.CTkFont(size=12), text_color=self.th["MUTED"], wraplength=720, justify="left")
-            sub.grid(row=1, column=1, padx=(0, 10), pady=(0, 10), sticky="w")
 
-            for w in (card, lbl, sub, b):
-                w.bind("<Double-Button-1>", lambda _e, s=sc, n=name: self.env_edit_open(s, n))
+def set_exec_index(ix: Optional[ExecIndex]) -> None:
+    global _EXEC_INDEX
+    _EXEC_INDEX = ix
 
-            btn = ctk.CTkButton(card, text="⋮", width=44, corner_radius=12, command=lambda s=sc, n=name: self.env_row_menu(s, n))
-            btn.grid(row=0, column=2, rowspan=2, padx=(0, 12), pady=10, sticky="e")
 
-            try:
-                b.configure(text_color="white")
-                b._text_label.configure(bg=badge_color)  # type: ignore[attr-defined]
-            except Exception:
-                pass
+# =========================
+# PATH OPTIMIZER
+# =========================
 
-    def env_row_menu(self, scope: str, name: str):
-        win = ctk.CTkToplevel(self)
-        win.title("Переменная")
-        win.geometry("380x200")
-        win.resizable(False, False)
-        win.configure(fg_color=self.th["BG"])
-        win.grab_set()
-        win.transient(self)
-
-        card = self._card(win)
-        card.pack(fill="both", expand=True, padx=14, pady=14)
-
-        ctk.CTkLabel(card, text="Действия", font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w", padx=14, pady=(12, 8))
-        ctk.CTkLabel(card, text=f"{scope.upper()}  •  {name}", text_color=self.th["MUTED"]).pack(anchor="w", padx=14, pady=(0, 10))
-
-        def do_edit():
-            win.destroy()
-            self.env_edit_open(scope, name)
-
-        def do_del():
-            win.destroy()
-            self.env_delete(scope, name)
-
-        btns = ctk.CTkFrame(card, fg_color=self.th["CARD"])
-        btns.pack(fill="x", padx=14, pady=(0, 14))
-        ctk.CTkButton(btns, text="Редактировать", corner_radius=15, command=do_edit).pack(side="left")
-        ctk.CTkButton(btns, text="Удалить", corner_radius=15, command=do_del).pack(side="right")
-
-        win.update_idletasks()
-        sw = self.winfo_screenwidth()
-        sh = self.winfo_screenheight()
-        w = win.winfo_width()
-        h = win.winfo_height()
-        win.geometry(f"{w}x{h}+{(sw-w)//2}+{(sh-h)//2}")
-
-    def env_create(self):
-        dlg = BigEditDialog(self, self.th, "Создать переменную среды", name="", value="", name_editable=True)
-        self.wait_window(dlg)
-        if not dlg.result:
-            return
-        name, val = dlg.result
-        scope = self.env_scope.get()
+PROBE_NAME = "__mahashe_probe__.exe"
+
+
+def probe_cost(d: str, runs: int = 3) -> List[float]:
+    """Время (с) неудачной проверки файла в каталоге — столько платит каждый поиск, проходящий мимо."""
+    target = os.path.join(d, PROBE_NAME)
+    out = []
+    for _ in range(max(1, int(runs))):
+        t0 = time.perf_counter()
         try:
-            if scope == "both":
-                set_env("user", name, val)
-                if is_admin():
-                    set_env("machine", name, val)
-                    self.toaster.show("Переменные", f"Создано: USER + MACHINE: {name}", ms=2600)
-                else:
-                    self.toaster.show("Переменные", f"Создано: USER (MACHINE требует админ): {name}", ms=3200)
+            os.stat(target)
+        except OSError:
+            pass
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def _median(xs: List[float]) -> float:
+    xs = sorted(xs)
+    n = len(xs)
+    return (xs[n // 2] + xs[(n - 1) // 2]) / 2 if n else 0.0
+
+
+def _percentile(xs: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу (q в 0..100)."""
+    xs = sorted(xs)
+    if not xs:
+        return 0.0
+    return xs[min(len(xs) - 1, max(0, int(-(-q * len(xs) // 100)) - 1))]
+
+
+def _time_dir(d: str) -> Tuple[float, Optional[float]]:
+    """(доступ к каталогу, полный листинг) в секундах; листинг None — каталога нет/нет доступа."""
+    t0 = time.perf_counter()
+    try:
+        os.stat(d)
+    except OSError:
+        return time.perf_counter() - t0, None
+    t1 = time.perf_counter()
+    try:
+        with os.scandir(d) as it:
+            for _ in it:
+                pass
+    except OSError:
+        return t1 - t0, None
+    return t1 - t0, time.perf_counter() - t1
+
+
+def profile_path_entries(parts: Iterable[str], runs: int = 5, timeout: float = 2.0, on_run=None) -> List[dict]:
+    """
+    Задержки каждого элемента PATH: runs проходов, в каждом все каталоги параллельно,
+    каждый не дольше timeout (не ответивший — timeout секунд в выборке и +1 к timeouts).
+    on_run(i, runs) — после каждого прохода. -> записи по убыванию p50, с долей в общей цене:
+    {"raw", "dir", "p50", "p95", "list_p50", "timeouts", "missing", "share"}; цена — доступ к каталогу,
+    его платит каждый поиск команды, дошедший до этого элемента.
+    """
+    exp = env_expander()
+    entries: Dict[str, dict] = {}
+    for raw in parts:
+        d = exp.expand(raw).strip().strip('"')
+        k = normalize_path_key(d)
+        if d and k not in entries:
+            entries[k] = {"raw": raw, "dir": d, "access": [], "list": [], "timeouts": 0, "missing": False}
+    dirs = {k: e["dir"] for k, e in entries.items()}
+    runs = max(1, int(runs))
+    for i in range(runs):
+        for k, res in _parallel_iter(lambda k: _time_dir(dirs[k]), dirs, timeout=timeout):
+            e = entries[k]
+            if res is None:
+                e["timeouts"] += 1
+                e["access"].append(timeout)
+                continue
+            e["access"].append(res[0])
+            if res[1] is None:
+                e["missing"] = True
             else:
-                if scope == "machine" and not is_admin():
-                    self.toaster.show("Переменные", "Нужен админ для MACHINE", ms=2800)
-                    return
-                set_env(scope, name, val)
-                self.toaster.show("Переменные", f"Создано/обновлено: {scope.upper()}: {name}", ms=2600)
-        except Exception as e:
-            self.toaster.show("Переменные", f"Ошибка: {e}", ms=3600)
+                e["list"].append(res[1])
+        if on_run:
+            on_run(i + 1, runs)
 
-        self.env_reload()
+    out = []
+    for e in entries.values():
+        out.append({
+            "raw": e["raw"],
+            "dir": e["dir"],
+            "p50": _percentile(e["access"], 50),
+            "p95": _percentile(e["access"], 95),
+            "list_p50": _percentile(e["list"], 50) if e["list"] else None,
+            "timeouts": e["timeouts"],
+            "missing": e["missing"],
+        })
+    total = sum(e["p50"] for e in out) or 1.0
+    for e in out:
+        e["share"] = e["p50"] / total
+    out.sort(key=lambda e: (e["p50"], e["p95"]), reverse=True)
+    return out
 
-    def env_edit_open(self, scope: str, name: str):
-        cur = get_env(scope, name)
-        if not cur:
-            self.toaster.show("Переменные", "Переменная не найдена", ms=2400)
-            return
-        value, _t = cur
 
-        dlg = BigEditDialog(self, self.th, f"Редактирование переменной ({scope.upper()})", name=name, value=value, name_editable=False)
-        self.wait_window(dlg)
-        if not dlg.result:
-            return
-        _n, new_val = dlg.result
+def format_path_profile(report: List[dict], top: Optional[int] = None) -> List[str]:
+    """Строки отчёта -profilepath (общие для CLI и GUI)."""
+    lines = [f"{'#':>3}  {'p50 мс':>9}  {'p95 мс':>9}  {'лист мс':>9}  {'доля':>6}  {'тайм.':>5}  путь"]
+    for i, e in enumerate(report[:top] if top else report, 1):
+        lst = "-" if e["list_p50"] is None else f"{e['list_p50'] * 1000:.3f}"
+        note = " (нет каталога)" if e["missing"] else ""
+        lines.append(
+            f"{i:>3}  {e['p50'] * 1000:>9.3f}  {e['p95'] * 1000:>9.3f}  {lst:>9}  {e['share'] * 100:>5.1f}%  "
+            f"{e['timeouts']:>5}  {e['raw']}{note}"
+        )
+    return lines
+
 
+def load_usage_profile(src: str) -> Dict[str, float]:
+    """
+    Профиль использования команд: JSON {"git": 120, ...} или строки "git 120" / "git,120"
+    ('#' — комментарий, без числа — 1). Имена — как их набирают (git, python.exe).
+    """
+    with open(src, "r", encoding="utf-8-sig") as f:
+        text = f.read()
+    if text.lstrip().startswith("{"):
+        return {str(k): float(v) for k, v in json.loads(text).items() if float(v) > 0}
+    out: Dict[str, float] = {}
+    for n, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].replace(",", " ").strip()
+        if not line:
+            continue
+        parts = line.split()
         try:
-            if scope == "machine" and not is_admin():
-                self.toaster.show("Переменные", "Нужен админ для MACHINE", ms=2800)
-                return
-            set_env(scope, name, new_val)
-            self.toaster.show("Переменные", f"Сохранено: {scope.upper()}: {name}", ms=2400)
-        except Exception as e:
-            self.toaster.show("Переменные", f"Ошибка: {e}", ms=3600)
+            freq = float(parts[1]) if len(parts) > 1 else 1.0
+        except ValueError:
+            raise ValueError(f"строка {n}: ожидалось '<команда> [частота]'")
+        if freq > 0:
+            out[parts[0]] = out.get(parts[0], 0.0) + freq
+    return out
 
-        self.env_reload()
 
-    def env_delete(self, scope: str, name: str):
-        try:
-            if scope == "machine" and not is_admin():
-                self.toaster.show("Переменные", "Нужен админ для MACHINE", ms=2800)
-                return
-            delete_env(scope, name)
-            self.toaster.show("Переменные", f"Удалено: {scope.upper()}: {name}", ms=2400)
-        except Exception as e:
-            self.toaster.show("Переменные", f"Ошибка: {e}", ms=3600)
-        self.env_reload()
+class PathOptimizer:
+    """
+    Порядок PATH, при котором частые команды находятся раньше, а результат поиска
+    любой команды (по имени без расширения и с ним) остаётся прежним.
+
+    Для каждого каталога меряется цена промаха (probe_cost) и берётся список исполняемых
+    файлов из ExecIndex. Поиск команды c стоит сумму цен каталогов до её победителя, так что
+    средняя цена = sum(w_i * C_i): w_i — частота команд, побеждающих в каталоге i,
+    C_i — суммарная цена каталогов до i включительно. Каталоги ставятся жадно по правилу
+    Смита (w/p по убыванию) среди тех, чьи предшественники уже стоят: победитель каждого имени
+    обязан остаться перед остальными каталогами с этим именем.
+
+    Machine и User переставляются только внутри себя. Не ответившие каталоги (содержимое
+    неизвестно) остаются на месте и делят область на независимые куски. Повторы и пустые
+    элементы уходят в конец своей области — до них поиск не доходит.
+    """
 
-    # ---------------- COMMON ----------------
+    def __init__(self, machine: Iterable[str], user: Iterable[str], profile: Optional[Dict[str, float]] = None,
+                 ix: Optional[ExecIndex] = None, runs: int = 3, timeout: float = 2.0):
+        self.parts = {"machine": list(machine), "user": list(user)}
+        self.profile = profile
+        self.ix = ix or exec_index()
+        self.runs = runs
+        self.timeout = float(timeout)
+        self.exts: List[str] = []
+        self.nodes: List[dict] = []          # уникальные каталоги в порядке поиска
+        self.tail: Dict[str, List[int]] = {"machine": [], "user": []}  # повторы/пустые: позиции
+        self.empty: List[str] = []           # существуют, но без исполняемых файлов
+        self.unknown: List[str] = []         # не ответили — содержимое неизвестно
+        self.cost_before = self.cost_after = 0.0      # средняя цена поиска, с
+        self.probes_before = self.probes_after = 0.0  # среднее число проверок файлов на поиск
+        self._measured = False
+
+    # ---- измерение ----
+
+    def measure(self) -> None:
+        exp = env_expander()
+        seen = set()
+        self.nodes = []
+        self.tail = {"machine": [], "user": []}
+        self.empty = []
+        self.unknown = []
+        self._measured = True
+        for scope in ("machine", "user"):
+            for i, raw in enumerate(self.parts[scope]):
+                d = exp.expand(raw).strip().strip('"')
+                k = normalize_path_key(d)
+                if not d or k in seen:
+                    self.tail[scope].append(i)
+                    continue
+                seen.add(k)
+                self.nodes.append({"scope": scope, "pos": i, "raw": raw, "dir": d, "key": k})
+
+        self.ix.timeout = self.timeout
+        status = {k: st for k, _d, st in self.ix.scan_iter([n["dir"] for n in self.nodes])}
+        self.exts = pathext()
+        costs = _parallel_map(lambda d: _median(probe_cost(d, self.runs)), [n["dir"] for n in self.nodes], timeout=self.timeout)
+        for n in self.nodes:
+            n["status"] = status.get(n["key"], "timeout")
+            n["names"] = self.ix.names(n["key"]) if n["status"] == "ok" else []
+            c = costs.get(n["dir"])
+            # не ответил при замере — считаем по таймауту, это честная верхняя оценка
+            n["cost"] = max(1e-7, self.timeout if c is None else c)
+            if n["status"] == "ok" and not n["names"]:
+                self.empty.append(n["raw"])
+            elif n["status"] == "timeout":
+                self.unknown.append(n["raw"])
+
+    # ---- модель поиска ----
+
+    def _keys_of(self, n: dict) -> Dict[str, int]:
+        """{имя (casefold, без расширения и с ним): ранг расширения в PATHEXT}."""
+        rank = {e: i for i, e in enumerate(self.exts)}
+        out: Dict[str, int] = {}
+        for name in n["names"]:
+            stem, ext = os.path.splitext(name.casefold())
+            r = rank.get(ext, len(self.exts))
+            out[name.casefold()] = 0
+            if r < out.get(stem, len(self.exts) + 1):
+                out[stem] = r
+        return out
+
+    def _winners(self, order: List[dict]) -> Dict[str, str]:
+        win: Dict[str, str] = {}
+        for n in order:
+            for k in n["keys"]:
+                win.setdefault(k, n["key"])
+        return win
+
+    def _demand(self) -> Dict[str, float]:
+        if self.profile:
+            out: Dict[str, float] = {}
+            for cmd, f in self.profile.items():
+                c = cmd.casefold()
+                out[c] = out.get(c, 0.0) + f
+            return out
+        # без профиля все команды из PATH считаются одинаково частыми
+        return {os.path.splitext(name.casefold())[0]: 1.0 for n in self.nodes for name in n["names"]}
+
+    def _expected(self, order: List[dict], demand: Dict[str, float]) -> Tuple[float, float]:
+        """(средняя цена поиска, среднее число проверок) для порядка каталогов."""
+        pos = {n["key"]: i for i, n in enumerate(order)}
+        prefix_cost = [0.0]
+        for n in order:
+            prefix_cost.append(prefix_cost[-1] + n["cost"] * len(self.exts))
+        win = self._winners(order)
+        total = sum(demand.values()) or 1.0
+        cost = probes = 0.0
+        for c, f in demand.items():
+            k = win.get(c)
+            if k is None:
+                cost += f * prefix_cost[-1]
+                probes += f * len(order) * len(self.exts)
+                continue
+            i = pos[k]
+            r = order[i]["keys"][c] + 1
+            cost += f * (prefix_cost[i] + order[i]["cost"] * r)
+            probes += f * (i * len(self.exts) + r)
+        return cost / total, probes / total
+
+    # ---- план ----
+
+    def _order_chunk(self, chunk: List[dict], win: Dict[str, str], demand: Dict[str, float]) -> List[dict]:
+        if len(chunk) < 2:
+            return chunk
+        by_key = {n["key"]: n for n in chunk}
+        weight = {n["key"]: 0.0 for n in chunk}
+        for c, f in demand.items():
+            k = win.get(c)
+            if k in weight:
+                weight[k] += f
+        # рёбра: победитель имени -> другие каталоги куска с этим именем
+        succ: Dict[str, set] = {n["key"]: set() for n in chunk}
+        indeg = {n["key"]: 0 for n in chunk}
+        for n in chunk:
+            for name in n["keys"]:
+                w = win[name]
+                if w != n["key"] and w in by_key and n["key"] not in succ[w]:
+                    succ[w].add(n["key"])
+                    indeg[n["key"]] += 1
+        orig = {n["key"]: i for i, n in enumerate(chunk)}
+        ready = [k for k in indeg if indeg[k] == 0]
+        out: List[dict] = []
+        while ready:
+            best = max(ready, key=lambda k: (weight[k] / by_key[k]["cost"], -orig[k]))
+            ready.remove(best)
+            out.append(by_key[best])
+            for k in succ[best]:
+                indeg[k] -= 1
+                if indeg[k] == 0:
+                    ready.append(k)
+        return out
+
+    def plan(self) -> Dict[str, List[int]]:
+        """{scope: перестановка позиций исходного списка} (для PathList.reorder)."""
+        if not self._measured:
+            self.measure()
+        for n in self.nodes:
+            n["keys"] = self._keys_of(n)
+        demand = self._demand()
+        win = self._winners(self.nodes)
+
+        new_nodes: List[dict] = []
+        for scope in ("machine", "user"):
+            chunk: List[dict] = []
+            for n in (n for n in self.nodes if n["scope"] == scope):
+                if n["status"] == "timeout":
+                    new_nodes += self._order_chunk(chunk, win, demand) + [n]
+                    chunk = []
+                else:
+                    chunk.append(n)
+            new_nodes += self._order_chunk(chunk, win, demand)
 
-    def refresh_all(self):
-        try:
-            self._path_items = self._path_load()
-            self._path_rebuild()
-        except Exception as e:
-            self.toaster.show("PATH", f"Ошибка чтения PATH: {e}", ms=3800)
+        if self._winners(new_nodes) != win:
+            # страховка: поменялся бы результат поиска — оставляем как было
+            new_nodes = list(self.nodes)
+        self.cost_before, self.probes_before = self._expected(self.nodes, demand)
+        self.cost_after, self.probes_after = self._expected(new_nodes, demand)
 
-        try:
-            self.env_reload()
-        except Exception as e:
-            self.toaster.show("Переменные", f"Ошибка чтения: {e}", ms=3800)
+        return {
+            scope: [n["pos"] for n in new_nodes if n["scope"] == scope] + self.tail[scope]
+            for scope in ("machine", "user")
+        }
+
+
+# =========================
+# SEARCH
+# =========================
+
+SEARCH_MODES = ("text", "word", "regex")
+
+
+class SearchIndex:
+    """
+    Фильтр по заранее свёрнутым (casefold) ключам: ключи считаются один раз при загрузке данных.
+    В режиме "text", если новый запрос продолжает предыдущий, перебирается только прошлый результат.
+    search() возвращает индексы подходящих ключей; некорректный regex -> re.error.
+    """
+
+    def __init__(self, keys: Iterable[str] = ()):
+        self.reset(keys)
+
+    def reset(self, keys: Iterable[str]) -> None:
+        self._keys = [(k or "").casefold() for k in keys]
+        self._last_query = ""
+        self._last_mode = "text"
+        self._last_result: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def search(self, query: str, mode: str = "text") -> List[int]:
+        if mode not in SEARCH_MODES:
+            raise ValueError("mode must be text|word|regex")
+        q = (query or "").strip()
+        if not q:
+            self._last_query, self._last_mode, self._last_result = "", mode, None
+            return list(range(len(self._keys)))
+
+        keys = self._keys
+        if mode == "text":
+            q = q.casefold()
+            prev = self._last_result
+            if prev is not None and self._last_mode == "text" and q.startswith(self._last_query):
+                out = [i for i in prev if q in keys[i]]
+            else:
+                out = [i for i, k in enumerate(keys) if q in k]
+        else:
+            if mode == "word":
+                rx = re.compile(r"(?<!\w)" + re.escape(q.casefold()) + r"(?!\w)")
+            else:
+                rx = re.compile(q, re.IGNORECASE)
+            found = rx.search
+            out = [i for i, k in enumerate(keys) if found(k)]
+
+        self._last_query, self._last_mode, self._last_result = (q if mode == "text" else ""), mode, out
+        return out
 
 
 # =========================
@@ -945,16 +2613,53 @@ def print_help():
 {APP_TITLE}
 
 ENV:
-  {exe} -set  <NAME> <VALUE...> [--scope user|machine]   создать/обновить переменную
-  {exe} -del  <NAME> [--scope user|machine]              удалить переменную
-  {exe} -get  <NAME> [--scope user|machine]              получить значение
+  {exe} -set  <NAME> <VALUE...> [--scope user|machine] [--dry-run]
+                                                         создать/обновить переменную
+  {exe} -del  <NAME> [--scope user|machine] [--dry-run]  удалить переменную
+  {exe} -get  <NAME> [--scope user|machine] [--expand]   получить значение
+                                                         (--expand: раскрыть %VAR% по реестру, как при новом входе)
   {exe} -list [--scope user|machine|both]                вывести список
 
 PATH:
   {exe} -addpath <PATH...> [--scope user|machine|both]   добавить элемент в PATH
   {exe} -rmpath  <PATH...> [--scope user|machine|both]   удалить точное совпадение из PATH
-  {exe} -deduppath [--scope user|machine|both]           удалить дубликаты в PATH
-  {exe} -prunepath [--scope user|machine|both]           удалить несуществующие из PATH
+  {exe} -deduppath [--scope user|machine|both] [--normalize]
+                                                         удалить дубликаты в PATH
+                                                         (--normalize: без учёта регистра, хвостового '\\',
+                                                          '.'/'..' и %VAR%; из User убираются и повторы Machine)
+  {exe} -prunepath [--scope user|machine|both] [--timeout SEC] [--on-timeout skip|remove]
+                                                         удалить несуществующие из PATH
+                                                         (не ответившие за SEC пути: skip — оставить, remove — удалить)
+  {exe} -compactpath [--scope user|machine|both] [--target N] [--max-vars N] [--no-dedup] [--apply]
+                                                         сократить PATH: убрать повторы и вынести общие каталоги
+                                                         в переменные (%NAME%), пока длина больше N (по умолчанию
+                                                         2047; 0 — до упора); раскрытый PATH не меняется;
+                                                         без --apply только показывает план
+  {exe} -profilepath [--scope user|machine|both] [--runs N] [--timeout SEC] [--top N]
+                                                         задержка доступа и листинга каждого каталога PATH
+                                                         (p50/p95 по N проходам, каждый не дольше SEC),
+                                                         самые медленные сверху, с долей в общей цене поиска
+  {exe} -optimizepath [--profile FILE] [--scope user|machine|both] [--apply] [--runs N] [--timeout SEC]
+                                                         переставить PATH так, чтобы частые команды находились
+                                                         быстрее, не меняя, какой файл найдётся для любой команды;
+                                                         FILE — "команда частота" по строкам или JSON (без него —
+                                                         все команды равновероятны); EMPTY — каталоги без исполняемых;
+                                                         без --apply только показывает план
+
+WHICH:
+  {exe} -which <NAME> [--all] [--timeout SEC] [--rescan]
+                                                         какой файл найдётся по PATH (Machine, затем User) и PATHEXT
+                                                         (--all: все совпадения по порядку; индекс каталогов — на диске,
+                                                          пересканируются только изменившиеся каталоги)
+  {exe} -shadowed [--cross-scope] [--timeout SEC]        команды, которые есть в нескольких каталогах PATH:
+                                                         кто побеждает и кого затеняет (по мере сканирования);
+                                                         --cross-scope: только User против Machine
+
+BATCH:
+  {exe} -batch <file|->                                  операции из файла (или stdin), по одной на строку:
+                                                         set NAME VALUE... / del NAME [--scope user|machine]
+                                                         addpath|rmpath PATH... / dedup [--normalize] / prune [--scope ...]
+                                                         одно чтение и одна запись на значение, одна рассылка
 
 GUI:
   {exe} -gui
@@ -963,6 +2668,12 @@ def print_help():
   {exe} -h
   {exe} -help
 
+Общие флаги:
+  --no-broadcast   не рассылать WM_SETTINGCHANGE (по умолчанию — одна рассылка в конце команды)
+  --dry-run        -set/-del и команды PATH: показать, что изменится, и ничего не записывать
+                   (PATH — вставки "+", удаления "-" и перемещения "~" с позициями; для -compactpath
+                   и -optimizepath перекрывает --apply)
+
 Алиасы:
   --score работает как --scope
 
@@ -1001,6 +2712,162 @@ def _take_value_until_flags(tokens: List[str]) -> str:
     return " ".join(out).strip()
 
 
+BATCH_OPS = {
+    "set": "set", "del": "del",
+    "addpath": "addpath", "rmpath": "rmpath",
+    "dedup": "dedup", "deduppath": "dedup",
+    "prune": "prune", "prunepath": "prune",
+}
+
+
+def _path_targets(sc: str) -> List[str]:
+    return [t for t in ("user", "machine") if sc in (t, "both")]
+
+
+def _read_batch_lines(src: str) -> List[str]:
+    if src == "-":
+        return sys.stdin.read().splitlines()
+    with open(src, "r", encoding="utf-8-sig") as f:
+        return f.read().splitlines()
+
+
+def _parse_batch_line(tokens: List[str]):
+    """-> (op, scope, arg) или (None, код, сообщение) при ошибке."""
+    op = BATCH_OPS.get(tokens[0].lower().lstrip("-"))
+    if op is None:
+        return None, 2, f"неизвестная операция: {tokens[0]}"
+    if op in ("set", "del"):
+        sc = _scope_from_args(tokens, "user")
+        if sc == "both":
+            return None, 2, f"{op} не поддерживает scope=both"
+        if len(tokens) < 2 or tokens[1].startswith("--"):
+            return None, 2, f"{op} требует <NAME>"
+        if op == "del":
+            return op, sc, tokens[1]
+        value = _take_value_until_flags(tokens[2:])
+        if not value:
+            return None, 2, "set: пустое VALUE"
+        return op, sc, (tokens[1], value)
+    sc = _scope_from_args(tokens, "both")
+    if op in ("addpath", "rmpath"):
+        p = _take_value_until_flags(tokens[1:])
+        if not p:
+            return None, 2, f"{op}: пустой PATH"
+        return op, sc, p
+    if op == "prune":
+        on_timeout = (_arg_value_any(tokens, ["--on-timeout"], "skip") or "skip").lower()
+        if on_timeout not in ("skip", "remove"):
+            return None, 2, "prune: --on-timeout должен быть skip|remove"
+        try:
+            timeout = float(_arg_value_any(tokens, ["--timeout"], "2") or "2")
+        except ValueError:
+            return None, 2, "prune: --timeout должен быть числом"
+        return op, sc, (timeout, on_timeout)
+    return op, sc, "--normalize" in tokens
+
+
+def cli_batch(src: str) -> int:
+    """
+    -batch <file|->: операции по одной на строку (set/del/addpath/rmpath/dedup/prune + --scope),
+    '#' — комментарий. Всё применяется к EnvStage в памяти, затем каждое изменённое значение
+    пишется один раз и уходит одна рассылка. Ошибка разбора любой строки — ничего не пишем.
+    """
+    try:
+        lines = _read_batch_lines(src)
+    except Exception as e:
+        return exit_with(1, f"ERROR: -batch: не удалось прочитать {src}: {e}")
+
+    ops = []
+    bad = 0
+    for n, line in enumerate(lines, 1):
+        tokens = line.strip().split()
+        if not tokens or tokens[0].startswith("#"):
+            continue
+        op, sc, arg = _parse_batch_line(tokens)
+        if op is None:
+            eprint(f"ERROR [{n}]: {arg}")
+            bad = max(bad, sc)
+            continue
+        if sc == "machine" and not is_admin():
+            eprint(f"ERROR [{n}]: {op}: нет прав для scope=machine")
+            bad = max(bad, 5)
+            continue
+        ops.append((n, op, sc, arg))
+    if bad:
+        return exit_with(bad, "ERROR: -batch: ошибки в сценарии, ничего не записано.")
+
+    stage = EnvStage()
+    rc = 0
+    try:
+        for n, op, sc, arg in ops:
+            if op == "set":
+                name, value = arg
+                stage.set(sc, name, value)
+                okprint(f"OK [{n}]: set {sc}:{name}")
+                continue
+            if op == "del":
+                stage.delete(sc, arg)
+                okprint(f"OK [{n}]: del {sc}:{arg}")
+                continue
+
+            for t in _path_targets(sc):
+                if t == "machine" and not is_admin():
+                    eprint(f"WARN [{n}]: {op} machine пропущен: нужен админ")
+                    rc = 5
+                    continue
+                parts = stage.path(t)
+                before = len(parts)
+                if op == "addpath":
+                    parts = add_path_once(parts, arg)
+                elif op == "rmpath":
+                    parts = rm_path_exact(parts, arg)
+                elif op == "dedup" and arg:
+                    parts = dedup_normalized(parts, shadow=stage.path("machine") if t == "user" else ())
+                elif op == "dedup":
+                    parts = dedup_keep_first(parts)
+                else:
+                    timeout, on_timeout = arg
+                    parts = prune_nonexistent(parts, timeout=timeout, on_timeout=on_timeout)
+                stage.set_path(t, parts)
+                okprint(f"OK [{n}]: {op} {t}: {before} -> {len(parts)}")
+
+        written = stage.commit()
+    except PermissionError as e:
+        return exit_with(5, f"ERROR: -batch: {e}")
+    except Exception as e:
+        return exit_with(1, f"ERROR: -batch failed: {e}")
+
+    for scope, name, value in written:
+        okprint(f"WRITE: {scope}:{name}" + (" (удалено)" if value is None else ""))
+    okprint(f"OK: -batch: операций {len(ops)}, записано значений {len(written)}" + ("" if written else " (unchanged)"))
+    return rc
+
+
+def _write_status(status: Dict[str, bool]) -> str:
+    """Хвост для OK-строки: ' (unchanged)' или список областей без изменений."""
+    if not any(status.values()):
+        return " (unchanged)"
+    same = [t for t, wrote in status.items() if not wrote]
+    return f" (unchanged: {', '.join(same)})" if same else ""
+
+
+def _print_path_diff(scope: str, old, new) -> None:
+    for line in format_path_diff(diff_path(old, new), scope):
+        okprint(line)
+
+
+def _print_env_diff(scope: str, name: str, value: Optional[str]) -> None:
+    """--dry-run для -set/-del: старое и новое значение; для Path — ещё и по элементам."""
+    cur = get_env(scope, name)
+    old = cur[0] if cur else None
+    if old == value:
+        okprint(f"DIFF {scope}:{name}: без изменений")
+        return
+    okprint(f"DIFF {scope}:{name}: " + ("(нет)" if old is None else repr(old)) + " -> " + ("(удалить)" if value is None else repr(value)))
+    if name.casefold() == "path":
+        _print_path_diff(scope, _split_path(old or ""), _split_path(value or ""))
+
+
 def cli_run() -> Optional[int]:
     _require_windows_registry()
 
@@ -1008,6 +2875,11 @@ def cli_run() -> Optional[int]:
     if not args:
         return None
 
+    if "--no-broadcast" in args:
+        broadcaster().discard()
+        broadcaster().enabled = False
+        args = [a for a in args if a != "--no-broadcast"]
+
     a0 = args[0].lower()
 
     if a0 in ("-h", "-help", "--help", "/?"):
@@ -1017,6 +2889,11 @@ def cli_run() -> Optional[int]:
     if a0 == "-gui":
         return None
 
+    if a0 == "-batch":
+        if len(args) < 2:
+            return exit_with(2, "ERROR: -batch требует <file|->.")
+        return cli_batch(args[1])
+
     # ENV
     if a0 == "-list":
         sc = _scope_from_args(args, "both")
@@ -1060,7 +2937,13 @@ def cli_run() -> Optional[int]:
             v = get_env(sc, name)
             if not v:
                 return exit_with(1, f"ERROR: Переменная не найдена: {sc}:{name}")
-            okprint(v[0])
+            if "--expand" in args and v[1] == REG_EXPAND_SZ:
+                exp = env_expander()
+                okprint(exp.expand(v[0]))
+                for k in exp.cycles(v[0]):
+                    eprint(f"WARN: цикл ссылок, %{k}% не раскрыта")
+            else:
+                okprint(v[0])
             return 0
         except Exception as e:
             return exit_with(1, f"ERROR: get failed: {e}")
@@ -1075,11 +2958,14 @@ def cli_run() -> Optional[int]:
         value = _take_value_until_flags(args[2:])
         if not value:
             return exit_with(2, "ERROR: -set: пустое VALUE.")
+        if "--dry-run" in args:
+            _print_env_diff(sc, name, value)
+            return exit_with(0, f"OK: set {sc}:{name} (dry-run: не записано)")
         if sc == "machine" and not is_admin():
             return exit_with(5, "ERROR: Нет прав. Запусти от администратора для scope=machine.")
         try:
-            set_env(sc, name, value)
-            return exit_with(0, f"OK: set {sc}:{name}")
+            wrote = set_env(sc, name, value)
+            return exit_with(0, f"OK: set {sc}:{name}" + ("" if wrote else " (unchanged)"))
         except PermissionError as e:
             return exit_with(5, f"ERROR: {e}")
         except Exception as e:
@@ -1092,11 +2978,14 @@ def cli_run() -> Optional[int]:
         sc = _scope_from_args(args, "user")
         if sc == "both":
             return exit_with(2, "ERROR: -del не поддерживает scope=both. Используй user или machine.")
+        if "--dry-run" in args:
+            _print_env_diff(sc, name, None)
+            return exit_with(0, f"OK: del {sc}:{name} (dry-run: не записано)")
         if sc == "machine" and not is_admin():
             return exit_with(5, "ERROR: Нет прав. Запусти от администратора для scope=machine.")
         try:
-            delete_env(sc, name)
-            return exit_with(0, f"OK: del {sc}:{name}")
+            wrote = delete_env(sc, name)
+            return exit_with(0, f"OK: del {sc}:{name}" + ("" if wrote else " (unchanged)"))
         except PermissionError as e:
             return exit_with(5, f"ERROR: {e}")
         except Exception as e:
@@ -1117,27 +3006,234 @@ def cli_run() -> Optional[int]:
         if sc in ("machine", "both"):
             targets.append("machine")
 
-        wrote_machine = False
+        dry = "--dry-run" in args
+        status: Dict[str, bool] = {}
         try:
             for t in targets:
-                if t == "machine" and not is_admin():
+                if t == "machine" and not is_admin() and not dry:
+                    continue
+                old = read_path(t)
+                parts = add_path_once(old.copy(), p) if a0 == "-addpath" else rm_path_exact(old.copy(), p)
+                if dry:
+                    _print_path_diff(t, old, parts)
                     continue
-                parts = read_path(t)
-                parts = add_path_once(parts, p) if a0 == "-addpath" else rm_path_exact(parts, p)
-                write_path(t, parts)
-                if t == "machine":
-                    wrote_machine = True
+                # список не изменился — не трогаем реестр вовсе (только чтение)
+                status[t] = parts != old and write_path(t, parts)
+            if dry:
+                return exit_with(0, f"OK: {a0} ({sc}) (dry-run: не записано)")
 
             if sc in ("machine", "both") and not is_admin():
                 return exit_with(5, "ERROR: Нет прав. Запусти от администратора для scope=machine.")
-            return exit_with(0, f"OK: {a0} ({sc})" + ("" if wrote_machine or sc == "user" else ""))
+            return exit_with(0, f"OK: {a0} ({sc})" + _write_status(status))
         except PermissionError:
             return exit_with(5, "ERROR: Нет прав. Запусти от администратора для записи в MACHINE.")
         except Exception as e:
             return exit_with(1, f"ERROR: {a0} failed: {e}")
 
+    if a0 == "-which":
+        if len(args) < 2 or args[1].startswith("--"):
+            return exit_with(2, "ERROR: -which требует <NAME>.")
+        name = args[1]
+        try:
+            timeout = float(_arg_value_any(args, ["--timeout"], "2") or "2")
+        except ValueError:
+            return exit_with(2, "ERROR: --timeout должен быть числом (секунды).")
+        try:
+            ix = exec_index()
+            ix.timeout = timeout
+            if "--rescan" in args:
+                ix.refresh((), force=True)
+            found = ix.which(name, effective_path(), all_matches="--all" in args)
+        except Exception as e:
+            return exit_with(1, f"ERROR: -which failed: {e}")
+        for d in ix.last_timeouts:
+            eprint(f"WARN: каталог не ответил за {timeout:g} c, пропущен: {d}")
+        if not found:
+            return exit_with(1, f"ERROR: не найдено в PATH: {name}")
+        for full, _scope in found:
+            okprint(full)
+        return 0
+
+    if a0 == "-shadowed":
+        try:
+            timeout = float(_arg_value_any(args, ["--timeout"], "2") or "2")
+        except ValueError:
+            return exit_with(2, "ERROR: --timeout должен быть числом (секунды).")
+        only_cross = "--cross-scope" in args
+
+        def on_shadow(hit):
+            name, win, win_sc, path, sc, cross = hit
+            if only_cross and not cross:
+                return
+            okprint(f"SHADOW: {name}: {win} ({win_sc}) затеняет {path} ({sc})" + (" [между областями]" if cross else ""))
+
+        def on_dir(_done, _total, d, status):
+            if status == "timeout":
+                eprint(f"WARN: каталог не ответил за {timeout:g} c, пропущен: {d}")
+
+        try:
+            ix = exec_index()
+            ix.timeout = timeout
+            path = effective_path()
+            hits = scan_shadowed(path, on_shadow=on_shadow, on_dir=on_dir, ix=ix)
+        except Exception as e:
+            return exit_with(1, f"ERROR: -shadowed failed: {e}")
+        cross = sum(1 for h in hits if h[5])
+        return exit_with(0, f"OK: -shadowed: затенённых: {len(hits)} (между областями: {cross}), каталогов: {len(path)}")
+
+    if a0 == "-compactpath":
+        sc = _scope_from_args(args, "both")
+        try:
+            target = int(_arg_value_any(args, ["--target"], str(PATH_LIMIT_SOFT)) or PATH_LIMIT_SOFT)
+            max_vars = int(_arg_value_any(args, ["--max-vars"], "16") or "16")
+        except ValueError:
+            return exit_with(2, "ERROR: --target/--max-vars должны быть числами.")
+        apply = "--apply" in args
+
+        plans = {}
+        taken: List[str] = []
+        try:
+            machine = read_path("machine")
+            for t in ("machine", "user"):
+                if t not in _path_targets(sc):
+                    continue
+                comp = PathCompactor(
+                    read_path(t) if t == "user" else machine, t,
+                    shadow=machine if t == "user" else (),
+                    target=target, max_vars=max_vars, dedup="--no-dedup" not in args, taken=taken,
+                )
+                plans[t] = (comp, comp.run())
+                taken.extend(comp.helpers)
+        except Exception as e:
+            return exit_with(1, f"ERROR: -compactpath failed: {e}")
+
+        summary = []
+        for t, (comp, parts) in plans.items():
+            for p in comp.removed:
+                okprint(f"DUP: {t}: {p}")
+            for name, value in comp.helpers.items():
+                okprint(f"VAR: {t}:{name} = {value}")
+            for name in comp.reused:
+                okprint(f"USE: %{name}%")
+            if comp.helpers or comp.reused or comp.removed:
+                okprint(f"PATH {t}: {_join_path(parts)}")
+            summary.append(f"{t}: {comp.before} -> {comp.after}")
+            if comp.after > PATH_LIMIT_SOFT:
+                eprint(f"WARN: {t}: PATH всё ещё длиннее {PATH_LIMIT_SOFT} символов ({comp.after})")
+        text = f"OK: -compactpath ({sc}): " + ", ".join(summary) + f" (мягкий предел {PATH_LIMIT_SOFT})"
+        if "--dry-run" in args:
+            for t, (comp, parts) in plans.items():
+                _print_path_diff(t, read_path(t), parts)
+            return exit_with(0, text + " (dry-run: не записано)")
+        if not apply:
+            return exit_with(0, text + " (не записано: добавь --apply)")
+
+        status: Dict[str, bool] = {}
+        try:
+            for t, (comp, parts) in plans.items():
+                if t == "machine" and not is_admin():
+                    continue
+                # сначала переменные, потом PATH, который на них ссылается
+                for name, value in comp.helpers.items():
+                    set_env(t, name, value, REG_EXPAND_SZ)
+                status[t] = write_path(t, parts)
+            if sc in ("machine", "both") and not is_admin():
+                return exit_with(5, "ERROR: Нет прав. Запусти от администратора для scope=machine.")
+            return exit_with(0, text + _write_status(status))
+        except PermissionError:
+            return exit_with(5, "ERROR: Нет прав. Запусти от администратора для записи в MACHINE.")
+        except Exception as e:
+            return exit_with(1, f"ERROR: -compactpath failed: {e}")
+
+    if a0 == "-profilepath":
+        sc = _scope_from_args(args, "both")
+        try:
+            timeout = float(_arg_value_any(args, ["--timeout"], "2") or "2")
+            runs = int(_arg_value_any(args, ["--runs"], "5") or "5")
+            top = int(_arg_value_any(args, ["--top"], "0") or "0")
+        except ValueError:
+            return exit_with(2, "ERROR: --timeout/--runs/--top должны быть числами.")
+        try:
+            # порядок поиска: Machine, затем User
+            targets = _path_targets(sc)
+            parts = [p for t in ("machine", "user") if t in targets for p in read_path(t)]
+            report = profile_path_entries(parts, runs=runs, timeout=timeout)
+        except Exception as e:
+            return exit_with(1, f"ERROR: -profilepath failed: {e}")
+        for line in format_path_profile(report, top or None):
+            okprint(line)
+        slow = sum(1 for e in report if e["timeouts"])
+        total = sum(e["p50"] for e in report)
+        return exit_with(0, f"OK: -profilepath ({sc}): каталогов {len(report)}, проходов {runs}, "
+                            f"сумма p50 {total * 1000:.3f} мс" + (f", с таймаутами: {slow}" if slow else ""))
+
+    if a0 == "-optimizepath":
+        sc = _scope_from_args(args, "both")
+        src = _arg_value_any(args, ["--profile"])
+        try:
+            timeout = float(_arg_value_any(args, ["--timeout"], "2") or "2")
+            runs = int(_arg_value_any(args, ["--runs"], "3") or "3")
+        except ValueError:
+            return exit_with(2, "ERROR: --timeout/--runs должны быть числами.")
+        try:
+            profile = load_usage_profile(src) if src else None
+        except Exception as e:
+            return exit_with(2, f"ERROR: --profile: {e}")
+
+        try:
+            old = {t: read_path(t) for t in ("machine", "user")}
+            opt = PathOptimizer(old["machine"], old["user"], profile, runs=runs, timeout=timeout)
+            plan = opt.plan()
+        except Exception as e:
+            return exit_with(1, f"ERROR: -optimizepath failed: {e}")
+
+        for raw in opt.empty:
+            okprint(f"EMPTY: нет исполняемых файлов: {raw}")
+        for raw in opt.unknown:
+            eprint(f"WARN: каталог не ответил за {timeout:g} c, оставлен на месте: {raw}")
+        new = {}
+        for t in _path_targets(sc):
+            new[t] = old[t].copy()
+            new[t].reorder(plan[t])
+            if new[t] != old[t]:
+                okprint(f"ORDER {t}:")
+                for p in new[t]:
+                    okprint(f"  {p}")
+        summary = (
+            f"цена поиска {opt.cost_before * 1000:.3f} -> {opt.cost_after * 1000:.3f} мс, "
+            f"проверок {opt.probes_before:.1f} -> {opt.probes_after:.1f}"
+        )
+        if "--dry-run" in args:
+            for t, parts in new.items():
+                _print_path_diff(t, old[t], parts)
+            return exit_with(0, f"OK: -optimizepath ({sc}): {summary} (dry-run: не записано)")
+        if "--apply" not in args:
+            return exit_with(0, f"OK: -optimizepath ({sc}): {summary} (не записано: добавь --apply)")
+
+        status: Dict[str, bool] = {}
+        try:
+            for t, parts in new.items():
+                if t == "machine" and not is_admin():
+                    continue
+                status[t] = parts != old[t] and write_path(t, parts)
+            if sc in ("machine", "both") and not is_admin():
+                return exit_with(5, "ERROR: Нет прав. Запусти от администратора для scope=machine.")
+            return exit_with(0, f"OK: -optimizepath ({sc}): {summary}" + _write_status(status))
+        except PermissionError:
+            return exit_with(5, "ERROR: Нет прав. Запусти от администратора для записи в MACHINE.")
+        except Exception as e:
+            return exit_with(1, f"ERROR: -optimizepath failed: {e}")
+
     if a0 in ("-deduppath", "-prunepath"):
         sc = _scope_from_args(args, "both")
+        normalize = "--normalize" in args
+        on_timeout = (_arg_value_any(args, ["--on-timeout"], "skip") or "skip").lower()
+        if on_timeout not in ("skip", "remove"):
+            return exit_with(2, "ERROR: --on-timeout должен быть skip|remove.")
+        try:
+            timeout = float(_arg_value_any(args, ["--timeout"], "2") or "2")
+        except ValueError:
+            return exit_with(2, "ERROR: --timeout должен быть числом (секунды).")
 
         targets = []
         if sc in ("user", "both"):
@@ -1145,17 +3241,39 @@ def cli_run() -> Optional[int]:
         if sc in ("machine", "both"):
             targets.append("machine")
 
+        dry = "--dry-run" in args
+        status: Dict[str, bool] = {}
         try:
             for t in targets:
-                if t == "machine" and not is_admin():
+                if t == "machine" and not is_admin() and not dry:
                     continue
-                parts = read_path(t)
-                parts = dedup_keep_first(parts) if a0 == "-deduppath" else prune_nonexistent(parts)
-                write_path(t, parts)
+                old = read_path(t)
+                parts = old.copy()
+                if a0 == "-deduppath" and normalize:
+                    # User ищется после Machine: его повторы Machine только тратят пробы каталогов
+                    shadow = read_path("machine") if t == "user" else ()
+                    for e in redundant_entries(parts, shadow):
+                        okprint(f"DUP: {t}: {e.value}")
+                    parts = dedup_normalized(parts, shadow)
+                elif a0 == "-deduppath":
+                    parts = dedup_keep_first(parts)
+                else:
+                    res = existence_checker().check_many(parts, timeout=timeout)
+                    for p in parts:
+                        if res.get(p) is None:
+                            action = "удалён" if on_timeout == "remove" else "оставлен"
+                            eprint(f"WARN: {t}: таймаут проверки ({timeout:g} c), {action}: {p}")
+                    parts = _keep_existing(parts, res, on_timeout)
+                if dry:
+                    _print_path_diff(t, old, parts)
+                    continue
+                status[t] = parts != old and write_path(t, parts)
+            if dry:
+                return exit_with(0, f"OK: {a0} ({sc}) (dry-run: не записано)")
 
             if sc in ("machine", "both") and not is_admin():
                 return exit_with(5, "ERROR: Нет прав. Запусти от администратора для scope=machine.")
-            return exit_with(0, f"OK: {a0} ({sc})")
+            return exit_with(0, f"OK: {a0} ({sc})" + _write_status(status))
         except PermissionError:
             return exit_with(5, "ERROR: Нет прав. Запусти от администратора для записи в MACHINE.")
         except Exception as e:
@@ -1168,22 +3286,39 @@ def cli_run() -> Optional[int]:
 # ENTRYPOINT
 # =========================
 
+def _load_gui():
+    # GUI-модуль импортирует ядро как "Path_editorv4"; при запуске файла скриптом
+    # ядро — это __main__, и без алиаса оно загрузилось бы второй раз.
+    sys.modules.setdefault("Path_editorv4", sys.modules[__name__])
+    import Path_editorv4_gui
+    return Path_editorv4_gui
+
+
 def main():
-    if os.name != "nt" or winreg is None:
-        eprint("ERROR: Требуется Windows.")
+    try:
+        ok = backend().available()
+    except Exception as e:
+        eprint(f"ERROR: {e}")
+        sys.exit(1)
+    if not ok:
+        eprint(f"ERROR: Требуется Windows. Для других ОС: {BACKEND_ENV_VAR}=json:<file>.")
         sys.exit(1)
 
-    # CLI first
+    # CLI first; все записи команды дают одну рассылку WM_SETTINGCHANGE в конце
     try:
-        rc = cli_run()
+        with env_batch():
+            rc = cli_run()
         if rc is not None:
+            if not broadcaster().wait(BROADCAST_WAIT_S):
+                eprint("WARN: рассылка WM_SETTINGCHANGE не завершилась вовремя.")
             sys.exit(rc)
     except Exception as e:
         eprint(f"ERROR: CLI crashed: {e}")
         # фолбэк: если CLI упал — открываем GUI
 
     elevate_if_needed()
-    App().mainloop()
+    gui = _load_gui()
+    gui.App().mainloop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,2304 @@
+# -*- coding: utf-8 -*-
+# Mahashe Env Manager — GUI (customtkinter)
+# Загружается только для -gui и фолбэка из Path_editorv4.main(), чтобы CLI-команды
+# не платили за импорт Tk/customtkinter.
+
+import os
+import re
+import sys
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# PyInstaller: обеспечить доступ к Tcl/Tk при onefile до импорта customtkinter
+if getattr(sys, "frozen", False):
+    _base = getattr(sys, "_MEIPASS", os.path.dirname(sys.executable))
+    os.environ.setdefault("TCL_LIBRARY", os.path.join(_base, "tcl", "tcl8.6"))
+    os.environ.setdefault("TK_LIBRARY", os.path.join(_base, "tcl", "tk8.6"))
+
+import tkinter
+from tkinter import font as tkfont
+
+import customtkinter as ctk
+
+from Path_editorv4 import (
+    APP_TITLE,
+    STARTED_AT,
+    eprint,
+    SearchIndex,
+    _theme,
+    is_admin,
+    list_env,
+    get_env,
+    set_env,
+    delete_env,
+    env_expander,
+    REG_EXPAND_SZ,
+    env_batch,
+    read_path,
+    write_path,
+    existence_checker,
+    _keep_existing,
+    dedup_normalized,
+    normalize_path_key,
+    effective_path,
+    scan_shadowed,
+    load_usage_profile,
+    PathOptimizer,
+    PathCompactor,
+    ChangeSource,
+    ChangeWatcher,
+    RegistryChangeSource,
+    PATH_LIMIT_SOFT,
+    PATH_LIMIT_HARD,
+    _join_path,
+    profile_path_entries,
+    format_path_profile,
+    PathEntry,
+    PathList,
+    PathSnapshot,
+    PathStep,
+    EnvStep,
+    EditHistory,
+    diff_path,
+    format_path_diff,
+)
+
+SEARCH_DEBOUNCE_MS = 120
+UI_POLL_MS = 40
+SEARCH_MODE_LABELS = {"текст": "text", "слово": "word", "regex": "regex"}
+
+
+# =========================
+# TOAST (Install Hub style)
+# =========================
+
+class _Toast:
+    __slots__ = ("win", "frame", "title_lbl", "body_lbl", "title", "text", "count", "alpha", "until", "shown_at", "w", "h")
+
+    def __init__(self):
+        self.title = self.text = ""
+        self.count = 0
+        self.alpha = 0.0
+        self.until = self.shown_at = 0.0
+        self.w = self.h = 0
+
+
+class ToastManager:
+    """
+    Уведомления в правом нижнем углу. Окна берутся из пула (не больше POOL) и не уничтожаются,
+    а прячутся. Одинаковое сообщение, пока видно, не плодит окно, а получает счётчик "×N";
+    сообщение с тем же заголовком сразу после предыдущего (RAPID_S) заменяет его текст.
+    Появление/исчезновение всех окон ведёт один общий таймер.
+    """
+
+    POOL = 4
+    RAPID_S = 0.3
+    FRAME_MS = 20
+    STEP = 0.08
+    ALPHA = 0.98
+
+    def __init__(self, root, theme):
+        self.root = root
+        self.theme = theme
+        self.active: List[_Toast] = []  # снизу вверх
+        self._free: List[_Toast] = []
+        self._created = 0
+        self._timer = None
+
+    def show(self, title: str, text: str, ms=3000, width=380):
+        now = time.monotonic()
+        t = next((t for t in self.active if t.title == title and t.text == text and t.until > now), None)
+        if t is not None:
+            t.count += 1
+        else:
+            t = next((t for t in self.active if t.title == title and now - t.shown_at < self.RAPID_S), None)
+            if t is None:
+                t = self._acquire()
+                self.active.append(t)
+                t.w = 0  # новое место в стопке — пересчитать позиции
+            t.title, t.text, t.count = title, text, 1
+            t.title_lbl.configure(text=title)
+        t.body_lbl.configure(text=text if t.count == 1 else f"{text}  ×{t.count}")
+        t.shown_at = now
+        t.until = max(t.until, now + ms / 1000.0)
+
+        t.win.update_idletasks()
+        h = t.frame.winfo_reqheight() + 2
+        if (t.w, t.h) != (width, h):
+            t.w, t.h = width, h
+            self._layout()
+        t.win.deiconify()
+        self._kick()
+
+    def _acquire(self) -> _Toast:
+        if self._free:
+            return self._free.pop()
+        if self._created >= self.POOL:
+            # пул занят: переиспользуем окно, которое и так скоро исчезнет
+            t = min(self.active, key=lambda t: t.until)
+            self.active.remove(t)
+            t.alpha = 0.0
+            return t
+        self._created += 1
+        t = _Toast()
+        t.win = win = ctk.CTkToplevel(self.root)
+        win.withdraw()
+        win.overrideredirect(True)
+        win.attributes("-topmost", True)
+        win.attributes("-alpha", 0.0)
+        win.configure(fg_color=self.theme["CARD"])
+
+        t.frame = ctk.CTkFrame(
+            win,
+            fg_color=self.theme["CARD"],
+            corner_radius=12,
+            border_width=1,
+            border_color=self.theme["BORDER"],
+        )
+        t.frame.pack(fill="both", expand=True)
+
+        t.title_lbl = ctk.CTkLabel(t.frame, text="", font=ctk.CTkFont(size=13, weight="bold"), text_color=self.theme["TEXT"])
+        t.body_lbl = ctk.CTkLabel(t.frame, text="", font=ctk.CTkFont(size=12), text_color=self.theme["MUTED"], justify="left")
+        t.title_lbl.pack(anchor="w", padx=14, pady=(10, 2))
+        t.body_lbl.pack(anchor="w", padx=14, pady=(0, 12))
+        return t
+
+    def _layout(self):
+        y = self.root.winfo_screenheight() - 16
+        for t in self.active:
+            y -= t.h
+            t.win.geometry(f"{t.w}x{t.h}+{self.root.winfo_screenwidth() - t.w - 16}+{y}")
+            y -= 10
+
+    def _kick(self):
+        # таймер мог спать до ближайшего закрытия — будим к следующему кадру
+        if self._timer is not None:
+            self.root.after_cancel(self._timer)
+        self._timer = self.root.after(self.FRAME_MS, self._tick)
+
+    def _tick(self):
+        self._timer = None
+        now = time.monotonic()
+        gone = []
+        for t in self.active:
+            target = self.ALPHA if now < t.until else 0.0
+            if t.alpha != target:
+                t.alpha = min(target, t.alpha + self.STEP) if target > t.alpha else max(target, t.alpha - self.STEP)
+                try:
+                    t.win.attributes("-alpha", t.alpha)
+                except Exception:
+                    pass
+            if t.alpha <= 0.0 and target == 0.0:
+                gone.append(t)
+        for t in gone:
+            self.active.remove(t)
+            t.win.withdraw()
+            t.until = t.shown_at = 0.0
+            self._free.append(t)
+        if gone:
+            self._layout()
+        if not self.active:
+            return
+        if all(t.alpha == self.ALPHA for t in self.active):
+            # все показаны — анимировать нечего до ближайшего закрытия
+            delay = int((min(t.until for t in self.active) - now) * 1000.0)
+            self._timer = self.root.after(max(self.FRAME_MS, delay), self._tick)
+        else:
+            self._timer = self.root.after(self.FRAME_MS, self._tick)
+
+
+# =========================
+# UI DIALOGS
+# =========================
+
+class BigEditDialog(ctk.CTkToplevel):
+    """
+    Редактор имени/значения. Создаётся один раз на окно приложения и переиспользуется:
+    ask() перенастраивает поля, показывает окно модально и возвращает (name, value) или None.
+    """
+
+    def __init__(self, parent, theme):
+        super().__init__(parent)
+        self.withdraw()
+        self.theme = theme
+        self.result = None
+        self._done = tkinter.BooleanVar(self, value=False)
+
+        self.geometry("760x420")
+        self.resizable(False, False)
+        self.configure(fg_color=theme["BG"])
+        self.transient(parent)
+        self.protocol("WM_DELETE_WINDOW", self._cancel)
+        self.bind("<Escape>", lambda _e: self._cancel())
+
+        card = ctk.CTkFrame(self, fg_color=theme["CARD"], corner_radius=15, border_width=1, border_color=theme["BORDER"])
+        card.pack(fill="both", expand=True, padx=14, pady=14)
+        card.grid_columnconfigure(0, weight=1)
+
+        self.lbl_title = ctk.CTkLabel(card, text="", font=ctk.CTkFont(size=16, weight="bold"), text_color=theme["TEXT"])
+        self.lbl_title.grid(row=0, column=0, columnspan=2, sticky="w", padx=14, pady=(12, 8))
+
+        ctk.CTkLabel(card, text="Имя:", font=ctk.CTkFont(size=13, weight="bold"), text_color=theme["TEXT"]).grid(
+            row=1, column=0, sticky="w", padx=14, pady=(0, 6)
+        )
+        self.ent_name = ctk.CTkEntry(card, height=34)
+        self.ent_name.grid(row=2, column=0, columnspan=2, sticky="ew", padx=14, pady=(0, 12))
+
+        ctk.CTkLabel(card, text="Значение:", font=ctk.CTkFont(size=13, weight="bold"), text_color=theme["TEXT"]).grid(
+            row=3, column=0, sticky="w", padx=14, pady=(0, 6)
+        )
+
+        self.txt_val = ctk.CTkTextbox(card, height=220, corner_radius=12, border_width=1, border_color=theme["BORDER"])
+        self.txt_val.grid(row=4, column=0, columnspan=2, sticky="nsew", padx=14, pady=(0, 10))
+
+        btns = ctk.CTkFrame(card, fg_color=theme["CARD"])
+        btns.grid(row=5, column=0, columnspan=2, sticky="ew", padx=14, pady=(0, 14))
+        btns.grid_columnconfigure(0, weight=1)
+
+        self.btn_ok = ctk.CTkButton(btns, text="Сохранить", corner_radius=15, command=self._ok, width=140)
+        self.btn_cancel = ctk.CTkButton(btns, text="Отмена", corner_radius=15, command=self._cancel, width=120)
+
+        self.btn_ok.pack(side="left")
+        self.btn_cancel.pack(side="right")
+
+        _center(self)
+
+    def ask(self, title: str, name: str = "", value: str = "", name_editable: bool = True):
+        self.result = None
+        self.title(title)
+        self.lbl_title.configure(text=title)
+        self.ent_name.configure(state="normal")
+        self.ent_name.delete(0, "end")
+        self.ent_name.insert(0, name or "")
+        if not name_editable:
+            self.ent_name.configure(state="disabled")
+        self.txt_val.delete("1.0", "end")
+        self.txt_val.insert("1.0", value or "")
+
+        self._done.set(False)
+        self.deiconify()
+        self.grab_set()
+        (self.ent_name if name_editable else self.txt_val).focus_set()
+        self.wait_variable(self._done)
+        return self.result
+
+    def _close(self, result):
+        self.result = result
+        self.grab_release()
+        self.withdraw()
+        self._done.set(True)
+
+    def _ok(self):
+        name = (self.ent_name.get() or "").strip()
+        val = self.txt_val.get("1.0", "end").rstrip("\n")
+        if not name:
+            return
+        self._close((name, val))
+
+    def _cancel(self):
+        self._close(None)
+
+
+class RowMenu(ctk.CTkToplevel):
+    """
+    Меню действий над строкой ("⋮"): одно окно на приложение, при каждом открытии
+    только меняются подпись и обработчики. ▲/▼ показываются, если передан on_move.
+    """
+
+    def __init__(self, parent, theme):
+        super().__init__(parent)
+        self.withdraw()
+        self._on_edit = self._on_delete = self._on_move = None
+
+        self.geometry("380x190")
+        self.resizable(False, False)
+        self.configure(fg_color=theme["BG"])
+        self.transient(parent)
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+        self.bind("<Escape>", lambda _e: self.hide())
+
+        card = ctk.CTkFrame(self, fg_color=theme["CARD"], corner_radius=15, border_width=1, border_color=theme["BORDER"])
+        card.pack(fill="both", expand=True, padx=14, pady=14)
+
+        ctk.CTkLabel(card, text="Действия", font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w", padx=14, pady=(12, 8))
+        self.lbl = ctk.CTkLabel(card, text="", wraplength=340, justify="left", text_color=theme["MUTED"])
+        self.lbl.pack(anchor="w", padx=14, pady=(0, 10))
+
+        btns = ctk.CTkFrame(card, fg_color=theme["CARD"])
+        btns.pack(fill="x", padx=14, pady=(0, 14), side="bottom")
+        ctk.CTkButton(btns, text="Редактировать", corner_radius=15, command=lambda: self._fire(self._on_edit)).pack(side="left")
+        self.btn_up = ctk.CTkButton(btns, text="▲", width=40, corner_radius=15, command=lambda: self._fire(self._on_move, -1))
+        self.btn_down = ctk.CTkButton(btns, text="▼", width=40, corner_radius=15, command=lambda: self._fire(self._on_move, 1))
+        ctk.CTkButton(btns, text="Удалить", corner_radius=15, command=lambda: self._fire(self._on_delete)).pack(side="right")
+        self._move_shown = False
+
+        _center(self)
+
+    def show(self, title: str, text: str, on_edit, on_delete, on_move=None):
+        self._on_edit, self._on_delete, self._on_move = on_edit, on_delete, on_move
+        self.title(title)
+        self.lbl.configure(text=text)
+        if (on_move is not None) != self._move_shown:
+            self._move_shown = on_move is not None
+            if self._move_shown:
+                self.btn_up.pack(side="left", padx=(8, 0))
+                self.btn_down.pack(side="left", padx=(6, 0))
+            else:
+                self.btn_up.pack_forget()
+                self.btn_down.pack_forget()
+        self.deiconify()
+        self.grab_set()
+        self.focus_set()
+
+    def hide(self):
+        self.grab_release()
+        self.withdraw()
+
+    def _fire(self, fn, *args):
+        self.hide()
+        if fn is not None:
+            fn(*args)
+
+
+class HistoryPanel(ctk.CTkToplevel):
+    """
+    Панель истории правок: строка 0 — исходное состояние, дальше шаги; отменённые шаги серые.
+    Двойной клик или "Перейти" — откатить/повторить до выбранной строки (on_jump(cursor)).
+    Окно одно на приложение, между открытиями прячется.
+    """
+
+    def __init__(self, parent, theme, on_undo, on_redo, on_jump):
+        super().__init__(parent)
+        self.withdraw()
+        self.th = theme
+        self._on_jump = on_jump
+        self._cursor = 0
+
+        self.title("История правок")
+        self.geometry("520x460")
+        self.configure(fg_color=theme["BG"])
+        self.transient(parent)
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+        self.bind("<Escape>", lambda _e: self.withdraw())
+
+        card = ctk.CTkFrame(self, fg_color=theme["CARD"], corner_radius=15, border_width=1, border_color=theme["BORDER"])
+        card.pack(fill="both", expand=True, padx=14, pady=14)
+
+        self.box = tkinter.Listbox(
+            card,
+            bg=theme["CARD"],
+            fg=theme["TEXT"],
+            selectbackground="#142352",
+            selectforeground=theme["TEXT"],
+            highlightthickness=0,
+            bd=0,
+            activestyle="none",
+            font=ctk.CTkFont(size=12),
+        )
+        self.box.pack(fill="both", expand=True, padx=14, pady=(14, 10))
+        self.box.bind("<Double-Button-1>", lambda _e: self._jump())
+
+        btns = ctk.CTkFrame(card, fg_color=theme["CARD"])
+        btns.pack(fill="x", padx=14, pady=(0, 14))
+        ctk.CTkButton(btns, text="↶ Отменить", width=110, corner_radius=15, command=on_undo).pack(side="left")
+        ctk.CTkButton(btns, text="↷ Повторить", width=110, corner_radius=15, command=on_redo).pack(side="left", padx=(8, 0))
+        ctk.CTkButton(btns, text="Перейти", width=110, corner_radius=15, command=self._jump).pack(side="right")
+
+        _center(self)
+
+    def show(self):
+        self.deiconify()
+        self.lift()
+
+    def set_history(self, labels: List[str], cursor: int):
+        self._cursor = cursor
+        box = self.box
+        box.delete(0, "end")
+        box.insert("end", "Исходное состояние")
+        for label in labels:
+            box.insert("end", label)
+        for i in range(cursor + 1, len(labels) + 1):
+            box.itemconfigure(i, foreground=self.th["MUTED"])
+        box.selection_clear(0, "end")
+        box.selection_set(cursor)
+        box.see(cursor)
+
+    def _jump(self):
+        sel = self.box.curselection()
+        if sel and sel[0] != self._cursor:
+            self._on_jump(sel[0])
+
+
+class DiffPreview(ctk.CTkToplevel):
+    """
+    Предпросмотр записи PATH: что вставится (+), удалится (-) и переедет (~) в каждой области.
+    ask(lines) модально ждёт "Записать"/"Отмена" и возвращает True/False. Окно одно, прячется.
+    """
+
+    MAX_LINES = 2000  # больше на экран всё равно не прочитать, а Textbox вставляет построчно
+
+    def __init__(self, parent, theme):
+        super().__init__(parent)
+        self.withdraw()
+        self.answer = False
+        self._done = tkinter.BooleanVar(self, value=False)
+
+        self.title("Что будет записано")
+        self.geometry("760x500")
+        self.configure(fg_color=theme["BG"])
+        self.transient(parent)
+        self.protocol("WM_DELETE_WINDOW", lambda: self._close(False))
+        self.bind("<Escape>", lambda _e: self._close(False))
+
+        card = ctk.CTkFrame(self, fg_color=theme["CARD"], corner_radius=15, border_width=1, border_color=theme["BORDER"])
+        card.pack(fill="both", expand=True, padx=14, pady=14)
+
+        self.box = ctk.CTkTextbox(card, wrap="none")
+        self.box.pack(fill="both", expand=True, padx=14, pady=(14, 10))
+        self.box.tag_config("head", foreground=theme["TEXT"])
+        self.box.tag_config("insert", foreground=theme["OK"])
+        self.box.tag_config("delete", foreground=theme["BAD"])
+        self.box.tag_config("move", foreground=theme["WARN"])
+        self.box.tag_config("var", foreground=theme["MUTED"])
+
+        btns = ctk.CTkFrame(card, fg_color=theme["CARD"])
+        btns.pack(fill="x", padx=14, pady=(0, 14))
+        ctk.CTkButton(btns, text="Записать", corner_radius=15, width=140, command=lambda: self._close(True)).pack(side="left")
+        ctk.CTkButton(btns, text="Отмена", corner_radius=15, width=120, command=lambda: self._close(False)).pack(side="right")
+
+        _center(self)
+
+    def ask(self, lines: List[str]) -> bool:
+        box = self.box
+        box.configure(state="normal")
+        box.delete("1.0", "end")
+        for line in lines[: self.MAX_LINES]:
+            tag = {"+": "insert", "-": "delete", "~": "move"}.get(line.lstrip()[:1], "var" if line.startswith("VAR") else "head")
+            box.insert("end", line + "\n", tag)
+        if len(lines) > self.MAX_LINES:
+            box.insert("end", f"… и ещё строк: {len(lines) - self.MAX_LINES}\n", "head")
+        box.configure(state="disabled")
+
+        self.answer = False
+        self._done.set(False)
+        self.deiconify()
+        self.grab_set()
+        self.focus_set()
+        self.wait_variable(self._done)
+        return self.answer
+
+    def _close(self, ok: bool):
+        self.answer = ok
+        self.grab_release()
+        self.withdraw()
+        self._done.set(True)
+
+
+class ConfirmDialog(ctk.CTkToplevel):
+    """Вопрос "Да/Нет": ask(title, text) модально ждёт ответа и возвращает True/False. Окно одно, прячется."""
+
+    def __init__(self, parent, theme):
+        super().__init__(parent)
+        self.withdraw()
+        self.answer = False
+        self._done = tkinter.BooleanVar(self, value=False)
+
+        self.geometry("420x170")
+        self.resizable(False, False)
+        self.configure(fg_color=theme["BG"])
+        self.transient(parent)
+        self.protocol("WM_DELETE_WINDOW", lambda: self._close(False))
+        self.bind("<Escape>", lambda _e: self._close(False))
+
+        card = ctk.CTkFrame(self, fg_color=theme["CARD"], corner_radius=15, border_width=1, border_color=theme["BORDER"])
+        card.pack(fill="both", expand=True, padx=14, pady=14)
+        self.lbl = ctk.CTkLabel(card, text="", wraplength=370, justify="left")
+        self.lbl.pack(anchor="w", padx=14, pady=(14, 10))
+
+        btns = ctk.CTkFrame(card, fg_color=theme["CARD"])
+        btns.pack(fill="x", padx=14, pady=(0, 12), side="bottom")
+        ctk.CTkButton(btns, text="Да", corner_radius=15, command=lambda: self._close(True)).pack(side="left")
+        ctk.CTkButton(btns, text="Нет", corner_radius=15, command=lambda: self._close(False)).pack(side="right")
+
+        _center(self)
+
+    def ask(self, title: str, text: str) -> bool:
+        self.title(title)
+        self.lbl.configure(text=text)
+        self.answer = False
+        self._done.set(False)
+        self.deiconify()
+        self.grab_set()
+        self.focus_set()
+        self.wait_variable(self._done)
+        return self.answer
+
+    def _close(self, ok: bool):
+        self.answer = ok
+        self.grab_release()
+        self.withdraw()
+        self._done.set(True)
+
+
+class ToolsMenu(ctk.CTkToplevel):
+    """Меню "Анализ PATH": actions = [(подпись, fn, args)]; окно одно, после выбора прячется."""
+
+    def __init__(self, parent, theme, actions):
+        super().__init__(parent)
+        self.withdraw()
+
+        self.title("PATH")
+        self.geometry("380x310")
+        self.resizable(False, False)
+        self.configure(fg_color=theme["BG"])
+        self.transient(parent)
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+        self.bind("<Escape>", lambda _e: self.hide())
+
+        card = ctk.CTkFrame(self, fg_color=theme["CARD"], corner_radius=15, border_width=1, border_color=theme["BORDER"])
+        card.pack(fill="both", expand=True, padx=14, pady=14)
+        ctk.CTkLabel(card, text="Анализ PATH", font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w", padx=14, pady=(12, 8))
+        for text, fn, args in actions:
+            ctk.CTkButton(card, text=text, corner_radius=15, command=lambda f=fn, a=args: self._fire(f, *a)).pack(
+                fill="x", padx=14, pady=(0, 8)
+            )
+
+        _center(self)
+
+    def show(self):
+        self.deiconify()
+        self.grab_set()
+        self.focus_set()
+
+    def hide(self):
+        self.grab_release()
+        self.withdraw()
+
+    def _fire(self, fn, *args):
+        self.hide()
+        fn(*args)
+
+
+def _center(win):
+    """Поставить окно по центру экрана; для спрятанного окна берётся запрошенный размер."""
+    win.update_idletasks()
+    w = max(win.winfo_width(), win.winfo_reqwidth())
+    h = max(win.winfo_height(), win.winfo_reqheight())
+    win.geometry(f"{w}x{h}+{(win.winfo_screenwidth() - w) // 2}+{(win.winfo_screenheight() - h) // 2}")
+
+
+class _PathRow:
+    __slots__ = ("frame", "cb", "dot", "ent", "btn", "entry", "text", "color")
+
+    def __init__(self):
+        self.entry = None
+        self.text = None
+        self.color = None
+
+
+# =========================
+# VIRTUAL LIST
+# =========================
+
+class VirtualRowList(ctk.CTkFrame):
+    """
+    Список строк одинаковой высоты: виджеты создаются только под видимую область
+    и переиспользуются при прокрутке. Данные живут в модели владельца:
+    make_row(parent) -> row (с атрибутом .frame), bind_row(row, pos) заполняет строку.
+    Наследники могут заменить тело (_make_body) и способ размещения строк (_place_row/_hide_row).
+    """
+
+    def __init__(self, parent, theme, row_height: int, make_row, bind_row, **frame_kw):
+        frame_kw.setdefault("fg_color", theme["BG"])
+        frame_kw.setdefault("corner_radius", 0)
+        super().__init__(parent, **frame_kw)
+        self.th = theme
+        self._make_row = make_row
+        self._bind_row = bind_row
+        self._init_geometry(row_height)
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.body = self._make_body()
+        self.body.grid(row=1, column=0, sticky="nsew", padx=(6, 0))
+
+        self.scrollbar = ctk.CTkScrollbar(
+            self,
+            command=self._on_scrollbar,
+            fg_color=frame_kw["fg_color"],
+            button_color=frame_kw["fg_color"],
+            button_hover_color=frame_kw["fg_color"],
+        )
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        self.body.bind("<Configure>", lambda _e: self._layout())
+        # CTk-виджеты запрещают bind_all, колесо ловим на уровне окна и фильтруем по указателю
+        top = self.winfo_toplevel()
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            top.bind_all(seq, self._on_wheel, add="+")
+
+    def _init_geometry(self, row_height: int):
+        # row_height задан в логических пикселях, как размеры CTk; winfo_height() — в реальных,
+        # поэтому вся арифметика пула (и размещение строк) идёт в реальных пикселях
+        self.row_height = max(1, int(round(row_height * self._get_widget_scaling())))
+        self._count = 0
+        self._top = 0
+        self._pool = []
+
+    # ---- hooks ----
+
+    def _make_body(self):
+        return ctk.CTkFrame(self, fg_color=self.th["BG"], corner_radius=0)
+
+    def _place_row(self, row, slot: int):
+        # place() у CTk ещё раз умножил бы y на масштаб — row_height уже в реальных пикселях
+        tkinter.Frame.place(row.frame, x=0, y=slot * self.row_height, relwidth=1.0)
+
+    def _hide_row(self, row):
+        row.frame.place_forget()
+
+    # ---- geometry ----
+
+    def _capacity(self) -> int:
+        h = self.body.winfo_height()
+        if h <= 1:
+            return 0
+        return h // self.row_height + 1
+
+    def _full_rows(self) -> int:
+        return max(1, self.body.winfo_height() // self.row_height)
+
+    def _clamp_top(self):
+        max_top = max(0, self._count - self._full_rows())
+        self._top = max(0, min(self._top, max_top))
+
+    def _layout(self):
+        cap = self._capacity()
+        while len(self._pool) < cap:
+            self._pool.append(self._make_row(self.body))
+        self._clamp_top()
+        self.refresh()
+
+    # ---- public ----
+
+    def set_count(self, count: int, reset_scroll: bool = False):
+        self._count = max(0, int(count))
+        if reset_scroll:
+            self._top = 0
+        self._clamp_top()
+        self.refresh()
+
+    def scroll_to(self, top: int):
+        top = int(top)
+        if top == self._top:
+            return
+        self._top = top
+        self._clamp_top()
+        self.refresh()
+
+    def refresh(self):
+        cap = self._capacity()
+        for slot, row in enumerate(self._pool):
+            pos = self._top + slot
+            if slot < cap and pos < self._count:
+                self._bind_row(row, pos)
+                self._place_row(row, slot)
+            else:
+                self._hide_row(row)
+        self._update_scrollbar()
+
+    # ---- scrolling ----
+
+    def _update_scrollbar(self):
+        if self._count <= 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        first = self._top / self._count
+        last = min(1.0, (self._top + self._full_rows()) / self._count)
+        self.scrollbar.set(first, last)
+
+    def _on_scrollbar(self, *args):
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(int(round(float(args[1]) * self._count)))
+        elif args[0] == "scroll":
+            step = self._full_rows() if len(args) > 2 and args[2] == "pages" else 1
+            self.scroll_to(self._top + int(float(args[1])) * step)
+
+    def _on_wheel(self, event):
+        try:
+            w = self.winfo_containing(event.x_root, event.y_root)
+        except Exception:
+            return
+        if w is None or not str(w).startswith(str(self)):
+            return
+        if event.num == 4:
+            d = -1
+        elif event.num == 5:
+            d = 1
+        else:
+            d = -1 if event.delta > 0 else 1
+        self.scroll_to(self._top + d * 2)
+
+
+class _EnvRow:
+    __slots__ = ("bg", "badge_bg", "badge", "name", "value", "expanded", "menu_bg", "menu", "pos")
+
+    def __init__(self):
+        self.pos = -1
+
+
+class EnvTable(VirtualRowList):
+    """
+    Таблица переменных среды на одном Canvas: бейдж USER/MACHINE, имя, усечённое значение, "⋮".
+    Рисуются только видимые строки (пул элементов Canvas), смена фильтра = set_count + перерисовка экрана.
+    get_row(pos) -> (scope, name, value); on_open(pos) — двойной клик / Enter; on_menu(pos) — "⋮" / правый клик;
+    on_delete(pos) — Delete на выбранной строке.
+    get_expanded(pos) -> str — колонка "РАСКРЫТО", вызывается только для видимых строк и только когда она включена.
+    """
+
+    COL_BADGE = 92
+    COL_NAME = 260
+    COL_MENU = 44
+
+    def __init__(self, parent, theme, get_row, on_open, on_menu, get_expanded=None, on_delete=None):
+        self._get_row = get_row
+        self._on_open = on_open
+        self._on_menu = on_menu
+        self._on_delete = on_delete
+        self._get_expanded = get_expanded
+        self.show_expanded = False
+        self.selected = -1
+        super().__init__(
+            parent,
+            theme,
+            row_height=34,
+            make_row=self._make_items,
+            bind_row=self._bind_items,
+            fg_color=theme["CARD"],
+            corner_radius=15,
+            border_width=1,
+            border_color=theme["BORDER"],
+        )
+        self.scale = self._get_widget_scaling()
+        family = ctk.CTkFont().cget("family")
+        self._font_badge = tkfont.Font(family=family, size=-int(11 * self.scale), weight="bold")
+        self._font_name = tkfont.Font(family=family, size=-int(13 * self.scale), weight="bold")
+        self._font_value = tkfont.Font(family=family, size=-int(12 * self.scale))
+        self._char_w = max(1, self._font_value.measure("abcdefghijklmnopqrstuvwxyz0123456789") // 36)
+
+        head = tkinter.Canvas(self, height=int(26 * self.scale), bg=theme["CARD"], highlightthickness=0, bd=0)
+        head.grid(row=0, column=0, sticky="ew", padx=(6, 0), pady=(10, 0))
+        for x, text in ((self._x(8), "ОБЛАСТЬ"), (self._x(self.COL_BADGE + 8), "ИМЯ"), (self._x(self.COL_BADGE + self.COL_NAME + 8), "ЗНАЧЕНИЕ")):
+            head.create_text(x, int(13 * self.scale), text=text, anchor="w", fill=theme["MUTED"], font=self._font_badge)
+        self._head = head
+        self._head_expanded = head.create_text(
+            0, int(13 * self.scale), text="РАСКРЫТО", anchor="w", fill=theme["MUTED"], font=self._font_badge, state="hidden"
+        )
+        self.body.grid_configure(pady=(0, 10))
+
+        c = self.body
+        c.bind("<Button-1>", self._on_click, add="+")
+        c.bind("<Double-Button-1>", self._on_double, add="+")
+        c.bind("<Button-3>", self._on_context, add="+")
+        c.bind("<Return>", lambda _e: self._on_key(self._on_open), add="+")
+        c.bind("<Delete>", lambda _e: self._on_key(self._on_delete), add="+")
+        c.bind("<Configure>", lambda _e: self._place_head(), add="+")
+
+    def _x(self, px: int) -> int:
+        return int(round(px * self.scale))
+
+    # ---- VirtualRowList hooks ----
+
+    def _make_body(self):
+        return tkinter.Canvas(self, bg=self.th["CARD"], highlightthickness=0, bd=0)
+
+    def _make_items(self, c):
+        r = _EnvRow()
+        r.bg = c.create_rectangle(0, 0, 0, 0, fill=self.th["CARD"], outline=self.th["BORDER"], state="hidden")
+        r.badge_bg = c.create_rectangle(0, 0, 0, 0, outline="", state="hidden")
+        r.badge = c.create_text(0, 0, anchor="center", fill="white", font=self._font_badge, state="hidden")
+        r.name = c.create_text(0, 0, anchor="w", fill=self.th["TEXT"], font=self._font_name, state="hidden")
+        r.value = c.create_text(0, 0, anchor="w", fill=self.th["MUTED"], font=self._font_value, state="hidden")
+        r.expanded = c.create_text(0, 0, anchor="w", fill=self.th["TEXT"], font=self._font_value, state="hidden")
+        # фон колонки "⋮" рисуется поверх значения и обрезает слишком длинный текст
+        r.menu_bg = c.create_rectangle(0, 0, 0, 0, fill=self.th["CARD"], outline="", state="hidden")
+        r.menu = c.create_text(0, 0, anchor="center", text="⋮", fill=self.th["TEXT"], font=self._font_name, state="hidden")
+        return r
+
+    def _value_width(self) -> int:
+        w = max(0, self.body.winfo_width() - self._x(self.COL_BADGE + self.COL_NAME + self.COL_MENU + 16))
+        return w // 2 - self._x(8) if self.show_expanded else w
+
+    def _expanded_x(self) -> int:
+        return self._x(self.COL_BADGE + self.COL_NAME + 8) + self._value_width() + self._x(16)
+
+    def _place_head(self):
+        self._head.coords(self._head_expanded, self._expanded_x(), int(13 * self.scale))
+        self._head.itemconfigure(self._head_expanded, state="normal" if self.show_expanded else "hidden")
+
+    @staticmethod
+    def _shorten(text: str, max_chars: int) -> str:
+        short = (text or "").replace("\r", "").replace("\n", " ")
+        return short if len(short) <= max_chars else short[: max_chars - 1] + "…"
+
+    def _bind_items(self, r, pos: int):
+        sc, name, val = self._get_row(pos)
+        c = self.body
+        r.pos = pos
+        fill = "#142352" if pos == self.selected else self.th["CARD"]
+        c.itemconfigure(r.bg, fill=fill)
+        c.itemconfigure(r.menu_bg, fill=fill)
+        c.itemconfigure(r.badge_bg, fill=self.th["BLUE"] if sc == "user" else "#6b7280")
+        c.itemconfigure(r.badge, text="USER" if sc == "user" else "MACHINE")
+        name_chars = max(4, (self._x(self.COL_NAME) - self._x(12)) // self._char_w)
+        c.itemconfigure(r.name, text=name if len(name) <= name_chars else name[: name_chars - 1] + "…")
+        max_chars = max(8, self._value_width() // self._char_w)
+        c.itemconfigure(r.value, text=self._shorten(val, max_chars))
+        if self.show_expanded:
+            c.itemconfigure(r.expanded, text=self._shorten(self._get_expanded(pos), max_chars))
+
+    def _place_row(self, r, slot: int):
+        c = self.body
+        h = self.row_height
+        w = c.winfo_width()
+        y0 = slot * h
+        ym = y0 + h // 2
+        c.coords(r.bg, 0, y0, w - 1, y0 + h)
+        c.coords(r.badge_bg, self._x(8), y0 + self._x(7), self._x(self.COL_BADGE - 8), y0 + h - self._x(7))
+        c.coords(r.badge, self._x(self.COL_BADGE // 2), ym)
+        c.coords(r.name, self._x(self.COL_BADGE + 8), ym)
+        c.coords(r.value, self._x(self.COL_BADGE + self.COL_NAME + 8), ym)
+        c.coords(r.expanded, self._expanded_x(), ym)
+        c.coords(r.menu_bg, w - self._x(self.COL_MENU), y0 + 1, w - 2, y0 + h - 1)
+        c.coords(r.menu, w - self._x(self.COL_MENU // 2), ym)
+        for item in (r.bg, r.badge_bg, r.badge, r.name, r.value, r.menu_bg, r.menu):
+            c.itemconfigure(item, state="normal")
+        c.itemconfigure(r.expanded, state="normal" if self.show_expanded else "hidden")
+
+    def _hide_row(self, r):
+        r.pos = -1
+        for item in (r.bg, r.badge_bg, r.badge, r.name, r.value, r.expanded, r.menu_bg, r.menu):
+            self.body.itemconfigure(item, state="hidden")
+
+    # ---- public ----
+
+    def set_show_expanded(self, show: bool):
+        self.show_expanded = bool(show) and self._get_expanded is not None
+        self._place_head()
+        self.refresh()
+
+    def set_count(self, count: int, reset_scroll: bool = False):
+        if reset_scroll or self.selected >= count:
+            self.selected = -1
+        super().set_count(count, reset_scroll=reset_scroll)
+
+    # ---- mouse ----
+
+    def _pos_at(self, y: int) -> int:
+        pos = self._top + int(y) // self.row_height
+        return pos if 0 <= pos < self._count else -1
+
+    def _on_key(self, action):
+        if action is not None and 0 <= self.selected < self._count:
+            action(self.selected)
+
+    def _on_click(self, event):
+        self.body.focus_set()  # Canvas сам фокус не берёт, а Enter/Delete ловятся на нём
+        pos = self._pos_at(event.y)
+        if pos < 0:
+            return
+        if pos != self.selected:
+            self.selected = pos
+            self.refresh()
+        if event.x >= self.body.winfo_width() - self._x(self.COL_MENU):
+            self._on_menu(pos)
+
+    def _on_double(self, event):
+        pos = self._pos_at(event.y)
+        if pos >= 0 and event.x < self.body.winfo_width() - self._x(self.COL_MENU):
+            self._on_open(pos)
+
+    def _on_context(self, event):
+        pos = self._pos_at(event.y)
+        if pos >= 0:
+            self.selected = pos
+            self.refresh()
+            self._on_menu(pos)
+
+
+# =========================
+# MAIN APP (customtkinter)
+# =========================
+
+# MAHASHE_STARTUP_TRACE=1     напечатать в stderr время до первой отрисовки и до готовности
+# MAHASHE_STARTUP_TRACE=exit  то же и закрыть окно (для benchmarks/bench_startup.py --gui)
+STARTUP_TRACE_ENV_VAR = "MAHASHE_STARTUP_TRACE"
+
+TAB_PATH = "PATH"
+TAB_ENV = "Переменные среды"
+
+
+class App(ctk.CTk):
+    def __init__(self, change_source: Optional[ChangeSource] = None):
+        super().__init__()
+        self.startup: Dict[str, float] = {}  # first_paint / interactive, секунды от STARTED_AT
+
+        ctk.set_appearance_mode("dark")
+        ctk.set_default_color_theme("dark-blue")
+
+        self.th = _theme()
+        self.configure(fg_color=self.th["BG"])
+        self.title(APP_TITLE + ("" if is_admin() else " — Без прав администратора"))
+        self.geometry("1040x760")
+        self.resizable(False, False)
+
+        self.toaster = ToastManager(self, self.th)
+        self._debounce_jobs: Dict[str, str] = {}
+        self._ui_queue: "queue.Queue" = queue.Queue()
+        self._load_gen: Dict[str, int] = {}  # поколение последней загрузки по ключу ("path", "env")
+        # меню и диалоги создаются при первом открытии и дальше только прячутся
+        self._menu: Optional[RowMenu] = None
+        self._edit_dlg: Optional[BigEditDialog] = None
+        self._history_panel: Optional[HistoryPanel] = None
+        self._diff_dlg: Optional[DiffPreview] = None
+        self._confirm_dlg: Optional[ConfirmDialog] = None
+        self._tools_menu: Optional[ToolsMenu] = None
+        # история правок PATH (снимки с общими кусками) и переменных (до/после), Ctrl+Z / Ctrl+Y
+        self.history = EditHistory()
+        self._history_busy = False  # идёт запись шага переменных: новые отмены ждут её
+        self.bind("<Control-KeyPress>", self._on_ctrl_key, add="+")
+        self.after(UI_POLL_MS, self._ui_drain)
+
+        top = ctk.CTkFrame(self, fg_color=self.th["BG"], corner_radius=0)
+        top.pack(fill="x", padx=16, pady=12)
+
+        ctk.CTkLabel(
+            top, text="Mahashe Env Manager",
+            font=ctk.CTkFont(size=18, weight="bold"),
+            text_color=self.th["TEXT"]
+        ).pack(side="left")
+
+        ctk.CTkButton(
+            top, text="Обновить всё",
+            corner_radius=15,
+            command=self.refresh_all
+        ).pack(side="right")
+        ctk.CTkButton(top, text="История", width=90, corner_radius=15, command=self.history_show).pack(side="right", padx=(0, 8))
+        self.btn_redo = ctk.CTkButton(top, text="↷", width=40, corner_radius=15, command=self.redo, state="disabled")
+        self.btn_redo.pack(side="right", padx=(0, 8))
+        self.btn_undo = ctk.CTkButton(top, text="↶", width=40, corner_radius=15, command=self.undo, state="disabled")
+        self.btn_undo.pack(side="right", padx=(0, 6))
+
+        self.tabs = ctk.CTkTabview(
+            self,
+            corner_radius=15,
+            border_width=1,
+            border_color=self.th["BORDER"],
+            fg_color=self.th["BG"],
+            segmented_button_fg_color=self.th["CARD"],
+            segmented_button_selected_color=self.th["BLUE"],
+            segmented_button_selected_hover_color="#2563eb",
+            segmented_button_unselected_color=self.th["CARD"],
+            segmented_button_unselected_hover_color="#142352",
+            text_color="white",
+            command=self._on_tab,
+        )
+        self.tabs.pack(fill="both", expand=True, padx=12, pady=(0, 12))
+
+        # вкладки пустые: содержимое строится и читается из реестра при первом открытии
+        self.tab_path = self.tabs.add(TAB_PATH)
+        self.tab_env = self.tabs.add(TAB_ENV)
+        self._tabs_built: Set[str] = set()
+        self._watcher = None
+        # свои записи источник изменений пропускает (own_writes в _write_loop)
+        self._change_source = change_source or RegistryChangeSource()
+        # записи в реестр идут по одной на своём потоке (см. _write_async)
+        self._writer: Optional["queue.Queue"] = None
+        # пустое раскрытие без чтения реестра: дальше env_expander() в UI-потоке ничего не читает,
+        # а .load() зовётся только из фоновых задач (_expander_job)
+        env_expander(load=False)
+
+        # after_idle встаёт в очередь после отрисовки окна — реестр не трогаем до первого кадра
+        self.after_idle(self._first_paint)
+
+    def _first_paint(self):
+        self._startup_mark("first_paint")
+        self._on_tab()
+        # изменения снаружи (другой процесс, групповая политика) подтягиваются сами
+        self._watcher = ChangeWatcher(
+            self._change_source,
+            lambda scopes: self.call_in_ui(self._on_external_change, scopes),
+        ).start()
+
+    def _on_tab(self):
+        name = self.tabs.get()
+        if name in self._tabs_built:
+            return
+        self._tabs_built.add(name)
+        if name == TAB_PATH:
+            self._build_path_tab()
+            self.path_reload(reload_expander=True)
+        elif name == TAB_ENV:
+            self._build_env_tab()
+            self.env_reload(quiet=True)
+
+    def _startup_mark(self, stage: str):
+        if stage in self.startup:
+            return
+        self.startup[stage] = time.perf_counter() - STARTED_AT
+        if stage != "interactive":
+            return
+        trace = os.environ.get(STARTUP_TRACE_ENV_VAR, "").strip().lower()
+        if trace:
+            eprint(
+                f"STARTUP: first_paint={self.startup.get('first_paint', 0.0) * 1000.0:.1f} ms "
+                f"interactive={self.startup['interactive'] * 1000.0:.1f} ms"
+            )
+        if trace == "exit":
+            self.after(0, self.destroy)
+
+    # ---------------- PATH TAB ----------------
+
+    def _card(self, parent):
+        f = ctk.CTkFrame(parent, fg_color=self.th["CARD"], corner_radius=15, border_width=1, border_color=self.th["BORDER"])
+        f._is_card = True
+        return f
+
+    def call_in_ui(self, fn, *args):
+        """Потокобезопасно: выполнить fn(*args) в главном потоке Tk (Tk не любит вызовы из потоков)."""
+        self._ui_queue.put((fn, args))
+
+    def _ui_drain(self):
+        while True:
+            try:
+                fn, args = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                fn(*args)
+            except Exception as e:
+                self.toaster.show("Ошибка", str(e), ms=3600)
+        self.after(UI_POLL_MS, self._ui_drain)
+
+    def _load_async(self, key: str, jobs: Dict[str, Callable], done: Callable) -> None:
+        """
+        Выполнить jobs {имя: fn} параллельно на фоновых потоках и вызвать done(results, errors)
+        в UI-потоке, когда закончат все. Новый вызов с тем же key делает предыдущий устаревшим:
+        его результат просто выбрасывается (чтение реестра прервать нельзя).
+        """
+        gen = self._load_gen.get(key, 0) + 1
+        self._load_gen[key] = gen
+        results: Dict[str, object] = {}
+        errors: Dict[str, Exception] = {}
+        left = [len(jobs)]
+        lock = threading.Lock()
+
+        def finish():
+            if self._load_gen.get(key) == gen:
+                done(results, errors)
+
+        def run(name, fn):
+            try:
+                res, err = fn(), None
+            except Exception as e:
+                res, err = None, e
+            with lock:
+                if err is None:
+                    results[name] = res
+                else:
+                    errors[name] = err
+                left[0] -= 1
+                last = left[0] == 0
+            if last:
+                self.call_in_ui(finish)
+
+        if not jobs:
+            self.call_in_ui(finish)
+        for name, fn in jobs.items():
+            threading.Thread(target=run, args=(name, fn), name=f"load-{key}-{name}", daemon=True).start()
+
+    def _write_async(self, fn: Callable, done: Callable, scopes: Iterable[str]) -> None:
+        """
+        Выполнить запись fn() в области scopes на единственном потоке записи и вызвать done(result, error)
+        в UI-потоке. Записи идут строго по очереди: несколько отмен подряд не перемешаются.
+        """
+        if self._writer is None:
+            self._writer = queue.Queue()
+            threading.Thread(target=self._write_loop, name="env-write", daemon=True).start()
+        self._writer.put((fn, done, set(scopes)))
+
+    def _write_loop(self):
+        while True:
+            fn, done, scopes = self._writer.get()
+            try:
+                # своя запись — не внешнее изменение: наблюдатель её не перечитывает
+                with self._change_source.own_writes(scopes):
+                    res, err = fn(), None
+            except Exception as e:
+                res, err = None, e
+            self.call_in_ui(done, res, err)
+
+    def _expander_job(self) -> Callable:
+        """Задача для _load_async: перечитать раскрытие %VAR% в фоне и вернуть поверх несохранённые переменные сжатия."""
+        exp = env_expander(load=False)
+        helpers = dict(self._path_helpers)
+        hs = self._path_helper_scope() if helpers else "user"
+
+        def job():
+            exp.load()
+            for name, value in helpers.items():
+                exp.set(hs, name, value)
+
+        return job
+
+    def _load_errors(self, title: str, errors: Dict[str, Exception]) -> None:
+        for name, e in errors.items():
+            if isinstance(e, PermissionError):
+                self.toaster.show(title, f"{name.upper()}: нет доступа", ms=3000)
+            else:
+                self.toaster.show(title, f"Ошибка чтения {name.upper()}: {e}", ms=3800)
+
+    def _search_bar(self, card, placeholder: str, on_change):
+        ent = ctk.CTkEntry(card, placeholder_text=placeholder)
+        ent.grid(row=1, column=0, sticky="ew", padx=(14, 8), pady=(0, 12))
+        ent.bind("<KeyRelease>", lambda e: on_change())
+        mode = ctk.CTkSegmentedButton(card, values=list(SEARCH_MODE_LABELS), command=lambda _v: on_change())
+        mode.set(next(iter(SEARCH_MODE_LABELS)))
+        mode.grid(row=1, column=1, sticky="e", padx=(0, 14), pady=(0, 12))
+        ent._default_border = ent.cget("border_color")
+        return ent, mode
+
+    def _search(self, index: SearchIndex, ent, mode) -> Optional[List[int]]:
+        """Результат поиска; None — некорректный regex (поле подсвечивается)."""
+        try:
+            out = index.search(ent.get(), SEARCH_MODE_LABELS[mode.get()])
+        except re.error:
+            ent.configure(border_color=self.th["BAD"])
+            return None
+        ent.configure(border_color=ent._default_border)
+        return out
+
+    def _debounce(self, key: str, fn, ms: int = SEARCH_DEBOUNCE_MS):
+        job = self._debounce_jobs.pop(key, None)
+        if job is not None:
+            self.after_cancel(job)
+
+        def fire():
+            self._debounce_jobs.pop(key, None)
+            fn()
+
+        self._debounce_jobs[key] = self.after(ms, fire)
+
+    def _build_path_tab(self):
+        root = ctk.CTkFrame(self.tab_path, fg_color=self.th["BG"], corner_radius=0)
+        root.pack(fill="both", expand=True, padx=10, pady=10)
+
+        top_card = self._card(root)
+        top_card.pack(fill="x", padx=6, pady=(0, 10))
+        top_card.grid_columnconfigure(0, weight=1)
+
+        ctk.CTkLabel(top_card, text="PATH редактор", font=ctk.CTkFont(size=14, weight="bold")).grid(
+            row=0, column=0, sticky="w", padx=14, pady=(12, 6)
+        )
+
+        gauge = ctk.CTkFrame(top_card, fg_color=self.th["CARD"])
+        gauge.grid(row=0, column=0, sticky="e", padx=(0, 8), pady=(12, 6))
+        self.path_loading = ctk.CTkLabel(gauge, text="", text_color=self.th["MUTED"])
+        self.path_loading.pack(side="left", padx=(0, 12))
+        self.path_len_label = ctk.CTkLabel(gauge, text="", text_color=self.th["MUTED"])
+        self.path_len_label.pack(side="left", padx=(0, 8))
+        self.path_len_bar = ctk.CTkProgressBar(gauge, width=140)
+        self.path_len_bar.pack(side="left")
+
+        self.path_scope = ctk.CTkOptionMenu(top_card, values=["both", "user", "machine"], command=lambda _: self.path_reload())
+        self.path_scope.set("both")
+        self.path_scope.grid(row=0, column=1, sticky="e", padx=14, pady=(12, 6))
+
+        self.path_search, self.path_search_mode = self._search_bar(top_card, "Поиск по PATH", self._path_apply_filter)
+
+        self._path_dot_font = ctk.CTkFont(size=14, weight="bold")
+        self.path_list = VirtualRowList(
+            root,
+            self.th,
+            row_height=66,
+            make_row=self._path_make_row,
+            bind_row=self._path_bind_row,
+        )
+        self.path_list.pack(fill="both", expand=True, padx=6, pady=(0, 10))
+
+        bottom = self._card(root)
+        bottom.pack(fill="x", padx=6, pady=(0, 0))
+
+        b1 = ctk.CTkButton(bottom, text="Добавить папку", corner_radius=15, command=self.path_add_folder)
+        b2 = ctk.CTkButton(bottom, text="Удалить выбранные", corner_radius=15, command=self.path_delete_selected)
+        b3 = ctk.CTkButton(bottom, text="Удалить дубликаты", corner_radius=15, command=self.path_dedup)
+        self.path_dedup_norm = ctk.CTkCheckBox(bottom, text="нормализовать", width=24)
+        b4 = ctk.CTkButton(bottom, text="Удалить несуществующие", corner_radius=15, command=self.path_prune)
+        b6 = ctk.CTkButton(bottom, text="Анализ…", corner_radius=15, width=110, command=self.path_tools_menu)
+        b5 = ctk.CTkButton(bottom, text="Сохранить", corner_radius=15, command=self.path_apply)
+
+        b1.pack(side="left", padx=12, pady=12)
+        b2.pack(side="left", padx=(0, 10), pady=12)
+        b3.pack(side="left", padx=(0, 6), pady=12)
+        self.path_dedup_norm.pack(side="left", padx=(0, 10), pady=12)
+        b4.pack(side="left", padx=(0, 10), pady=12)
+        b6.pack(side="left", padx=(0, 10), pady=12)
+        b5.pack(side="right", padx=12, pady=12)
+
+        self._path_items = PathList()  # отметки (checked) и дубликаты живут в записях модели
+        self._path_view: List[int] = []  # позиции в _path_items, прошедшие фильтр
+        self._path_index = SearchIndex()
+        self._path_probing: Set[str] = set()  # пути, для которых ждём ответ existence_checker()
+        self._path_recolor_job = None
+        self._path_helpers: Dict[str, str] = {}  # переменные от сжатия PATH, пишутся при сохранении
+        self._path_baseline: List[str] = []  # список, как он загружен/сохранён (для "есть несохранённые правки")
+        self._path_snap = PathSnapshot()  # снимок для истории: каким список был после последнего шага
+        self._path_helpers_snap: Dict[str, str] = {}
+        self._path_loaded_scope = self.path_scope.get()
+        self._path_external = False  # PATH изменён снаружи поверх несохранённых правок
+
+    def _path_dirty(self) -> bool:
+        return bool(self._path_helpers) or self._path_items != self._path_baseline
+
+    @staticmethod
+    def _path_merge(results) -> PathList:
+        items = results.get("user") or PathList()
+        if "machine" in results:
+            # "both": общий список без повторов, в том числе внутри User (как при загрузке раньше)
+            items.dedup()
+            for p in results["machine"]:
+                items.add_once(p)
+        return items
+
+    def _path_jobs(self, scope: str) -> Dict[str, Callable]:
+        return {sc: (lambda sc=sc: read_path(sc)) for sc in ("user", "machine") if scope in (sc, "both")}
+
+    def path_reload(self, reload_expander: bool = False, force: bool = False):
+        """Перечитать PATH выбранной области в фоне; обе области в режиме both — параллельно."""
+        scope = self.path_scope.get()
+        if not force and self._path_dirty() and not self._confirm(
+            "PATH", "Есть несохранённые изменения PATH. Перечитать и потерять их?"
+        ):
+            self.path_scope.set(self._path_loaded_scope)
+            return
+        self._path_helpers.clear()
+        jobs = self._path_jobs(scope)
+        if reload_expander:
+            jobs["expander"] = self._expander_job()
+        self.path_loading.configure(text="Загрузка…")
+
+        def done(results, errors):
+            self.path_loading.configure(text="")
+            self._load_errors("PATH", errors)
+            if reload_expander:
+                existence_checker().invalidate()
+            items = self._path_merge(results)
+            self._path_baseline = items.to_list()
+            self._path_loaded_scope = scope
+            self._path_external = False
+            self._path_reset_history(items)
+            self._path_set_items(items)
+            self.after_idle(self._startup_mark, "interactive")
+
+        self._load_async("path", jobs, done)
+
+    def _path_changed(self, label: str):
+        """Список PATH изменён действием пользователя: записать шаг истории и перерисовать."""
+        snap = PathSnapshot.take(self._path_items, prev=self._path_snap)
+        helpers = dict(self._path_helpers)
+        if snap != self._path_snap or helpers != self._path_helpers_snap:
+            self.history.push(PathStep(label, self._path_snap, snap, self._path_helpers_snap, helpers))
+            self._path_snap = snap
+            self._path_helpers_snap = helpers
+            self._history_changed()
+        self._path_rebuild()
+
+    def _path_reset_history(self, items):
+        # загруженный заново список — новая точка отсчёта, старые шаги PATH к нему не относятся
+        self._path_snap = PathSnapshot.take(items)
+        self._path_helpers_snap = {}
+        self.history.drop(PathStep)
+        self._history_changed()
+
+    def _path_restore(self, snap: PathSnapshot, helpers: Dict[str, str]):
+        checked = {e.value for e in self._path_items.entries if e.checked}
+        items = PathList(snap)
+        for e in items.entries:
+            e.checked = e.value in checked
+        hs = self._path_helper_scope()
+        for name in self._path_helpers.keys() - helpers.keys():
+            env_expander().set(hs, name, None)
+        for name, value in helpers.items():
+            env_expander().set(hs, name, value)
+        self._path_helpers = dict(helpers)
+        self._path_helpers_snap = dict(helpers)
+        self._path_snap = snap
+        self._path_items = items
+        self._path_rebuild()
+
+    def _path_set_items(self, items):
+        self._path_items = items if isinstance(items, PathList) else PathList(items)
+        self._path_rebuild()
+
+    def _path_rebuild(self, reset_scroll: bool = False):
+        # данные изменились: пересчитать ключи поиска, затем отфильтровать
+        self._path_index.reset(self._path_items)
+        self._path_refilter(reset_scroll=reset_scroll)
+        self._path_update_gauge()
+
+    def _path_update_gauge(self):
+        n = len(_join_path(self._path_items))
+        if n <= PATH_LIMIT_SOFT:
+            limit, color = PATH_LIMIT_SOFT, self.th["OK"] if n < PATH_LIMIT_SOFT * 0.9 else self.th["WARN"]
+        else:
+            limit, color = PATH_LIMIT_HARD, self.th["BAD"]
+        self.path_len_label.configure(text=f"Длина: {n} / {limit}", text_color=color)
+        self.path_len_bar.configure(progress_color=color)
+        self.path_len_bar.set(min(1.0, n / limit))
+
+    def _path_refilter(self, reset_scroll: bool = True):
+        view = self._search(self._path_index, self.path_search, self.path_search_mode)
+        if view is None:
+            return
+        self._path_view = view
+        self.path_list.set_count(len(view), reset_scroll=reset_scroll)
+
+    def _path_make_row(self, parent):
+        row = _PathRow()
+        row.frame = ctk.CTkFrame(parent, fg_color=self.th["CARD"], corner_radius=14, border_width=1, border_color=self.th["BORDER"])
+        row.frame.grid_columnconfigure(2, weight=1)
+
+        row.cb = ctk.CTkCheckBox(row.frame, text="", width=24, command=lambda r=row: self._path_toggle(r))
+        row.cb.grid(row=0, column=0, padx=(12, 8), pady=10)
+
+        row.dot = ctk.CTkLabel(row.frame, text="●", width=12, font=self._path_dot_font)
+        row.dot.grid(row=0, column=1, padx=(0, 8), pady=10)
+
+        row.ent = ctk.CTkEntry(row.frame, height=34)
+        row.ent.grid(row=0, column=2, sticky="ew", padx=(0, 8), pady=10)
+        row.ent.configure(state="readonly")
+        # клавиши действуют на строку в фокусе, без меню
+        row.ent.bind("<Return>", lambda _e, r=row: self._path_row_key(r, self.path_edit))
+        row.ent.bind("<Delete>", lambda _e, r=row: self._path_row_key(r, self.path_remove))
+
+        row.btn = ctk.CTkButton(row.frame, text="⋮", width=44, corner_radius=12, command=lambda r=row: self._path_row_menu_at(r))
+        row.btn.grid(row=0, column=3, padx=(0, 12), pady=10)
+        return row
+
+    def _path_bind_row(self, row, pos: int):
+        e = self._path_items.entry(self._path_view[pos])
+        p = e.value
+        row.entry = e
+
+        if row.text != p:
+            row.ent.configure(state="normal")
+            row.ent.delete(0, "end")
+            row.ent.insert(0, p)
+            row.ent.configure(state="readonly")
+            row.text = p
+
+        if e.checked:
+            row.cb.select()
+        else:
+            row.cb.deselect()
+
+        # строка рисуется сразу; пока проверка не вернулась — "неизвестно" (MUTED)
+        valid = existence_checker().peek(p)
+        if valid is None and p not in self._path_probing:
+            self._path_probing.add(p)
+            existence_checker().check_async([p], lambda pp, res: self.call_in_ui(self._path_probe_done, pp, res))
+        if self._path_items.count_entry(e) > 1:
+            color = self.th["WARN"]
+        elif valid is None:
+            color = self.th["MUTED"]
+        else:
+            color = self.th["OK"] if valid else self.th["BAD"]
+        if row.color != color:
+            row.dot.configure(text_color=color)
+            row.color = color
+
+    def _path_probe_done(self, p: str, res: Optional[bool]):
+        # None — проверка зависла: строка остаётся "неизвестно", повторно не спрашиваем,
+        # пока не придёт поздний ответ
+        if res is not None:
+            self._path_probing.discard(p)
+        if self._path_recolor_job is None:
+            self._path_recolor_job = self.after_idle(self._path_recolor)
+
+    def _path_recolor(self):
+        self._path_recolor_job = None
+        self.path_list.refresh()
+
+    def _path_toggle(self, row):
+        if row.entry is not None:
+            row.entry.checked = bool(row.cb.get())
+
+    def _path_row_key(self, row, action):
+        if row.entry is not None:
+            action(row.entry)
+        return "break"
+
+    def _path_row_menu_at(self, row):
+        if row.entry is not None:
+            self.path_row_menu(row.entry)
+
+    def _path_apply_filter(self):
+        self._debounce("path_search", self._path_refilter)
+
+    def path_row_menu(self, entry: PathEntry):
+        self._row_menu().show(
+            "PATH",
+            entry.value,
+            on_edit=lambda: self.path_edit(entry),
+            on_delete=lambda: self.path_remove(entry),
+            on_move=lambda step: self.path_move(entry, step),
+        )
+
+    def path_add_folder(self):
+        from tkinter import filedialog
+        d = filedialog.askdirectory(parent=self, title="Выберите папку для PATH")
+        if not d:
+            return
+        self._path_items.add_once(d)
+        self._path_changed(f"Добавлен {d}")
+        self.toaster.show("PATH", "Путь добавлен в список", ms=2200)
+
+    def path_edit(self, entry: PathEntry):
+        result = self._editor().ask("Редактирование пути (PATH)", name="PathItem", value=entry.value, name_editable=False)
+        if not result:
+            return
+        _, new_val = result
+        new_val = (new_val or "").strip().splitlines()[0].strip() if (new_val or "").strip() else ""
+        if not new_val:
+            return
+        try:
+            old = entry.value
+            self._path_items.set_at(self._path_items.position(entry), new_val)
+        except ValueError:
+            return
+        self._path_changed(f"Изменён {old} → {new_val}")
+        self.toaster.show("PATH", "Путь обновлён", ms=2200)
+
+    def path_remove(self, entry: PathEntry):
+        try:
+            self._path_items.remove_entry(entry)
+        except ValueError:
+            return
+        self._path_changed(f"Удалён {entry.value}")
+
+    def path_move(self, entry: PathEntry, step: int):
+        try:
+            pos = self._path_items.position(entry)
+        except ValueError:
+            return
+        self._path_items.move(pos, pos + step)
+        self._path_changed(f"{'Вверх' if step < 0 else 'Вниз'}: {entry.value}")
+
+    def path_delete_selected(self):
+        # отметки хранятся в модели, поэтому учитываются и строки вне экрана
+        removed = self._path_items.remove_checked()
+        if not removed:
+            self.toaster.show("PATH", "Нечего удалять", ms=2000)
+            return
+        self._path_changed(f"Удалено отмеченных: {removed}")
+        self.toaster.show("PATH", f"Удалено: {removed}", ms=2200)
+
+    def path_dedup(self):
+        if not self.path_dedup_norm.get():
+            self._path_items.dedup()
+            self._path_changed("Удалены дубликаты")
+            self.toaster.show("PATH", "Дубликаты удалены", ms=2200)
+            return
+        if self.path_scope.get() != "user":
+            self._path_dedup_normalized(())
+            return
+
+        # в режиме user повторы Machine тоже лишние: Machine в поиске стоит раньше
+        def done(results, errors):
+            self._load_errors("PATH", errors)
+            if not errors:
+                self._path_dedup_normalized(results["machine"])
+
+        self._load_async("path-dedup", {"machine": lambda: read_path("machine")}, done)
+
+    def _path_dedup_normalized(self, shadow):
+        before = len(self._path_items)
+        dedup_normalized(self._path_items, shadow)
+        self._path_changed("Удалены дубликаты (с нормализацией)")
+        self.toaster.show("PATH", f"Дубликаты удалены (с нормализацией): {before - len(self._path_items)}", ms=2400)
+
+    def path_prune(self):
+        snapshot = self._path_items.to_list()
+        self.toaster.show("PATH", "Проверка путей…", ms=1600)
+
+        def work():
+            res = existence_checker().check_many(snapshot)
+            self.call_in_ui(done, res)
+
+        def done(res):
+            if self._path_items != snapshot:
+                self.toaster.show("PATH", "Список изменился во время проверки — повторите", ms=3000)
+                return
+            unknown = sum(1 for p in dict.fromkeys(snapshot) if res.get(p) is None)
+            _keep_existing(self._path_items, res, "skip")
+            self._path_changed("Удалены несуществующие")
+            removed = len(snapshot) - len(self._path_items)
+            msg = f"Удалено несуществующих: {removed}"
+            if unknown:
+                msg += f"\nБез ответа (оставлены): {unknown}"
+            self.toaster.show("PATH", msg, ms=2400 if not unknown else 3400)
+
+        threading.Thread(target=work, name="path-prune", daemon=True).start()
+
+    @staticmethod
+    def _path_effective(scope: str, items: List[str]):
+        """Порядок поиска для (возможно, несохранённого) списка; читает реестр — звать из фонового потока."""
+        if scope == "user":
+            return effective_path(user=items)
+        if scope == "machine":
+            return effective_path(machine=items)
+        # "both": один список пишется в обе области; область — по сохранённому Machine
+        machine = {normalize_path_key(p) for p in read_path("machine")}
+        return [
+            ("machine" if normalize_path_key(raw) in machine else "user", raw, d)
+            for _sc, raw, d in effective_path(machine=items, user=())
+        ]
+
+    def path_tools_menu(self):
+        if self._tools_menu is None:
+            self._tools_menu = ToolsMenu(self, self.th, (
+                ("Затенённые команды", self.path_shadowed, ()),
+                ("Задержки каталогов", self.path_profile, ()),
+                ("Сжать PATH (переменные для общих каталогов)", self.path_compact, ()),
+                ("Оптимизировать порядок (профиль…)", self.path_optimize, (True,)),
+                ("Оптимизировать порядок (все команды)", self.path_optimize, (False,)),
+            ))
+        self._tools_menu.show()
+
+    @staticmethod
+    def _path_segments(scope: str, items: List[str]):
+        """(machine, user, какая из них — текущий список) для анализа несохранённого PATH; читает реестр."""
+        if scope == "user":
+            return read_path("machine"), items, "user"
+        if scope == "machine":
+            return items, read_path("user"), "machine"
+        return items, [], "machine"
+
+    def path_optimize(self, with_profile: bool):
+        profile = None
+        if with_profile:
+            from tkinter import filedialog
+            src = filedialog.askopenfilename(
+                parent=self, title="Профиль команд (команда частота)",
+                filetypes=[("Профиль", "*.txt *.json *.csv"), ("Все файлы", "*.*")],
+            )
+            if not src:
+                return
+            try:
+                profile = load_usage_profile(src)
+            except Exception as e:
+                self.toaster.show("PATH", f"Профиль не прочитан: {e}", ms=3400)
+                return
+        scope = self.path_scope.get()
+        snapshot = self._path_items.to_list()
+        self.toaster.show("PATH", "Замер каталогов…", ms=1600)
+
+        def work():
+            try:
+                machine, user, seg = self._path_segments(scope, snapshot)
+                opt = PathOptimizer(machine, user, profile)
+                plan = opt.plan()
+            except Exception as e:
+                self.call_in_ui(self.toaster.show, "PATH", f"Ошибка оптимизации: {e}", 3400)
+                return
+            self.call_in_ui(done, opt, plan[seg])
+
+        def done(opt, order):
+            if self._path_items != snapshot:
+                self.toaster.show("PATH", "Список изменился во время замера — повторите", ms=3000)
+                return
+            self._path_items.reorder(order)
+            self._path_changed("Оптимизирован порядок")
+            msg = (
+                f"Порядок изменён (не сохранён)\n"
+                f"проверок на поиск: {opt.probes_before:.1f} → {opt.probes_after:.1f}"
+            )
+            if opt.empty:
+                msg += f"\nБез исполняемых файлов: {len(opt.empty)}"
+            self.toaster.show("PATH", msg, ms=4200)
+
+        threading.Thread(target=work, name="path-optimize", daemon=True).start()
+
+    def _path_helper_scope(self) -> str:
+        # PATH машины не видит переменные пользователя
+        return "machine" if self.path_scope.get() in ("machine", "both") and is_admin() else "user"
+
+    def path_compact(self):
+        scope = self.path_scope.get()
+        snapshot = self._path_items.to_list()
+        taken = list(self._path_helpers)
+        # правила видимости — той области, куда будут записаны переменные (без админа это User)
+        hs = self._path_helper_scope()
+
+        def work():
+            # читает реестр (Machine, существующие переменные) — только в фоне
+            shadow = read_path("machine") if scope == "user" else ()
+            comp = PathCompactor(snapshot, hs, shadow=shadow, taken=taken)
+            return comp, comp.run()
+
+        def done(results, errors):
+            if errors:
+                self.toaster.show("PATH", f"Ошибка сжатия: {errors['compact']}", ms=3400)
+                return
+            if self._path_items != snapshot:
+                self.toaster.show("PATH", "Список изменился во время сжатия — повторите", ms=3000)
+                return
+            self._path_compact_done(*results["compact"])
+
+        self._load_async("path-compact", {"compact": work}, done)
+
+    def _path_compact_done(self, comp: PathCompactor, new: PathList):
+        if new == self._path_items:
+            self.toaster.show("PATH", f"Нечего сжимать: {comp.before} символов", ms=2400)
+            return
+        for name, value in comp.helpers.items():
+            self._path_helpers[name] = value
+            # чтобы проверки существования видели несохранённые переменные
+            env_expander().set(comp.scope, name, value, REG_EXPAND_SZ)
+        self._path_items = new
+        self._path_changed("Сжат PATH")
+        msg = f"Длина: {comp.before} → {comp.after} (не сохранено)"
+        if comp.helpers:
+            msg += "\nНовые переменные: " + ", ".join(comp.helpers)
+        if comp.removed:
+            msg += f"\nУбрано повторов: {len(comp.removed)}"
+        self.toaster.show("PATH", msg, ms=4200)
+
+    def path_profile(self, runs: int = 5, timeout: float = 2.0):
+        parts = self._path_items.to_list()
+        if not parts:
+            self.toaster.show("PATH", "PATH пуст", ms=2000)
+            return
+        win = ctk.CTkToplevel(self)
+        win.title("Задержки каталогов PATH")
+        win.geometry("900x520")
+        win.configure(fg_color=self.th["BG"])
+        win.transient(self)
+
+        card = self._card(win)
+        card.pack(fill="both", expand=True, padx=14, pady=14)
+        status = ctk.CTkLabel(card, text=f"Замер… 0/{runs}", font=ctk.CTkFont(size=14, weight="bold"))
+        status.pack(anchor="w", padx=14, pady=(12, 2))
+        ctk.CTkLabel(
+            card, text=f"Доступ к каталогу платит каждый поиск команды, дошедший до него; таймаут — {timeout:g} с.",
+            text_color=self.th["MUTED"],
+        ).pack(anchor="w", padx=14, pady=(0, 8))
+        box = ctk.CTkTextbox(card, wrap="none", font=ctk.CTkFont(family="Consolas", size=12))
+        box.pack(fill="both", expand=True, padx=14, pady=(0, 10))
+        box.configure(state="disabled")
+
+        btns = ctk.CTkFrame(card, fg_color=self.th["CARD"])
+        btns.pack(fill="x", padx=14, pady=(0, 12))
+        mark = ctk.CTkButton(btns, text="Отметить медленные", corner_radius=15, state="disabled")
+        mark.pack(side="left")
+        ctk.CTkButton(btns, text="Закрыть", corner_radius=15, command=win.destroy).pack(side="right")
+
+        def alive() -> bool:
+            try:
+                return bool(win.winfo_exists())
+            except Exception:
+                return False
+
+        def progress(i, n):
+            if alive():
+                status.configure(text=f"Замер… {i}/{n}")
+
+        def show(report):
+            if not alive():
+                return
+            box.configure(state="normal")
+            box.insert("end", "\n".join(format_path_profile(report)))
+            box.configure(state="disabled")
+            total = sum(e["p50"] for e in report) * 1000
+            status.configure(text=f"Каталогов: {len(report)}, сумма p50: {total:.3f} мс")
+            # медленные: с таймаутами или дороже среднего в 5 раз
+            avg = total / 1000 / max(1, len(report))
+            slow = {e["raw"] for e in report if e["timeouts"] or e["p50"] > 5 * avg}
+            if slow:
+                mark.configure(state="normal", command=lambda: mark_slow(slow))
+
+        def mark_slow(slow):
+            n = 0
+            for e in self._path_items.entries:
+                if e.value in slow:
+                    e.checked = True
+                    n += 1
+            self.path_list.refresh()
+            self.toaster.show("PATH", f"Отмечено: {n} — можно удалить или переместить", ms=2600)
+
+        def work():
+            try:
+                report = profile_path_entries(parts, runs=runs, timeout=timeout, on_run=lambda i, n: self.call_in_ui(progress, i, n))
+            except Exception as e:
+                self.call_in_ui(fail, f"Ошибка: {e}")
+                return
+            self.call_in_ui(show, report)
+
+        def fail(msg):
+            if alive():
+                status.configure(text=msg)
+
+        threading.Thread(target=work, name="path-profile", daemon=True).start()
+
+    def path_shadowed(self):
+        win = ctk.CTkToplevel(self)
+        win.title("Затенённые команды")
+        win.geometry("860x520")
+        win.configure(fg_color=self.th["BG"])
+        win.transient(self)
+
+        card = self._card(win)
+        card.pack(fill="both", expand=True, padx=14, pady=14)
+        status = ctk.CTkLabel(card, text="Сканирование…", font=ctk.CTkFont(size=14, weight="bold"))
+        status.pack(anchor="w", padx=14, pady=(12, 2))
+        ctk.CTkLabel(
+            card, text="Команда найдётся в первом каталоге; жёлтым — User и Machine затеняют друг друга.",
+            text_color=self.th["MUTED"],
+        ).pack(anchor="w", padx=14, pady=(0, 8))
+        box = ctk.CTkTextbox(card, wrap="none")
+        box.pack(fill="both", expand=True, padx=14, pady=(0, 10))
+        box.tag_config("cross", foreground=self.th["WARN"])
+        box.configure(state="disabled")
+        ctk.CTkButton(card, text="Закрыть", corner_radius=15, command=win.destroy).pack(anchor="e", padx=14, pady=(0, 12))
+
+        counts = {"hits": 0, "cross": 0}
+
+        def alive() -> bool:
+            try:
+                return bool(win.winfo_exists())
+            except Exception:
+                return False
+
+        def add_hit(hit):
+            if not alive():
+                return
+            name, winner, win_sc, path, sc, cross = hit
+            counts["hits"] += 1
+            counts["cross"] += cross
+            box.configure(state="normal")
+            box.insert("end", f"{name}:  {winner} ({win_sc})  →  затеняет  {path} ({sc})\n", "cross" if cross else ())
+            box.configure(state="disabled")
+
+        def progress(done, total, d, st):
+            if not alive():
+                return
+            text = f"Сканирование… {done}/{total}"
+            if st == "timeout":
+                box.configure(state="normal")
+                box.insert("end", f"(не ответил, пропущен: {d})\n")
+                box.configure(state="disabled")
+            if done >= total:
+                text = f"Затенённых: {counts['hits']} (между областями: {counts['cross']}), каталогов: {total}"
+            status.configure(text=text)
+
+        scope = self.path_scope.get()
+        items = self._path_items.to_list()
+
+        def work():
+            try:
+                path = self._path_effective(scope, items)
+                if not path:
+                    self.call_in_ui(fail, "PATH пуст")
+                    return
+                scan_shadowed(
+                    path,
+                    on_shadow=lambda hit: self.call_in_ui(add_hit, hit),
+                    on_dir=lambda *a: self.call_in_ui(progress, *a),
+                )
+            except Exception as e:
+                self.call_in_ui(fail, f"Ошибка: {e}")
+
+        def fail(msg):
+            if alive():
+                status.configure(text=msg)
+
+        threading.Thread(target=work, name="path-shadowed", daemon=True).start()
+
+    def path_apply(self):
+        scope = self.path_scope.get()
+        if self._path_external and not self._confirm(
+            "PATH", "PATH изменён другим процессом после загрузки. Перезаписать его вашим списком?"
+        ):
+            return
+        admin = is_admin()
+        if scope == "machine" and not admin:
+            self.toaster.show("PATH", "Нужен админ для MACHINE", ms=2600)
+            return
+        targets = ["user"] if scope == "both" and not admin else [t for t in ("user", "machine") if scope in (t, "both")]
+        items = self._path_items.to_list()
+        helpers = dict(self._path_helpers)
+        hs = self._path_helper_scope()
+
+        def done(results, errors):
+            if self._path_items != items or self._path_helpers != helpers:
+                self.toaster.show("PATH", "Список изменился во время сравнения — сохраните ещё раз", ms=3000)
+                return
+            if errors:
+                self._load_errors("PATH", errors)
+                if not self._confirm("PATH", "Сравнить с реестром не получилось. Всё равно записать?"):
+                    return
+            elif not self._path_preview({t: diff_path(results[t], items) for t in targets}, helpers, hs):
+                return
+            self._write_async(
+                lambda: self._path_write(targets, items, helpers, hs),
+                lambda status, err: self._path_written(scope, admin, items, helpers, status, err),
+                targets + [hs] if helpers else targets,
+            )
+
+        # текущее значение в реестре — для предпросмотра; читается в фоне
+        self._load_async("path-apply", {t: (lambda t=t: read_path(t)) for t in targets}, done)
+
+    @staticmethod
+    def _path_write(targets: List[str], items: List[str], helpers: Dict[str, str], hs: str) -> Dict[str, bool]:
+        """Для потока записи: переменные сжатия, затем PATH по областям; {область: была ли запись}."""
+        # одна рассылка WM_SETTINGCHANGE на всё сохранение, из фонового потока
+        with env_batch():
+            # сначала переменные, потом PATH, который на них ссылается
+            for name, value in helpers.items():
+                set_env(hs, name, value, REG_EXPAND_SZ)
+            return {t: write_path(t, items) for t in targets}
+
+    def _path_written(self, scope: str, admin: bool, items: List[str], helpers: Dict[str, str], status, err):
+        if isinstance(err, PermissionError):
+            self.toaster.show("PATH", "Отказано в доступе (админ)", ms=2800)
+            return
+        if err is not None:
+            self.toaster.show("PATH", f"Ошибка: {err}", ms=3400)
+            return
+        for name in helpers:
+            self._path_helpers.pop(name, None)
+        self._path_helpers_snap = dict(self._path_helpers)
+        self._path_baseline = list(items)
+        self._path_external = False
+        if scope in ("user", "machine"):
+            head = ("Сохранено: " if status[scope] else "Без изменений: ") + scope.upper()
+            self.toaster.show("PATH", head, ms=2400)
+        elif admin:
+            head = "Сохранено" if any(status.values()) else "Без изменений"
+            self.toaster.show("PATH", f"{head}: USER + MACHINE", ms=2600)
+        else:
+            head = "Сохранено: USER" if status["user"] else "Без изменений: USER"
+            self.toaster.show("PATH", f"{head} (MACHINE требует админ)", ms=3000)
+
+    def _path_preview(self, diffs: Dict[str, list], helpers: Dict[str, str], hs: str) -> bool:
+        """Показать разницу со значением в реестре перед записью; False — пользователь передумал."""
+        if not helpers and not any(diffs.values()):
+            return True  # записывать нечего — дальше будет "Без изменений"
+        lines: List[str] = []
+        for name, value in helpers.items():
+            lines.append(f"VAR {hs}:{name} = {value}")
+        for t, ops in diffs.items():
+            lines.extend(format_path_diff(ops, t.upper()))
+        if self._diff_dlg is None:
+            self._diff_dlg = DiffPreview(self, self.th)
+        return self._diff_dlg.ask(lines)
+
+    # ---------------- ENV TAB ----------------
+
+    def _build_env_tab(self):
+        root = ctk.CTkFrame(self.tab_env, fg_color=self.th["BG"], corner_radius=0)
+        root.pack(fill="both", expand=True, padx=10, pady=10)
+
+        top_card = self._card(root)
+        top_card.pack(fill="x", padx=6, pady=(0, 10))
+        top_card.grid_columnconfigure(0, weight=1)
+
+        ctk.CTkLabel(top_card, text="Переменные среды", font=ctk.CTkFont(size=14, weight="bold")).grid(
+            row=0, column=0, sticky="w", padx=14, pady=(12, 6)
+        )
+
+        self.env_loading = ctk.CTkLabel(top_card, text="", text_color=self.th["MUTED"])
+        self.env_loading.grid(row=0, column=0, sticky="e", padx=(0, 8), pady=(12, 6))
+
+        self.env_scope = ctk.CTkOptionMenu(top_card, values=["user", "machine", "both"], command=lambda _: self.env_reload())
+        self.env_scope.set("user")
+        self.env_scope.grid(row=0, column=1, sticky="e", padx=14, pady=(12, 6))
+
+        self.env_search, self.env_search_mode = self._search_bar(
+            top_card, "Поиск по переменным (имя/значение)", lambda: self._debounce("env_search", self.env_rebuild)
+        )
+
+        self.env_list = EnvTable(
+            root,
+            self.th,
+            get_row=self._env_row,
+            on_open=lambda pos: self.env_edit_open(*self._env_key(pos)),
+            on_menu=lambda pos: self.env_row_menu(*self._env_key(pos)),
+            on_delete=lambda pos: self.env_delete(*self._env_key(pos)),
+            get_expanded=self._env_expanded,
+        )
+        self.env_list.pack(fill="both", expand=True, padx=6, pady=(0, 10))
+
+        bottom = self._card(root)
+        bottom.pack(fill="x", padx=6, pady=0)
+
+        ctk.CTkButton(bottom, text="Создать переменную", corner_radius=15, command=self.env_create).pack(
+            side="left", padx=12, pady=12
+        )
+        ctk.CTkButton(bottom, text="Обновить список", corner_radius=15, command=self.env_reload).pack(
+            side="right", padx=12, pady=12
+        )
+        self.env_show_expanded = ctk.CTkCheckBox(bottom, text="Раскрывать %VAR%", command=self._env_toggle_expanded)
+        self.env_show_expanded.pack(side="right", padx=(12, 0), pady=12)
+
+        self._env_data = []  # list of tuples (scope, name, value, regtype)
+        self._env_view: List[int] = []  # индексы в _env_data, прошедшие фильтр
+        self._env_index = SearchIndex()
+
+    def env_reload(self, quiet: bool = False):
+        """Перечитать переменные в фоне; обе области — параллельно, устаревшие загрузки отбрасываются."""
+        scope = self.env_scope.get()
+        jobs = {sc: (lambda sc=sc: list_env(sc)) for sc in ("user", "machine") if scope in (sc, "both")}
+        if self.env_list.show_expanded:
+            jobs["expander"] = self._expander_job()
+        self.env_loading.configure(text="Загрузка…")
+
+        def done(results, errors):
+            self.env_loading.configure(text="")
+            self._load_errors("Переменные среды", errors)
+            data = [
+                (sc, k, v, t)
+                for sc in ("user", "machine")
+                for k, (v, t) in (results.get(sc) or {}).items()
+            ]
+            data.sort(key=lambda x: (x[1].lower(), x[0]))
+            self._env_data = data
+            self._env_index.reset(f"{name}\0{val or ''}" for _sc, name, val, _t in data)
+            self.env_rebuild()
+            self.after_idle(self._startup_mark, "interactive")
+            if not quiet and not errors:
+                self.toaster.show("Переменные среды", "Список обновлён", ms=1700)
+
+        self._load_async("env", jobs, done)
+
+    def env_rebuild(self, reset_scroll: bool = True):
+        view = self._search(self._env_index, self.env_search, self.env_search_mode)
+        if view is None:
+            return
+        self._env_view = view
+        self.env_list.set_count(len(view), reset_scroll=reset_scroll)
+
+    def _env_row(self, pos: int):
+        sc, name, val, _t = self._env_data[self._env_view[pos]]
+        return sc, name, val
+
+    def _env_expanded(self, pos: int) -> str:
+        _sc, _name, val, t = self._env_data[self._env_view[pos]]
+        # REG_SZ Windows не раскрывает — показываем как есть
+        return env_expander().expand(val or "") if t == REG_EXPAND_SZ else (val or "")
+
+    def _env_toggle_expanded(self):
+        if not self.env_show_expanded.get():
+            self.env_list.set_show_expanded(False)
+            return
+        self.env_loading.configure(text="Загрузка…")
+
+        def done(_results, errors):
+            self.env_loading.configure(text="")
+            self._load_errors("Переменные среды", errors)
+            self.env_list.set_show_expanded(bool(self.env_show_expanded.get()))
+
+        self._load_async("expander", {"expander": self._expander_job()}, done)
+
+    def _env_key(self, pos: int):
+        sc, name, _v, _t = self._env_data[self._env_view[pos]]
+        return sc, name
+
+    def env_row_menu(self, scope: str, name: str):
+        self._row_menu().show(
+            "Переменная",
+            f"{scope.upper()}  •  {name}",
+            on_edit=lambda: self.env_edit_open(scope, name),
+            on_delete=lambda: self.env_delete(scope, name),
+        )
+
+    def env_create(self):
+        result = self._editor().ask("Создать переменную среды", name="", value="", name_editable=True)
+        if not result:
+            return
+        name, val = result
+        scope = self.env_scope.get()
+        admin = is_admin()
+        if scope == "machine" and not admin:
+            self.toaster.show("Переменные", "Нужен админ для MACHINE", ms=2800)
+            return
+        targets = [sc for sc in ("user", "machine") if scope in (sc, "both") and (sc == "user" or admin)]
+
+        def write():
+            with env_batch():
+                return any([set_env(sc, name, val) for sc in targets])
+
+        def written(wrote: bool):
+            if scope != "both":
+                head = "Создано/обновлено" if wrote else "Без изменений"
+                self.toaster.show("Переменные", f"{head}: {scope.upper()}: {name}", ms=2600 if wrote else 2400)
+            elif admin:
+                self.toaster.show("Переменные", f"Создано: USER + MACHINE: {name}", ms=2600)
+            else:
+                self.toaster.show("Переменные", f"Создано: USER (MACHINE требует админ): {name}", ms=3200)
+
+        self._env_write(f"Создана {name}", [(sc, name) for sc in targets], write, written)
+
+    def env_edit_open(self, scope: str, name: str):
+        # значение берётся из уже загруженного списка — без чтения реестра в UI-потоке
+        cur = next((v for sc, n, v, _t in self._env_data if sc == scope and n == name), None)
+        if cur is None:
+            self.toaster.show("Переменные", "Переменная не найдена", ms=2400)
+            return
+
+        result = self._editor().ask(f"Редактирование переменной ({scope.upper()})", name=name, value=cur, name_editable=False)
+        if not result:
+            return
+        _n, new_val = result
+        if scope == "machine" and not is_admin():
+            self.toaster.show("Переменные", "Нужен админ для MACHINE", ms=2800)
+            return
+
+        def written(wrote: bool):
+            head = "Сохранено" if wrote else "Без изменений"
+            self.toaster.show("Переменные", f"{head}: {scope.upper()}: {name}", ms=2400)
+
+        self._env_write(f"Изменена {name}", [(scope, name)], lambda: set_env(scope, name, new_val), written)
+
+    def env_delete(self, scope: str, name: str):
+        if scope == "machine" and not is_admin():
+            self.toaster.show("Переменные", "Нужен админ для MACHINE", ms=2800)
+            return
+        self._env_write(
+            f"Удалена {name}", [(scope, name)], lambda: delete_env(scope, name),
+            lambda _wrote: self.toaster.show("Переменные", f"Удалено: {scope.upper()}: {name}", ms=2400),
+        )
+
+    def _env_write(self, label: str, keys: List[Tuple[str, str]], write: Callable, on_done: Callable):
+        """
+        Записать переменные на потоке записи. Значения keys [(scope, имя)] читаются там же до и после
+        записи: что изменилось — шаг истории (даже если запись упала на полпути). on_done(результат write).
+        """
+        def job():
+            before = [get_env(sc, name) for sc, name in keys]
+            try:
+                res, err = write(), None
+            except Exception as e:
+                res, err = None, e
+            changes = []
+            for (sc, name), old in zip(keys, before):
+                new = get_env(sc, name)
+                if new != old:
+                    changes.append((sc, name, old, new))
+            return res, changes, err
+
+        def done(out, err):
+            res, changes, err = out if err is None else (None, [], err)
+            if changes:
+                self.history.push(EnvStep(label, changes))
+                self._history_changed()
+            if err is not None:
+                self.toaster.show("Переменные", f"Ошибка: {err}", ms=3600)
+            else:
+                on_done(res)
+            self.env_reload()
+
+        self._write_async(job, done, [sc for sc, _name in keys])
+
+    # ---------------- COMMON ----------------
+
+    def refresh_all(self):
+        # реестр мог измениться снаружи: раскрытие %VAR% и кэш проверок — заново;
+        # несохранённые переменные сжатия уходят вместе со списком
+        if TAB_PATH in self._tabs_built:
+            self.path_reload(reload_expander=True)
+        if TAB_ENV in self._tabs_built:
+            self.env_reload()
+
+    # ---------------- HISTORY ----------------
+
+    def _history_changed(self):
+        self.btn_undo.configure(state="normal" if self.history.can_undo() else "disabled")
+        self.btn_redo.configure(state="normal" if self.history.can_redo() else "disabled")
+        if self._history_panel is not None and self._history_panel.winfo_viewable():
+            self._history_panel.set_history(self.history.labels(), self.history.cursor)
+
+    def _history_walk(self, undo: bool, n: int, done: int = 0, last=None):
+        """
+        До n шагов отмены/повтора подряд. Шаг PATH применяется сразу; шаг переменных пишется на потоке
+        записи, и курсор сдвигается только после успешной записи — следующий шаг ждёт её окончания.
+        """
+        while done < n:
+            step = self.history.peek(undo)
+            if step is None:
+                break
+            if isinstance(step, PathStep):
+                if undo:
+                    self.history.undo()
+                    self._path_restore(step.before, step.helpers_before)
+                else:
+                    self.history.redo()
+                    self._path_restore(step.after, step.helpers_after)
+                done, last = done + 1, step
+                continue
+            scopes = [sc for sc, *_rest in step.changes]
+            if "machine" in scopes and not is_admin():
+                self.toaster.show("История", "Ошибка: нужен админ для MACHINE", ms=3400)
+                break
+            self._history_busy = True
+            self._write_async(
+                lambda: step.apply(undo),
+                lambda _res, err: self._history_env_done(step, undo, n, done, last, err),
+                scopes,
+            )
+            return
+        self._history_changed()
+        if done == 1:
+            self.toaster.show("История", f"{'Отменено' if undo else 'Повторено'}: {last.label}", ms=1800)
+        elif done:
+            self.toaster.show("История", f"{'Отменено' if undo else 'Повторено'} шагов: {done}", ms=1800)
+
+    def _history_env_done(self, step, undo: bool, n: int, done: int, last, err):
+        self._history_busy = False
+        if TAB_ENV in self._tabs_built:
+            self.env_reload(quiet=True)
+        if err is not None or self.history.peek(undo) is not step:
+            # запись не прошла (или история сменилась) — курсор остаётся у последнего применённого шага
+            if err is not None:
+                self.toaster.show("История", f"Ошибка записи: {err}", ms=3400)
+            n = done
+        else:
+            if undo:
+                self.history.undo()
+            else:
+                self.history.redo()
+            done, last = done + 1, step
+        self._history_walk(undo, n, done, last)
+
+    def undo(self):
+        if not self._history_busy:
+            self._history_walk(True, 1)
+
+    def redo(self):
+        if not self._history_busy:
+            self._history_walk(False, 1)
+
+    def history_jump(self, cursor: int):
+        if not self._history_busy and cursor != self.history.cursor:
+            self._history_walk(cursor < self.history.cursor, abs(cursor - self.history.cursor))
+
+    def history_show(self):
+        if self._history_panel is None:
+            self._history_panel = HistoryPanel(self, self.th, self.undo, self.redo, self.history_jump)
+        self._history_panel.show()
+        self._history_panel.set_history(self.history.labels(), self.history.cursor)
+
+    def _on_ctrl_key(self, event):
+        # в полях ввода Ctrl+Z — их собственная отмена; keycode — для русской раскладки на Windows
+        try:
+            w = self.focus_get()
+        except (KeyError, tkinter.TclError):
+            w = None
+        if isinstance(w, (tkinter.Entry, tkinter.Text)) and str(w.cget("state")) == "normal":
+            return None
+        key = event.keysym.lower()
+        if key == "z" or (os.name == "nt" and event.keycode == 90):
+            if event.state & 0x1:  # Ctrl+Shift+Z
+                self.redo()
+            else:
+                self.undo()
+            return "break"
+        if key == "y" or (os.name == "nt" and event.keycode == 89):
+            self.redo()
+            return "break"
+        return None
+
+    def _row_menu(self) -> RowMenu:
+        if self._menu is None:
+            self._menu = RowMenu(self, self.th)
+        return self._menu
+
+    def _editor(self) -> BigEditDialog:
+        if self._edit_dlg is None:
+            self._edit_dlg = BigEditDialog(self, self.th)
+        return self._edit_dlg
+
+    def _confirm(self, title: str, text: str) -> bool:
+        if self._confirm_dlg is None:
+            self._confirm_dlg = ConfirmDialog(self, self.th)
+        return self._confirm_dlg.ask(title, text)
+
+    def _on_external_change(self, scopes: List[str]):
+        """Реестр изменили снаружи: перечитать только затронутые области и влить разницу в списки."""
+        env_scopes = []
+        if TAB_ENV in self._tabs_built:
+            env_scopes = [sc for sc in scopes if self.env_scope.get() in (sc, "both")]
+        path_scope = self._path_loaded_scope if TAB_PATH in self._tabs_built else ""
+        path_hit = bool(path_scope) and any(path_scope in (sc, "both") for sc in scopes)
+
+        jobs: Dict[str, Callable] = {"expander": self._expander_job()}
+        for sc in env_scopes:
+            jobs[f"env:{sc}"] = lambda sc=sc: list_env(sc)
+        if path_hit:
+            jobs.update({f"path:{sc}": fn for sc, fn in self._path_jobs(path_scope).items()})
+
+        def done(results, errors):
+            existence_checker().invalidate()
+            if env_scopes:
+                self._env_merge({sc: results[f"env:{sc}"] for sc in env_scopes if f"env:{sc}" in results})
+            if path_hit and not any(k.startswith("path:") for k in errors) and path_scope == self._path_loaded_scope:
+                self._path_merge_external(self._path_merge({k[5:]: v for k, v in results.items() if k.startswith("path:")}))
+
+        self._load_async("external", jobs, done)
+
+    def _path_merge_external(self, items: PathList):
+        new = items.to_list()
+        if new == self._path_baseline:
+            return  # наша же запись или изменились другие переменные
+        if self._path_dirty():
+            self._path_external = True
+            self.toaster.show("PATH", "PATH изменён снаружи. У вас есть несохранённые правки — при сохранении спрошу.", ms=4200)
+            return
+        # отметки переносятся на те же пути, прокрутка не сбрасывается
+        checked = {e.value for e in self._path_items.entries if e.checked}
+        for e in items.entries:
+            e.checked = e.value in checked
+        self._path_baseline = new
+        self._path_reset_history(items)
+        self._path_items = items
+        self._path_rebuild(reset_scroll=False)
+        self.toaster.show("PATH", "PATH изменён снаружи — список обновлён", ms=2400)
+
+    def _env_merge(self, fresh: Dict[str, Dict[str, Tuple[str, int]]]):
+        if not fresh:
+            return
+        old = {(sc, name.casefold()): (v, t) for sc, name, v, t in self._env_data if sc in fresh}
+        new = {(sc, k.casefold()): (v, t) for sc, vals in fresh.items() for k, (v, t) in vals.items()}
+        if old == new:
+            return
+        sel = self._env_key(self.env_list.selected) if 0 <= self.env_list.selected < len(self._env_view) else None
+        data = [r for r in self._env_data if r[0] not in fresh]
+        data.extend((sc, k, v, t) for sc, vals in fresh.items() for k, (v, t) in vals.items())
+        data.sort(key=lambda x: (x[1].lower(), x[0]))
+        self._env_data = data
+        self._env_index.reset(f"{name}\0{val or ''}" for _sc, name, val, _t in data)
+        self.env_rebuild(reset_scroll=False)
+        if sel is not None:
+            self.env_list.selected = next(
+                (pos for pos, i in enumerate(self._env_view) if (data[i][0], data[i][1]) == sel), -1
+            )
+            self.env_list.refresh()
+        changed = len(old.keys() ^ new.keys()) + sum(1 for k in old.keys() & new.keys() if old[k] != new[k])
+        self.toaster.show("Переменные среды", f"Изменено снаружи: {changed}", ms=2000)
+
+
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# Бенчмарки PATH/env-операций на синтетических окружениях (10 / 1 000 / 10 000 элементов PATH,
+# 5 000 переменных) с хранением базовой линии и поиском регрессий.
+#
+# Запуск:
+#   python benchmarks/bench_path_ops.py                 сравнить с benchmarks/baseline.json
+#   python benchmarks/bench_path_ops.py --save-baseline записать текущие результаты как базовую линию
+#   python benchmarks/bench_path_ops.py --ci            как первый вариант, но без базовой линии — код 2
+#   xvfb-run python benchmarks/bench_path_ops.py --gui  + перестроение списка PATH в GUI (нужен дисплей)
+# Код возврата 1 — есть регрессии больше --threshold; 2 — (--ci) базовой линии нет.
+# Базовая линия хранится в репозитории вместе с версией Python и платформой, на которых снята.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Path_editorv4 as core  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+PATH_SIZES = (10, 1000, 10000)
+ENV_VARS = 5000
+OPS_PER_RUN = 100  # сколько add/rm делается за один замер
+
+
+# ---------------- synthetic data ----------------
+
+def make_path(n: int, rng: random.Random, real_dir: str = "") -> list:
+    """n элементов: ~5% дубликатов, часть с %VAR%, треть — реально существующие папки (если real_dir)."""
+    out = []
+    for i in range(n):
+        r = rng.random()
+        if out and r < 0.05:
+            out.append(rng.choice(out))
+        elif r < 0.15:
+            out.append(f"%SystemRoot%\\Vendor{i}\\bin")
+        elif real_dir and r < 0.45:
+            out.append(os.path.join(real_dir, f"d{i}"))
+        else:
+            out.append(f"C:\\Program Files\\Vendor{i}\\Tool{i % 97}\\bin")
+    return out
+
+
+def make_env(n_vars: int, rng: random.Random) -> dict:
+    data = {"admin": True, "user": {}, "machine": {}}
+    for i in range(n_vars):
+        scope = "user" if i % 2 else "machine"
+        value = ";".join(f"C:\\v{i}\\{j}" for j in range(rng.randint(1, 6)))
+        data[scope][f"VAR_{i:05d}"] = value
+    return data
+
+
+def make_real_dirs(paths: list, real_dir: str) -> None:
+    for p in paths:
+        if p.startswith(real_dir):
+            os.makedirs(p, exist_ok=True)
+
+
+# ---------------- timing ----------------
+
+def measure(fn, repeat: int) -> float:
+    """Медиана времени одного вызова fn() в секундах."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def _repeat_for(n: int) -> int:
+    return 50 if n <= 10 else (15 if n <= 1000 else 5)
+
+
+def bench_path_ops(rng: random.Random, real_dir: str) -> dict:
+    results = {}
+    for n in PATH_SIZES:
+        parts = make_path(n, rng, real_dir)
+        make_real_dirs(parts, real_dir)
+        raw = core._join_path(parts)
+        rep = _repeat_for(n)
+        new_items = [f"D:\\new\\{i}" for i in range(OPS_PER_RUN)]
+        victims = [parts[(i * 7919) % n] for i in range(min(OPS_PER_RUN, n))]
+
+        results[f"split_path[{n}]"] = measure(lambda: core._split_path(raw), rep)
+        results[f"join_path[{n}]"] = measure(lambda: core._join_path(parts), rep)
+        results[f"dedup_keep_first[{n}]"] = measure(lambda: core.dedup_keep_first(parts), rep)
+
+        def add_many():
+            cur = list(parts)
+            for p in new_items:
+                cur = core.add_path_once(cur, p)
+
+        def rm_many():
+            cur = list(parts)
+            for p in victims:
+                cur = core.rm_path_exact(cur, p)
+
+        results[f"add_path_once x{OPS_PER_RUN}[{n}]"] = measure(add_many, rep)
+        results[f"rm_path_exact x{len(victims)}[{n}]"] = measure(rm_many, rep)
+
+        def prune():
+            core.existence_checker().invalidate()
+            core.prune_nonexistent(parts, timeout=5)
+
+        results[f"prune_nonexistent[{n}]"] = measure(prune, max(3, rep // 5))
+
+        # предпросмотр записи: вставки, удаления и перестановка блока
+        gone = set(victims)
+        edited = [p for p in parts if p not in gone] + new_items
+        k = n // 3
+        edited = edited[k:2 * k] + edited[:k] + edited[2 * k:]
+        results[f"diff_path[{n}]"] = measure(lambda: core.diff_path(parts, edited), rep)
+    return results
+
+
+def bench_cli_list(rng: random.Random) -> dict:
+    results = {}
+    prev_backend = core._BACKEND
+    core.set_backend(core.MemoryBackend(make_env(ENV_VARS, rng)))
+    try:
+        for scope in ("user", "both"):
+            argv = ["Path_editorv4.py", "-list", "--scope", scope]
+
+            def run():
+                old = sys.argv
+                sys.argv = argv
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        core.cli_run()
+                finally:
+                    sys.argv = old
+
+            results[f"cli -list {scope}[{ENV_VARS} vars]"] = measure(run, 7)
+    finally:
+        core.set_backend(prev_backend)
+    return results
+
+
+def bench_gui(rng: random.Random) -> dict:
+    if os.name != "nt" and not os.environ.get("DISPLAY"):
+        print("GUI: пропущено — нет DISPLAY (запусти через xvfb-run)")
+        return {}
+    try:
+        gui = core._load_gui()
+    except Exception as e:
+        print(f"GUI: пропущено — {e}")
+        return {}
+
+    results = {}
+    prev_backend = core._BACKEND
+    core.set_backend(core.MemoryBackend(make_env(ENV_VARS, rng)))
+    app = gui.App()
+    try:
+        app.update()
+        for n in PATH_SIZES:
+            items = make_path(n, rng)
+
+            def rebuild():
+                app._path_set_items(items)
+                app.update_idletasks()
+
+            results[f"gui path rebuild[{n}]"] = measure(rebuild, _repeat_for(n))
+    finally:
+        app.destroy()
+        core.set_backend(prev_backend)
+    return results
+
+
+# ---------------- baseline ----------------
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    regressions = 0
+    print(f"{'benchmark':<36} {'now, ms':>10} {'base, ms':>10} {'delta':>8}")
+    for name, sec in results.items():
+        base = baseline.get(name)
+        line = f"{name:<36} {sec * 1000:10.3f}"
+        if base is None:
+            print(line + f" {'-':>10} {'new':>8}")
+            continue
+        delta = (sec - base) / base if base > 0 else 0.0
+        flag = ""
+        # шум на микросекундных замерах не считаем регрессией
+        if delta > threshold and sec - base > 0.0005:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(line + f" {base * 1000:10.3f} {delta * 100:7.1f}%{flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Бенчмарки PATH/env-операций Path_editorv4")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.25, help="допустимый рост времени (0.25 = +25%%)")
+    ap.add_argument("--gui", action="store_true", help="также замерить перестроение GUI")
+    ap.add_argument("--seed", type=int, default=1337)
+    ap.add_argument("--ci", action="store_true", help="нет базовой линии — ошибка (код 2), а не пропуск")
+    ns = ap.parse_args(argv)
+
+    rng = random.Random(ns.seed)
+    real_dir = tempfile.mkdtemp(prefix="mahashe_bench_")
+    try:
+        results = {}
+        results.update(bench_path_ops(rng, real_dir))
+        results.update(bench_cli_list(rng))
+        if ns.gui:
+            results.update(bench_gui(rng))
+    finally:
+        shutil.rmtree(real_dir, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(ns.baseline):
+        with open(ns.baseline, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        baseline = meta.get("results", {})
+        here = (sys.version.split()[0], sys.platform)
+        if (meta.get("python"), meta.get("platform")) != here:
+            print(f"WARN: базовая линия снята на Python {meta.get('python')} / {meta.get('platform')}, "
+                  f"сейчас {here[0]} / {here[1]} — сравнение примерное")
+
+    regressions = compare(results, baseline, ns.threshold)
+
+    if ns.save_baseline:
+        with open(ns.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "results": results}, f, indent=1)
+        print(f"базовая линия записана: {ns.baseline}")
+        return 0
+    if not baseline:
+        print("базовой линии нет — запусти с --save-baseline")
+        return 2 if ns.ci else 0
+    if regressions:
+        print(f"регрессий: {regressions}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
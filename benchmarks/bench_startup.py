@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Замер холодного старта CLI: "до" (GUI-стек импортируется при загрузке модуля)
+# против "после" (customtkinter грузится только для -gui).
+#
+# Запуск:
+#   python benchmarks/bench_startup.py [--runs 15] [-- <аргументы CLI>]
+#   xvfb-run python benchmarks/bench_startup.py --gui [--runs 15]   холодный старт окна (нужен дисплей)
+# По умолчанию меряется "-h". "До" эмулируется предварительным импортом customtkinter
+# в том же процессе перед запуском скрипта — ровно то, что раньше делал модуль.
+# --gui печатает время до первой отрисовки и до готовности первой вкладки (MAHASHE_STARTUP_TRACE=exit).
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "Path_editorv4.py")
+
+GUI_MODULES = ("customtkinter", "tkinter", "Path_editorv4_gui")
+
+_RUNNER = """
+import runpy, sys
+{preload}
+sys.argv = {argv!r}
+try:
+    runpy.run_path({script!r}, run_name="__main__")
+except SystemExit:
+    pass
+if {check!r}:
+    loaded = [m for m in {gui!r} if m in sys.modules]
+    sys.stderr.write("GUI_MODULES=" + ",".join(loaded) + "\\n")
+"""
+
+
+def _runner_code(cli_args, preload: bool, check: bool = False) -> str:
+    return _RUNNER.format(
+        preload="import customtkinter" if preload else "",
+        argv=[SCRIPT] + list(cli_args),
+        script=SCRIPT,
+        check=check,
+        gui=GUI_MODULES,
+    )
+
+
+def _time_once(code: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        cwd=ROOT,
+    )
+    return time.perf_counter() - t0
+
+
+def _have_customtkinter() -> bool:
+    rc = subprocess.run(
+        [sys.executable, "-c", "import customtkinter"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    ).returncode
+    return rc == 0
+
+
+def check_cli_is_gui_free(cli_args) -> bool:
+    proc = subprocess.run(
+        [sys.executable, "-c", _runner_code(cli_args, preload=False, check=True)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        cwd=ROOT,
+        text=True,
+    )
+    for line in (proc.stderr or "").splitlines():
+        if line.startswith("GUI_MODULES="):
+            loaded = line.split("=", 1)[1].strip()
+            if loaded:
+                print(f"FAIL: CLI загрузил GUI-модули: {loaded}")
+                return False
+            return True
+    print("FAIL: не удалось проверить список модулей")
+    return False
+
+
+def _summary(label: str, samples) -> str:
+    ms = sorted(s * 1000.0 for s in samples)
+    p50 = statistics.median(ms)
+    p95 = ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))]
+    return f"{label:<8} p50={p50:8.1f} ms   p95={p95:8.1f} ms   min={ms[0]:8.1f} ms"
+
+
+def _gui_once(extra_env):
+    env = dict(os.environ, MAHASHE_STARTUP_TRACE="exit", **extra_env)
+    proc = subprocess.run(
+        [sys.executable, SCRIPT, "-gui"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        cwd=ROOT,
+        env=env,
+        text=True,
+        timeout=120,
+    )
+    # STARTUP: first_paint=123.4 ms interactive=234.5 ms
+    for line in (proc.stderr or "").splitlines():
+        if line.startswith("STARTUP:"):
+            vals = dict(re.findall(r"(\w+)=([\d.]+) ms", line))
+            return float(vals["first_paint"]) / 1000.0, float(vals["interactive"]) / 1000.0
+    return None
+
+
+def bench_gui(runs: int) -> int:
+    if not _have_customtkinter():
+        print("SKIP: customtkinter не установлен")
+        return 0
+    extra = {}
+    if os.name != "nt" and not os.environ.get("MAHASHE_ENV_BACKEND"):
+        extra["MAHASHE_ENV_BACKEND"] = "memory"
+    if _gui_once(extra) is None:  # прогрев и проверка, что окно вообще открывается
+        print("FAIL: GUI не сообщил время старта (нет дисплея?)")
+        return 1
+    samples = [s for s in (_gui_once(extra) for _ in range(runs)) if s is not None]
+    print(f"GUI: -gui   runs={len(samples)}")
+    print(_summary("кадр", [s[0] for s in samples]))
+    print(_summary("готово", [s[1] for s in samples]))
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Холодный старт CLI Path_editorv4: до/после ленивого GUI")
+    ap.add_argument("--runs", type=int, default=15)
+    ap.add_argument("--gui", action="store_true", help="мерить холодный старт окна, а не CLI")
+    ap.add_argument("cli_args", nargs=argparse.REMAINDER)
+    ns = ap.parse_args(argv)
+
+    cli_args = [a for a in ns.cli_args if a != "--"] or ["-h"]
+    runs = max(1, ns.runs)
+    if ns.gui:
+        return bench_gui(runs)
+
+    print(f"CLI: {' '.join(cli_args)}   runs={runs}")
+    if not check_cli_is_gui_free(cli_args):
+        return 1
+    print("OK: CLI-путь не импортирует customtkinter/tkinter")
+
+    after_code = _runner_code(cli_args, preload=False)
+    _time_once(after_code)  # прогрев файлового кэша
+    after = [_time_once(after_code) for _ in range(runs)]
+    print(_summary("после", after))
+
+    if not _have_customtkinter():
+        print("до       пропущено: customtkinter не установлен")
+        return 0
+
+    before_code = _runner_code(cli_args, preload=True)
+    _time_once(before_code)
+    before = [_time_once(before_code) for _ in range(runs)]
+    print(_summary("до", before))
+
+    gain = statistics.median(before) - statistics.median(after)
+    print(f"выигрыш  p50={gain * 1000.0:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Path_editorv4 as pe  # noqa: E402
+
+
+@pytest.fixture
+def mem():
+    """Реестр в памяти (admin), рассылка — заглушка, общий EnvExpander сброшен."""
+    b = pe.MemoryBackend()
+    pe.set_backend(b)
+    pe.set_broadcaster(pe.EnvBroadcaster(sender=lambda: None))
+    pe.set_env_expander(None)
+    yield b
+    pe.broadcaster().wait(2)
+    pe.set_backend(None)
+    pe.set_broadcaster(None)
+    pe.set_env_expander(None)
@@ -0,0 +1,48 @@
+import Path_editorv4 as pe
+
+
+def _stub(mem):
+    sent = []
+    b = pe.EnvBroadcaster(sender=lambda: sent.append(1))
+    pe.set_broadcaster(b)
+    return b, sent
+
+
+def test_batch_sends_once(mem):
+    b, sent = _stub(mem)
+    with pe.env_batch():
+        for i in range(5):
+            pe.set_env("user", f"V{i}", str(i))
+        assert sent == []
+    assert b.wait(2)
+    assert len(sent) == 1
+
+
+def test_noop_write_does_not_broadcast(mem):
+    pe.set_env("user", "FOO", "1")
+    pe.broadcaster().wait(2)
+    b, sent = _stub(mem)
+    pe.set_env("user", "FOO", "1")
+    pe.delete_env("user", "MISSING")
+    assert b.wait(2)
+    assert sent == []
+
+
+def test_nested_batches_send_once(mem):
+    b, sent = _stub(mem)
+    with pe.env_batch():
+        pe.set_env("user", "A", "1")
+        with pe.env_batch():
+            pe.set_env("user", "B", "1")
+        pe.delete_env("user", "A")
+    assert b.wait(2)
+    assert len(sent) == 1
+
+
+def test_cli_batch_sends_once(mem, tmp_path):
+    b, sent = _stub(mem)
+    src = tmp_path / "ops.txt"
+    src.write_text("set A 1\nset B 2\naddpath C:\\Tools --scope user\n", encoding="utf-8")
+    assert pe.cli_batch(str(src)) == 0
+    assert b.wait(2)
+    assert len(sent) == 1
@@ -0,0 +1,43 @@
+import Path_editorv4 as pe
+
+
+def _machine_path():
+    return ["C:\\Java\\jdk17\\bin", "C:\\Java\\jdk17\\lib", "C:\\Java\\jdk17\\jre\\bin", "C:\\Windows"]
+
+
+def test_machine_ignores_user_variables(mem):
+    pe.set_env("machine", "JAVA_HOME", "C:\\Java\\jdk8")
+    pe.set_env("user", "JAVA_HOME", "C:\\Java\\jdk17")
+    comp = pe.PathCompactor(_machine_path(), "machine", target=0, dedup=False)
+    new = comp.run()
+    assert "JAVA_HOME" not in comp.reused
+    assert not any("%JAVA_HOME%" in p for p in new)
+    # новая переменная не совпадает по имени с переменной пользователя
+    assert all(n.casefold() != "java_home" for n in comp.helpers)
+    exp = pe.EnvExpander.from_registry(("machine",))
+    for name, value in comp.helpers.items():
+        exp.set("machine", name, value)
+    assert [exp.expand(p) for p in new] == _machine_path()
+
+
+def test_user_reuses_user_variable(mem):
+    pe.set_env("user", "JAVA_HOME", "C:\\Java\\jdk17")
+    comp = pe.PathCompactor(_machine_path(), "user", target=0, dedup=False)
+    new = comp.run()
+    assert "JAVA_HOME" in comp.reused
+    assert new[0] == "%JAVA_HOME%\\bin"
+
+
+def test_cli_writes_helpers_as_expand_sz(mem, capsys):
+    pe.write_path("machine", ["C:\\Very\\Long\\Prefix\\a", "C:\\Very\\Long\\Prefix\\b", "C:\\Very\\Long\\Prefix\\c"])
+    import sys
+    argv, sys.argv = sys.argv, ["x", "-compactpath", "--scope", "machine", "--target", "0", "--apply"]
+    try:
+        assert pe.cli_run() == 0
+    finally:
+        sys.argv = argv
+    out = capsys.readouterr().out
+    names = [line.split(":", 2)[2].split(" = ")[0] for line in out.splitlines() if line.startswith("VAR:")]
+    assert names
+    for name in names:
+        assert pe.get_env("machine", name)[1] == pe.REG_EXPAND_SZ
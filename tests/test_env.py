@@ -0,0 +1,109 @@
+import Path_editorv4 as pe
+
+
+def test_set_env_skips_same_value(mem):
+    assert pe.set_env("user", "FOO", "1") is True
+    assert pe.set_env("user", "FOO", "1") is False
+    assert pe.set_env("user", "FOO", "2") is True
+    assert pe.get_env("user", "FOO") == ("2", pe.REG_SZ)
+
+
+def test_set_env_keeps_expand_type(mem):
+    pe.set_env("user", "FOO", "%TEMP%\\x")
+    pe.set_env("user", "FOO", "C:\\x")
+    assert pe.get_env("user", "FOO") == ("C:\\x", pe.REG_EXPAND_SZ)
+
+
+def test_delete_env_skips_missing(mem):
+    assert pe.delete_env("user", "NOPE") is False
+    pe.set_env("user", "FOO", "1")
+    assert pe.delete_env("user", "FOO") is True
+    assert pe.get_env("user", "FOO") is None
+
+
+def test_machine_needs_admin(mem):
+    mem.admin = False
+    try:
+        pe.set_env("machine", "FOO", "1")
+    except PermissionError:
+        pass
+    else:
+        raise AssertionError("PermissionError expected")
+
+
+def test_batch_parse_error_writes_nothing(mem, tmp_path, capsys):
+    src = tmp_path / "ops.txt"
+    src.write_text("set FOO 1\naddpath C:\\Tools --scope user\nfrobnicate x\n", encoding="utf-8")
+    assert pe.cli_batch(str(src)) == 2
+    assert pe.get_env("user", "FOO") is None
+    assert pe.read_path("user") == []
+    assert "ничего не записано" in capsys.readouterr().err
+
+
+def test_batch_applies_all(mem, tmp_path):
+    src = tmp_path / "ops.txt"
+    src.write_text("# comment\nset FOO 1\naddpath C:\\Tools --scope user\naddpath C:\\Bin --scope user\n", encoding="utf-8")
+    assert pe.cli_batch(str(src)) == 0
+    assert pe.get_env("user", "FOO")[0] == "1"
+    assert pe.read_path("user") == ["C:\\Tools", "C:\\Bin"]
+
+
+def test_expander_cycles(mem):
+    for name, value in (("A", "%B%"), ("B", "%A%"), ("X", "%Y%"), ("Y", "%X%"), ("Q", "%A%\\z"), ("R", "C:\\r")):
+        pe.set_env("user", name, value)
+    exp = pe.EnvExpander.from_registry()
+    assert exp.expand("%Q%") == "%B%\\z"
+    assert exp.cycles("%Q%") == ["a", "b"]
+    assert exp.value("R") == "C:\\r"
+    assert exp.cycles("%R%") == []
+
+
+def test_expander_set_invalidates_dependents(mem):
+    pe.set_env("user", "ROOT", "C:\\a")
+    pe.set_env("user", "BIN", "%ROOT%\\bin")
+    exp = pe.EnvExpander.from_registry()
+    assert exp.value("BIN") == "C:\\a\\bin"
+    exp.set("user", "ROOT", "D:\\b")
+    assert exp.value("BIN") == "D:\\b\\bin"
+
+
+def test_dedup_normalized():
+    parts = ["C:\\Tools", "c:\\tools\\", "C:\\Tools\\bin\\..", "D:\\x", "C:\\Shared"]
+    assert pe.dedup_normalized(parts) == ["C:\\Tools", "D:\\x", "C:\\Shared"]
+    assert pe.dedup_normalized(parts, shadow=["c:\\shared\\"]) == ["C:\\Tools", "D:\\x"]
+
+
+def test_diff_path_moves():
+    old = ["a", "b", "c", "d"]
+    new = ["d", "a", "b", "x"]
+    ops = {(op.kind, op.value) for op in pe.diff_path(old, new)}
+    assert ops == {("move", "d"), ("delete", "c"), ("insert", "x")}
+    assert pe.diff_path(old, old) == []
+
+
+def test_batch_noop_dedup_keeps_raw_path(mem, tmp_path):
+    mem.set_value("user", "Path", "a;;b; c", pe.REG_EXPAND_SZ)
+    src = tmp_path / "ops.txt"
+    src.write_text("dedup --scope user\nrmpath zzz --scope user\n", encoding="utf-8")
+    sent = []
+    b = pe.EnvBroadcaster(sender=lambda: sent.append(1))
+    pe.set_broadcaster(b)
+    assert pe.cli_batch(str(src)) == 0
+    assert pe.get_env("user", "Path") == ("a;;b; c", pe.REG_EXPAND_SZ)
+    assert b.wait(2)
+    assert sent == []
+
+
+def test_batch_add_then_remove_keeps_raw_path(mem, tmp_path):
+    mem.set_value("user", "Path", "a;;b", pe.REG_EXPAND_SZ)
+    src = tmp_path / "ops.txt"
+    src.write_text("addpath c --scope user\nrmpath c --scope user\n", encoding="utf-8")
+    assert pe.cli_batch(str(src)) == 0
+    assert pe.get_env("user", "Path")[0] == "a;;b"
+
+
+def test_write_path_skips_same_entries(mem):
+    mem.set_value("user", "Path", "a;;b", pe.REG_EXPAND_SZ)
+    assert pe.write_path("user", ["a", "b"]) is False
+    assert pe.get_env("user", "Path")[0] == "a;;b"
+    assert pe.write_path("user", ["b", "a"]) is True
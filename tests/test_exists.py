@@ -0,0 +1,62 @@
+import threading
+
+import Path_editorv4 as pe
+
+
+class _Hanging(pe.ExistenceChecker):
+    """Проверка "\\\\dead\\..." висит, пока не отпустят release."""
+
+    def __init__(self, **kw):
+        super().__init__(expand=lambda p: p, **kw)
+        self.release = threading.Event()
+
+    def _probe(self, path):
+        if path.startswith("\\\\dead"):
+            self.release.wait(10)
+            return True
+        return False
+
+
+def _collect(checker, paths, n):
+    got = []
+    ready = threading.Event()
+
+    def callback(p, res):
+        got.append((p, res))
+        if len(got) >= n:
+            ready.set()
+
+    checker.check_async(paths, callback)
+    return got, ready
+
+
+def test_check_async_reports_timeout_and_keeps_going():
+    ch = _Hanging(max_workers=1, timeout=0.1)
+    try:
+        got, ready = _collect(ch, ["\\\\dead\\a", "\\\\dead\\b", "C:\\ok"], 3)
+        # оба зависших пути — None по сроку, обычный — ответ от потока-замены
+        assert ready.wait(3)
+        assert sorted(got) == [("C:\\ok", False), ("\\\\dead\\a", None), ("\\\\dead\\b", None)]
+    finally:
+        ch.release.set()
+
+
+def test_check_async_late_answer_arrives():
+    ch = _Hanging(max_workers=2, timeout=0.1)
+    got, ready = _collect(ch, ["\\\\dead\\x"], 1)
+    assert ready.wait(3)
+    assert got == [("\\\\dead\\x", None)]
+    done = threading.Event()
+    ch.check_async(["\\\\dead\\x"], lambda p, res: res is not None and done.set())
+    ch.release.set()
+    assert done.wait(3)
+    assert ch.peek("\\\\dead\\x") is True
+
+
+def test_check_many_after_stuck_workers():
+    ch = _Hanging(max_workers=1, timeout=0.1)
+    try:
+        assert ch.check_many(["\\\\dead\\a"]) == {"\\\\dead\\a": None}
+        assert ch.check_many(["C:\\ok"], timeout=1) == {"C:\\ok": False}
+    finally:
+        ch.release.set()
@@ -0,0 +1,47 @@
+import pytest
+
+gui = pytest.importorskip("Path_editorv4_gui")
+
+
+class _Body:
+    def __init__(self, h):
+        self.h = h
+
+    def winfo_height(self):
+        return self.h
+
+
+class _Scrollbar:
+    def set(self, first, last):
+        self.pos = (first, last)
+
+
+def _rows(monkeypatch, scale: float, height: int, count: int) -> "gui.VirtualRowList":
+    # без окна: только геометрия пула, виджеты не создаются
+    monkeypatch.setattr(gui.VirtualRowList, "_get_widget_scaling", lambda self: scale)
+    lst = object.__new__(gui.VirtualRowList)
+    lst._init_geometry(66)
+    lst.body = _Body(height)
+    lst.scrollbar = _Scrollbar()
+    lst._count = count
+    return lst
+
+
+@pytest.mark.parametrize("scale", [1.0, 1.25, 1.5])
+def test_capacity_uses_scaled_rows(monkeypatch, scale):
+    lst = _rows(monkeypatch, scale, height=660, count=50)
+    row = round(66 * scale)
+    assert lst.row_height == row
+    assert lst._full_rows() == 660 // row
+    assert lst._capacity() == 660 // row + 1
+
+
+def test_clamp_reaches_last_row_when_scaled(monkeypatch):
+    lst = _rows(monkeypatch, 1.5, height=660, count=20)
+    lst._top = 100
+    lst._clamp_top()
+    # на экран влезает 6 строк по 99 px: последняя видимая — 19-я
+    assert lst._top == 14
+    assert lst._top + lst._full_rows() == lst._count
+    lst._update_scrollbar()
+    assert lst.scrollbar.pos == (14 / 20, 1.0)
@@ -0,0 +1,88 @@
+import pytest
+
+import Path_editorv4 as pe
+
+gui = pytest.importorskip("Path_editorv4_gui")
+
+
+class _Toaster:
+    def __init__(self):
+        self.shown = []
+
+    def show(self, title, text, ms=0):
+        self.shown.append(text)
+
+
+def _app(fail: bool):
+    # без окна: только логика курсора истории, запись выполняется сразу
+    app = object.__new__(gui.App)
+    app.history = pe.EditHistory()
+    app.toaster = _Toaster()
+    app._tabs_built = set()
+    app._history_busy = False
+    app._history_changed = lambda: None
+
+    def write_async(fn, done, scopes):
+        if fail:
+            done(None, OSError("запись не удалась"))
+        else:
+            done(fn(), None)
+
+    app._write_async = write_async
+    return app
+
+
+def test_peek_does_not_move():
+    h = pe.EditHistory()
+    a, b = pe.EnvStep("a", []), pe.EnvStep("b", [])
+    h.push(a)
+    h.push(b)
+    assert h.peek(True) is b and h.cursor == 2
+    assert h.peek(False) is None
+    h.undo()
+    assert h.peek(False) is b and h.peek(True) is a
+
+
+def test_failed_env_undo_keeps_cursor(mem):
+    pe.set_env("user", "FOO", "2")
+    app = _app(fail=True)
+    app.history.push(pe.EnvStep("Изменена FOO", [("user", "FOO", ("1", pe.REG_SZ), ("2", pe.REG_SZ))]))
+    app.undo()
+    assert app.history.cursor == 1
+    assert not app._history_busy
+    assert any("Ошибка записи" in t for t in app.toaster.shown)
+
+
+def test_env_undo_redo_moves_cursor_after_write(mem):
+    pe.set_env("user", "FOO", "2")
+    app = _app(fail=False)
+    app.history.push(pe.EnvStep("Изменена FOO", [("user", "FOO", ("1", pe.REG_SZ), ("2", pe.REG_SZ))]))
+    app.undo()
+    assert app.history.cursor == 0
+    assert pe.get_env("user", "FOO")[0] == "1"
+    app.redo()
+    assert app.history.cursor == 1
+    assert pe.get_env("user", "FOO")[0] == "2"
+
+
+def test_jump_stops_at_failed_step(mem):
+    app = _app(fail=False)
+    for name in ("A", "B", "C"):
+        pe.set_env("user", name, "1")
+        app.history.push(pe.EnvStep(f"Создана {name}", [("user", name, None, ("1", pe.REG_SZ))]))
+    ok = app._write_async
+    calls = []
+
+    def flaky(fn, done, scopes):
+        calls.append(1)
+        if len(calls) == 2:
+            done(None, OSError("нет доступа"))
+        else:
+            ok(fn, done, scopes)
+
+    app._write_async = flaky
+    app.history_jump(0)
+    # C отменена, на B запись упала — курсор после B, A не трогали
+    assert app.history.cursor == 2
+    assert pe.get_env("user", "C") is None
+    assert pe.get_env("user", "A") is not None
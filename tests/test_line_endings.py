@@ -0,0 +1,34 @@
+import os
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _tracked_py():
+    try:
+        out = subprocess.run(["git", "ls-files", "-z", "--", "*.py"], cwd=ROOT, capture_output=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        out = b""
+    names = [n for n in out.decode("utf-8").split("\0") if n]
+    if names:
+        return names
+    # не git-checkout (архив): все .py дерева
+    return [
+        os.path.relpath(os.path.join(d, f), ROOT)
+        for d, _dirs, files in os.walk(ROOT)
+        for f in files
+        if f.endswith(".py")
+    ]
+
+
+def test_py_files_use_crlf():
+    bad = []
+    for name in _tracked_py():
+        path = os.path.join(ROOT, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        if data.count(b"\n") != data.count(b"\r\n"):
+            bad.append(name)
+    assert not bad, f"LF вместо CRLF (см. .gitattributes): {bad}"
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+import Path_editorv4 as pe
+
+
+def test_change_source_is_abstract():
+    with pytest.raises(TypeError):
+        pe.ChangeSource()
+
+
+def test_watcher_dispatches_fake_source():
+    src = pe.FakeChangeSource()
+    got = []
+    fired = threading.Event()
+
+    def callback(scopes):
+        got.append(scopes)
+        fired.set()
+
+    w = pe.ChangeWatcher(src, callback, interval=0.01).start()
+    try:
+        src.trigger("user", "user", "machine")
+        assert fired.wait(2)
+    finally:
+        w.stop()
+    assert got[0] == ["user", "machine"]
+
+
+def test_registry_source_ignores_own_writes(mem):
+    src = pe.RegistryChangeSource()
+    assert src.poll() == []
+    with src.own_writes(["user"]):
+        pe.set_env("user", "A", "1")
+    assert src.poll() == []
+    pe.set_env("user", "B", "1")
+    assert src.poll() == ["user"]
+
+
+def test_registry_source_keeps_earlier_external_change(mem):
+    src = pe.RegistryChangeSource()
+    src.poll()
+    pe.set_env("user", "EXT", "1")
+    with src.own_writes(["user"]):
+        pe.set_env("user", "OWN", "1")
+    assert src.poll() == ["user"]